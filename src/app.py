@@ -1,64 +1,165 @@
+import os
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
 import uuid  # For generating unique patient IDs
 from enum import Enum
 from datetime import datetime
-from patient.patient import Patient, DKASeverity  # Import your Patient class
+from patient import instrumentation, protocol
+from patient.downsample import downsample
+from patient.export import PanelTable
+from patient.instrumentation import timed, timer
+from patient.patient import Patient, DKASeverity, DKATreatment  # Import your Patient class
+from patient.protocol import FOLLOW_UP_MESSAGE, START_INSULIN_MESSAGE
+from patient.trend import ResolutionForecast, format_duration
+from history import PanelHistory
+from ward import checkpoint, get_metrics_server, get_registry, lab_batch, save_patient, track_patient
 
 
+DEBUG = os.environ.get("DKA_DEBUG", "") not in ("", "0")  # echo session data to stdout
+TREND_POINTS = 300  # points drawn per trend chart, however many panels the stay has
+TRENDS = {  # chart label -> patient.export column
+    "Anion Gap (mmol/L)": "anion_gap",
+    "Bicarbonate (mmol/L)": "bicarbonate",
+    "pH": "pH",
+    "Glucose (mg/dL)": "glucose",
+    "Potassium (mmol/L)": "potassium",
+    "Corrected Sodium (mmol/L)": "corrected_sodium",
+    "Effective Osmolality (mOsm/kg)": "effective_osmolality",
+}
 dka_resolved = False
 
 
+def debug(*args):
+    if DEBUG:
+        print(*args)
+
+
+@timed("dka_app_render_seconds", section="patient_info")
 def write_patient_data():
     st.header("👤 Patient Info", divider='gray')
     patient_data = {
         "Patient Attribute": ["Patient ID", "Name", "Age", "Weight (kg)", "Gender"],
         "Details": [
-            st.session_state.patient_id,
-            st.session_state.patient.name,
-            st.session_state.patient.age,
-            st.session_state.patient.weight,
-            st.session_state.patient.gender,
+            str(st.session_state.patient_id),
+            str(st.session_state.patient.name),
+            str(st.session_state.patient.age),
+            str(st.session_state.patient.weight),
+            str(st.session_state.patient.gender),
         ],
     }
     df = pd.DataFrame(patient_data)
     st.dataframe(df, hide_index=True, )
 
 
-def write_patient_measurements(measurements):
-    st.subheader("🧪 Laboratory Studies")
-    units = {
-        "Sodium": "mmol/L",
-        "Potassium": "mmol/L",
-        "Chloride": "mmol/L",
-        "Bicarbonate": "mmol/L",
-        "pH": "pH scale",
-        "Glucose": "mg/dL",
-        "Anion Gap": "mmol/L"
-    }
+@timed("dka_app_render_seconds", section="alerts")
+def write_alerts(alerts):
+    for alert in alerts:
+        st.error(f"🚨 {alert.message} (since {alert.time.strftime('%H:%M - %m/%d/%Y')})")
 
-    filtered_measurements = {key: value for key, value in measurements.items() if key != "Time"}
 
-    df = pd.DataFrame({
-        "Test": filtered_measurements.keys(),
-        "Value": filtered_measurements.values(),
-        "Units": [units[test] for test in filtered_measurements.keys()]  # Assign units dynamically
-    })
-    st.dataframe(df, hide_index=True)
+@timed("dka_app_render_seconds", section="measurements")
+def write_patient_measurements(history, index):
+    st.subheader("🧪 Laboratory Studies")
+    st.dataframe(history.measurement_table(index), hide_index=True)
 
 
+@timed("dka_app_render_seconds", section="recommendations")
 def write_patient_recommendations(recommendations):
     st.subheader("💡     Recommendations to the Clinician:")
-    print(f"empty recommendations: {recommendations}")
+    debug(f"recommendations: {recommendations}")
     for recommendation in recommendations:
         st.write(recommendation)
 
 
+@timed("dka_app_render_seconds", section="forecast")
+def write_forecast(forecast):
+    st.subheader("📉 Anion Gap Trend")
+    st.write(f"Time since first lab: {format_duration(forecast.elapsed())} hrs")
+    closure = forecast.closure()
+    if closure is None:
+        st.write("Projected anion gap closure: needs 3 or more panels with a falling anion gap")
+        return
+    expected, earliest, latest = (time - forecast.latest for time in closure)
+    st.write(
+        f"Projected anion gap closure {format_duration(expected)} hrs after the latest lab "
+        f"(95% band {format_duration(earliest)} - {format_duration(latest)} hrs)"
+    )
+
+
+@timed("dka_app_render_seconds", section="derived")
+def write_derived(patient):
+    st.subheader("🧮 Derived Indices")
+    indices = {
+        "Corrected Sodium (mmol/L)": patient.get_corrected_sodium()[1],
+        "Effective Osmolality (mOsm/kg)": patient.get_effective_osmolality()[1],
+        "Delta-Delta Ratio": patient.get_delta_delta()[1],
+        "Potassium Deficit (mEq)": patient.get_potassium_deficit()[1],
+    }
+    values = [None if value is None else round(value, 2) for value in indices.values()]
+    st.dataframe(pd.DataFrame({"Index": list(indices), "Latest Panel": values}), hide_index=True)
+
+
+@timed("dka_app_render_seconds", section="trends")
+def write_trends(patient):
+    if len(patient.series("electrolytes")) < 2:
+        return
+    st.subheader("📈 Trends")
+    label = st.selectbox("Trend", list(TRENDS))
+    if "trend_panels" not in st.session_state:
+        st.session_state.trend_panels = PanelTable(patient, list(TRENDS.values()))
+    panels = st.session_state.trend_panels
+    panels.update()  # only the panels logged since the last rerun
+    # Downsampled only when a panel was added or another trend picked, so the chart payload stays at
+    # TREND_POINTS and a rerun costs the same however long the stay.
+    key = (label, panels.rows)
+    if st.session_state.get("trend_chart", (None, None))[0] != key:
+        table = panels.table()
+        times, values = downsample(table.column("time").to_numpy(), table.column(TRENDS[label]).to_numpy(),
+                                   TREND_POINTS)
+        st.session_state.trend_chart = (key, pa.table({"time": times, "value": values}))
+    chart = st.session_state.trend_chart[1]
+    st.vega_lite_chart(chart, {
+        "mark": "line",
+        "encoding": {
+            "x": {"field": "time", "type": "temporal", "title": "Time"},
+            "y": {"field": "value", "type": "quantitative", "title": label, "scale": {"zero": False}},
+        },
+    })
+    if chart.num_rows < panels.rows:
+        st.caption(f"{chart.num_rows} of {panels.rows} panels shown")
+
+
+@timed("dka_app_render_seconds", section="history")
+def write_history(history, with_recommendations=True):
+    for idx in range(len(history)):
+        st.header(f"📊 {idx+1}: Patient Data", divider="gray")
+        st.header(f"🕒 {history.columns['Time'][idx]}")
+        write_patient_measurements(history, idx)
+        if with_recommendations:
+            write_patient_recommendations(history.recommendations[idx])
+
+
+if instrumentation.ENABLED:
+    instrumentation.count("dka_app_reruns_total")
+    get_metrics_server()
+    if instrumentation.textfile_path():
+        # Streamlit has no end-of-run hook (st.rerun() stops the script), so each rerun exports
+        # the metrics of the reruns before it.
+        instrumentation.REGISTRY.write_textfile(instrumentation.textfile_path())
+
 if "history" not in st.session_state:
-    st.session_state.history = []
+    st.session_state.history = PanelHistory()
 
 st.title("🩺 DKA SmartFlow")
 
+# Pick up edits to the rules file (DKA_PROTOCOL) between reruns; a bad file keeps the rules in force.
+try:
+    protocol.reload_if_changed(os.environ.get("DKA_PROTOCOL"))
+except (OSError, ValueError, KeyError, TypeError) as error:
+    st.warning(f"Could not load DKA protocol rules, keeping version {protocol.active().version}: {error}")
+rules = protocol.active()  # one protocol for the whole rerun
+
 
 # Generate a unique patient ID
 if "patient" not in st.session_state:
@@ -78,6 +179,9 @@ if "patient" not in st.session_state:
             st.session_state.patient = Patient(
                 patient_id=st.session_state.patient_id, name=name, age=age, weight=weight, gender=gender
             )
+            st.session_state.treatment = DKATreatment()
+            st.session_state.treatment.admit_patient(st.session_state.patient)
+            track_patient(st.session_state.patient, st.session_state.treatment)
             st.success(f"{name} added successfully!")
             st.rerun()
         else:
@@ -85,7 +189,13 @@ if "patient" not in st.session_state:
 
 
 if "patient" in st.session_state:
+    registry = get_registry()
+    track_patient(st.session_state.patient, st.session_state.treatment)  # no-op once registered
+    if "forecast" not in st.session_state:
+        # Fed by the patient's add_* calls from here on; reruns never refit the history.
+        st.session_state.forecast = ResolutionForecast().attach(st.session_state.patient)
     write_patient_data()
+    write_alerts(registry.alerts.active(st.session_state.patient.patient_id))
     if len(st.session_state.history) == 0:
         patient = st.session_state.patient  # Retrieve stored patient
         st.header("🧪 Input Initial Laboratory Results", divider='gray')
@@ -96,133 +206,80 @@ if "patient" in st.session_state:
         pH = st.number_input("pH", min_value=6.5, max_value=7.8, value=7.3)
         glucose = st.number_input("Glucose (mg/dL)", min_value=0, value=100)
         if st.button("Admit"):
-            patient.admit(sodium, potassium, chloride, bicarbonate, pH, glucose)
-            anion_gap_time, anion_gap = patient.add_anion_gap(sodium, potassium, chloride, bicarbonate)
-            if patient.admission_status == DKASeverity.SEVERE:
+            treatment = st.session_state.treatment
+            treatment.admission_status = treatment.determine_severity(pH)
+            with lab_batch():
+                treatment.log_bloodwork(sodium, potassium, chloride, bicarbonate, pH, glucose)
+            anion_gap_time, anion_gap = patient.get_anion_gap()
+            if treatment.admission_status == DKASeverity.SEVERE:
                 st.write(f"❗ {patient.name} admitted: SEVERE")
-            elif patient.admission_status == DKASeverity.MILD_MODERATE:
+            elif treatment.admission_status == DKASeverity.MILD_MODERATE:
                 st.write(f"⚠️ {patient.name} admitted: MODERATE")
-            elif patient.admission_status == DKASeverity.MILD:
+            elif treatment.admission_status == DKASeverity.MILD:
                 st.write(f"✅ {patient.name} admitted: MILD")
 
             st.session_state.history.append(
-                (
-                    {
-                        "Time": datetime.now().strftime("%H:%M - %m/%d/%Y"),
-                        "Sodium": sodium,
-                        "Potassium": potassium,
-                        "Chloride": chloride,
-                        "Bicarbonate": bicarbonate,
-                        "pH": pH,
-                        "Glucose": glucose,
-                        "Anion Gap": anion_gap,
-                    },
-                    ["Start insulin drip at 0.1 units/kg/hr"]
-                )
+                {
+                    "Time": datetime.now().strftime("%H:%M - %m/%d/%Y"),
+                    "Sodium": sodium,
+                    "Potassium": potassium,
+                    "Chloride": chloride,
+                    "Bicarbonate": bicarbonate,
+                    "pH": pH,
+                    "Glucose": glucose,
+                    "Anion Gap": anion_gap,
+                },
+                [START_INSULIN_MESSAGE],
             )
+            registry.set_recommendations(patient.patient_id, [START_INSULIN_MESSAGE])
+            checkpoint(patient, treatment)
             st.rerun()
 
     if len(st.session_state.history) > 0:
         patient = st.session_state.patient
 
-        # if patient.admission_status:
-        #     print(st.session_state.history)
-        #     for idx, history_item in enumerate(st.session_state.history):
-        #         time = history_item[0]["Time"]
-        #         st.header(f"📊 {idx+1}: Patient Data", divider="gray")
-        #         st.header(f"🕒 {time}")
-        #         print('history_item')
-        #         print(history_item[0])
-        #         print(history_item[1])
-        #         # st.header(f"Results & Recommendations at {time}")
-        #         write_patient_measurements(history_item[0])
-        #         write_patient_recommendations(history_item[1])
-
-        electrolyte_time = st.session_state.history[-1][0]["Time"]
-        print(electrolyte_time)
-        sodium = st.session_state.history[-1][0]["Sodium"]
-        potassium = st.session_state.history[-1][0]["Potassium"]
-        chloride = st.session_state.history[-1][0]["Chloride"]
-        bicarbonate = st.session_state.history[-1][0]["Bicarbonate"]
-        pH = st.session_state.history[-1][0]["pH"]
-        glucose = st.session_state.history[-1][0]["Glucose"]
-        anion_gap = st.session_state.history[-1][0]["Anion Gap"]
-        print(sodium, potassium, chloride, bicarbonate, pH, glucose)
+        latest = st.session_state.history.latest()
+        electrolyte_time = latest["Time"]
+        sodium = latest["Sodium"]
+        potassium = latest["Potassium"]
+        chloride = latest["Chloride"]
+        bicarbonate = latest["Bicarbonate"]
+        pH = latest["pH"]
+        glucose = latest["Glucose"]
+        anion_gap = latest["Anion Gap"]
+        debug(electrolyte_time, sodium, potassium, chloride, bicarbonate, pH, glucose)
         recommendations = []
-        print(recommendations)
-        if anion_gap < 12:
-            recommendations.append("DKA Resolved in 08:12 hrs")
-            for idx, history_item in enumerate(st.session_state.history):
-                time = history_item[0]["Time"]
-                st.header(f"📊 {idx+1}: Patient Data", divider="gray")
-                st.header(f"🕒 {time}")
-                print('history_item')
-                print(history_item[0])
-                print(history_item[1])
-                # st.header(f"Results & Recommendations at {time}")
-                write_patient_measurements(history_item[0])
+        if rules.resolved(anion_gap):
+            resolved_in = format_duration(st.session_state.forecast.elapsed())
+            recommendations.append(f"DKA Resolved in {resolved_in} hrs")
+            write_history(st.session_state.history, with_recommendations=False)
             st.subheader("💡     Recommendations to the Clinician:")
 
-            st.write("✅ DKA Resolved in 08:12 hrs")
+            st.write(f"✅ DKA Resolved in {resolved_in} hrs")
+            write_trends(patient)
             dka_resolved = True
-            # resolution time = start - finish
-        elif anion_gap > 12:
+        else:
             if not patient.insulin_drip:
-                recommendations.append("Start insulin drip at 0.1 units/kg/hr")
+                recommendations.append(START_INSULIN_MESSAGE)
                 patient.insulin_drip = True
+                save_patient(patient)
 
         # GET ELECTROLYTES
         electrolyte_time, sodium, potassium, chloride, bicarbonate = patient.get_electrolytes()
 
         # GET CORRECTED SODIUM
-        corrected_sodium = patient.get_corrected_sodium(sodium, glucose)
+        _, corrected_sodium = patient.get_corrected_sodium()
         if not dka_resolved:
             # CHECK ELECTROLYTES
-            if glucose > 250:
-                if corrected_sodium > 135:
-                    if potassium > 4:
-                        # st.write("Run IV fluids 0.45 NS @ 250 cc / hr")
-                        recommendations.append("Run IV fluids 0.45 NS @ 250 cc / hr")
-                    else:
-                        # st.write("Run IV fluids 0.45 NS w 20 meq KCl @ 250 cc / hr")
-                        recommendations.append("Run IV fluids 0.45 NS w 20 meq KCl @ 250 cc / hr")
-                elif corrected_sodium < 135:
-                    if potassium > 4:
-                        # st.write("Run IV fluids NS @ 250 cc / hr")
-                        recommendations.append("Run IV fluids NS @ 250 cc / hr")
-                    else:
-                        # st.write("Run IV fluids NS w 20 meq KCl @ 250 cc / hr")
-                        recommendations.append("Run IV fluids NS w 20 meq KCl @ 250 cc / hr")
-            elif glucose < 250:
-                if corrected_sodium > 135:
-                    if potassium > 4:
-                        # st.write("Run IV fluids D5 0.45 NS @ 250 cc / hr")
-                        recommendations.append("Run IV fluids D5 0.45 NS @ 250 cc / hr")
-                    else:
-                        # st.write("Run IV fluids D5 0.45 NS w 20 meq KCl @ 250 cc / hr")
-                        recommendations.append("Run IV fluids D5 0.45 NS w 20 meq KCl @ 250 cc / hr")
-                elif corrected_sodium < 135:
-                    if potassium > 4:
-                        # st.write("Run IV fluids D5 NS @ 250 cc / hr")
-                        recommendations.append("Run IV fluids D5 NS @ 250 cc / hr")
-                    else:
-                        # st.write("Run IV fluids D5 NS w 20 meq KCl @ 250 cc / hr")
-                        recommendations.append("Run IV fluids D5 NS w 20 meq KCl @ 250 cc / hr")
-            # st.write("Come back in 1 hour with electrolytes and blood sugar reading")
-            recommendations.append("Come back in 1 hour with electrolytes and blood sugar reading")
-
-            if patient.admission_status:
-                print(st.session_state.history)
-                for idx, history_item in enumerate(st.session_state.history):
-                    time = history_item[0]["Time"]
-                    st.header(f"📊 {idx+1}: Patient Data", divider="gray")
-                    st.header(f"🕒 {time}")
-                    print('history_item')
-                    print(history_item[0])
-                    print(history_item[1])
-                    # st.header(f"Results & Recommendations at {time}")
-                    write_patient_measurements(history_item[0])
-                    write_patient_recommendations(history_item[1])
+            with timer("dka_app_render_seconds", section="protocol"):
+                recommendations.append(rules.fluids(glucose, corrected_sodium, potassium))
+            recommendations.append(FOLLOW_UP_MESSAGE)
+
+            if st.session_state.treatment.admission_status:
+                write_history(st.session_state.history)
+            write_forecast(st.session_state.forecast)
+            write_derived(patient)
+            write_trends(patient)
 
             st.header("🧪 Input Subsequent Laboratory Results", divider='gray')
             sodium = st.number_input("Sodium (mmol/L)", min_value=100, max_value=170, value=140)
@@ -233,26 +290,31 @@ if "patient" in st.session_state:
             glucose = st.number_input("Glucose (mg/dL)", min_value=0, value=100)
 
             if st.button("Add Laboratory Results"):
-                anion_gap_time, anion_gap = patient.add_anion_gap(sodium, potassium, chloride, bicarbonate)
+                with lab_batch():
+                    st.session_state.treatment.log_bloodwork(sodium, potassium, chloride, bicarbonate, pH, glucose)
+                anion_gap_time, anion_gap = patient.get_anion_gap()
                 now = datetime.now().strftime("%H:%M - %m/%d/%Y")
                 st.session_state.history.append(
-                    (
-                        {
-                            "Time": now,
-                            "Sodium": sodium,
-                            "Potassium": potassium,
-                            "Chloride": chloride,
-                            "Bicarbonate": bicarbonate,
-                            "pH": pH,
-                            "Glucose": glucose,
-                            "Anion Gap": anion_gap,
-                        },
-                        recommendations
-                    )
+                    {
+                        "Time": now,
+                        "Sodium": sodium,
+                        "Potassium": potassium,
+                        "Chloride": chloride,
+                        "Bicarbonate": bicarbonate,
+                        "pH": pH,
+                        "Glucose": glucose,
+                        "Anion Gap": anion_gap,
+                    },
+                    recommendations,
+                )
+                # The board shows advice for the panel just logged, not the one this rerun started from.
+                registry.set_recommendations(
+                    patient.patient_id, list(st.session_state.treatment.analyze_bloodwork(patient))
                 )
+                checkpoint(patient, st.session_state.treatment)
                 recommendations = []
                 #  patient = st.session_state.patient
                 st.rerun()
 
     if st.button("View Patient Data"):
-        st.write(st.session_state.patient.__dict__)  # Debugging view
+        st.write(st.session_state.patient.to_dict())  # Debugging view
@@ -0,0 +1,131 @@
+"""Concurrent-session load test of src/app.py through Streamlit's headless AppTest.
+
+Every simulated session creates a patient, admits it and adds `--panels` follow-up panels, timing
+each rerun. Sessions run in their own processes (AppTest swaps process-global Streamlit runtime
+state, so it cannot run sessions in threads), `--sessions` of them at a time. For each concurrency
+level this prints rerun latency percentiles, reruns/sec across all sessions and peak RSS per
+session, and then rerun latency by history length, which exposes per-session state that grows
+with every panel.
+
+Run from src/:  python -m benchmarks.app_load --sessions 1,2,4,8 --panels 24
+"""
+import argparse
+import contextlib
+import io
+import random
+import resource
+import time
+from pathlib import Path
+
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+HISTORY_BUCKETS = (1, 6, 12, 24, 48, 96, 200)
+
+
+def _rss_kib():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _set_panel(app, rng):
+    """Fill the lab inputs with a panel whose anion gap stays open, so sessions never resolve."""
+    sodium, potassium, chloride, bicarbonate, pH, glucose = app.number_input[-6:]
+    sodium.set_value(rng.randint(135, 145))
+    potassium.set_value(rng.randint(3, 5))
+    chloride.set_value(rng.randint(95, 100))
+    bicarbonate.set_value(rng.randint(5, 12))
+    pH.set_value(round(rng.uniform(6.9, 7.3), 2))
+    glucose.set_value(rng.randint(150, 600))
+
+
+def _click(app, label):
+    button = next((button for button in app.button if button.label == label), None)
+    if button is None:
+        raise RuntimeError(f"no {label!r} button; exceptions: {[error.message for error in app.exception]}")
+    start = time.perf_counter()
+    button.click().run()
+    seconds = time.perf_counter() - start
+    if app.exception:
+        raise RuntimeError(f"app.py raised after {label!r}: {app.exception[0].message}")
+    return seconds
+
+
+def drive_session(number, panels, seed=0):
+    """Run one create -> admit -> `panels` follow-ups session in this process.
+
+    Returns {"first_run_seconds", "latencies": [(history length, seconds)], "rss_start_kib", "peak_rss_kib"}.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed * 1_000_003 + number)
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = AppTest.from_file(str(APP_PATH), default_timeout=120)
+        start = time.perf_counter()
+        app.run()  # cold: imports and compiles the script
+        first_run = time.perf_counter() - start
+        rss_start = _rss_kib()
+        app.text_input[0].input(f"Load patient {number}")
+        latencies.append((0, _click(app, "Create")))
+        _set_panel(app, rng)
+        latencies.append((1, _click(app, "Admit")))
+        for panel in range(panels):
+            _set_panel(app, rng)
+            latencies.append((panel + 2, _click(app, "Add Laboratory Results")))
+    return {
+        "first_run_seconds": first_run,
+        "latencies": latencies,
+        "rss_start_kib": rss_start,
+        "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q / 100))]
+
+
+def run_level(sessions, panels, seed=0):
+    """Drive `sessions` concurrent sessions, each in a fresh process; returns (results, wall seconds)."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=sessions, max_tasks_per_child=1) as executor:
+        results = list(executor.map(drive_session, range(sessions), [panels] * sessions, [seed] * sessions))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", default="1,2,4,8", help="comma-separated concurrency levels")
+    parser.add_argument("--panels", type=int, default=24, help="follow-up panels per session")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    by_history = {}
+    print(f"{'sessions':>8} {'reruns':>7} {'first ms':>9} {'p50 ms':>8} {'p99 ms':>8} {'reruns/s':>9} "
+          f"{'peak RSS MiB':>13} {'RSS growth MiB':>15}")
+    for sessions in (int(level) for level in args.sessions.split(",")):
+        results, seconds = run_level(sessions, args.panels, args.seed)
+        latencies = sorted(latency for result in results for _, latency in result["latencies"])
+        peak = sum(result["peak_rss_kib"] for result in results) / len(results) / 1024
+        growth = sum(result["peak_rss_kib"] - result["rss_start_kib"] for result in results) / len(results) / 1024
+        first = sum(result["first_run_seconds"] for result in results) / len(results)
+        print(f"{sessions:>8} {len(latencies):>7} {first * 1e3:>9.1f} {_percentile(latencies, 50) * 1e3:>8.1f} "
+              f"{_percentile(latencies, 99) * 1e3:>8.1f} {len(latencies) / seconds:>9.1f} "
+              f"{peak:>13.1f} {growth:>15.1f}")
+        if sessions == 1:
+            for history, latency in results[0]["latencies"]:
+                by_history.setdefault(history, []).append(latency)
+
+    if by_history:
+        print("\nRerun latency by history length (single session):")
+        for bucket in sorted({*HISTORY_BUCKETS, max(by_history)}):
+            if bucket in by_history:
+                print(f"  {bucket:>4} panels: {min(by_history[bucket]) * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Rows/sec of the vectorized cohort scoring engine against the per-patient loop.
+
+Run from src/:  python -m benchmarks.batch_scoring --rows 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from patient.batch import score_panels
+from patient.patient import DKATreatment, Patient
+
+
+def generate_panels(rows, seed=0):
+    """Draw `rows` panels from the same ranges as DKATreatment.generate_random_bloodwork."""
+    rng = np.random.default_rng(seed)
+    return {
+        "sodium": rng.uniform(120, 145, rows),
+        "potassium": rng.uniform(2.5, 6.0, rows),
+        "chloride": rng.uniform(90, 110, rows),
+        "bicarbonate": rng.uniform(5, 24, rows),
+        "pH": rng.uniform(6.8, 7.45, rows),
+        "glucose": rng.uniform(150, 600, rows),
+    }
+
+
+def score_scalar(panels):
+    """Score every row through a fresh Patient/DKATreatment, as the app does today."""
+    severities, recommendations = [], []
+    for sodium, potassium, chloride, bicarbonate, pH, glucose in zip(
+        *(panels[name].tolist() for name in ("sodium", "potassium", "chloride", "bicarbonate", "pH", "glucose"))
+    ):
+        patient = Patient(patient_id=None, name=None, age=None, weight=None, gender=None)
+        treatment = DKATreatment()
+        treatment.admit_patient(patient)
+        treatment.log_bloodwork(sodium, potassium, chloride, bicarbonate, pH, glucose)
+        severities.append(treatment.determine_severity(pH))
+        recommendations.append(list(treatment.analyze_bloodwork(patient)))
+    return severities, recommendations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    panels = generate_panels(args.rows, args.seed)
+
+    start = time.perf_counter()
+    severities, recommendations = score_scalar(panels)
+    scalar_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = score_panels(panels)
+    batch_seconds = time.perf_counter() - start
+
+    mismatches = sum(
+        scores.severity_of(row) != severities[row] or scores.recommendations(row) != recommendations[row]
+        for row in range(args.rows)
+    )
+    print(f"rows:            {args.rows}")
+    print(f"per-patient:     {args.rows / scalar_seconds:,.0f} rows/sec")
+    print(f"vectorized:      {args.rows / batch_seconds:,.0f} rows/sec")
+    print(f"speedup:         {scalar_seconds / batch_seconds:,.1f}x")
+    print(f"mismatched rows: {mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
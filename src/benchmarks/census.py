@@ -0,0 +1,109 @@
+"""Latency of indexed census queries against a walk over every patient, checked for equal answers.
+
+Run from src/:  python -m benchmarks.census --patients 5000 --panels 24
+"""
+import argparse
+import random
+import time
+import timeit
+from datetime import timedelta
+
+from patient.clock import FOLLOW_UP_INTERVAL, VirtualClock
+from patient.patient import DKATreatment, Patient
+from patient.registry import PatientRegistry
+
+
+LONGER_THAN = timedelta(hours=6)
+
+
+def build_ward(patients, panels, seed=0):
+    """A registry of `patients` sharing one clock, each with up to `panels` hourly panels."""
+    rng = random.Random(seed)
+    clock = VirtualClock()
+    registry = PatientRegistry()
+    treatments = []
+    for number in range(patients):
+        patient = Patient(patient_id=f"census-{number}", name=None, age=50, weight=70, gender="Other", clock=clock)
+        treatment = DKATreatment(rng=rng)
+        treatment.admit_patient(patient)
+        registry.register(patient, treatment)
+        treatments.append(treatment)
+    start = time.perf_counter()
+    for _ in range(panels):
+        for treatment in treatments:
+            if rng.random() < 0.9:  # some patients miss a round and fall overdue
+                treatment.log_bloodwork(*treatment.generate_random_bloodwork())
+        clock.advance(FOLLOW_UP_INTERVAL)
+    return registry, clock.now(), (time.perf_counter() - start) / (patients * panels)
+
+
+###########################################################
+# Reference scans over every patient's history
+###########################################################
+def scan_low_potassium(registry):
+    return {
+        entry.patient.patient_id for entry in registry.board()
+        if entry.patient.get_electrolytes()[2] is not None and entry.patient.get_electrolytes()[2] < 3.5
+    }
+
+
+def scan_anion_gap_episodes(registry, now):
+    matches = set()
+    for entry in registry.board():
+        started = None
+        for sample_time, anion_gap in entry.patient.series("anion_gap"):
+            started = (started or sample_time) if anion_gap > 20 else None
+        if started is not None and started < now - LONGER_THAN:
+            matches.add(entry.patient.patient_id)
+    return matches
+
+
+def scan_overdue(registry, now):
+    return {
+        entry.patient.patient_id for entry in registry.board()
+        if entry.last_lab is not None and entry.last_lab < now - FOLLOW_UP_INTERVAL
+    }
+
+
+def best_us(fn, number=20):
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--panels", type=int, default=24, help="hourly rounds of labs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    registry, now, per_panel = build_ward(args.patients, args.panels, args.seed)
+    census = registry.census
+    print(f"patients:        {len(registry):,}")
+    print(f"log_bloodwork:   {per_panel * 1e6:,.1f} us per panel, indexes included")
+
+    cases = [
+        ("latest K < 3.5", lambda: census.latest("potassium", hi=3.5), lambda: scan_low_potassium(registry)),
+        (
+            "AG > 20 for > 6 h",
+            lambda: census.exceeding("anion_gap>20", LONGER_THAN, now),
+            lambda: scan_anion_gap_episodes(registry, now),
+        ),
+        (
+            "overdue labs",
+            lambda: [entry.patient.patient_id for entry in registry.overdue(now, FOLLOW_UP_INTERVAL)],
+            lambda: scan_overdue(registry, now),
+        ),
+    ]
+    mismatches = 0
+    for label, indexed, scan in cases:
+        hits = indexed()
+        mismatches += set(hits) != scan()
+        print(f"{label:<18} {len(hits):>6,} hits  indexed {best_us(indexed):>10,.1f} us"
+              f"  scan {best_us(scan, number=1):>12,.1f} us")
+    print(f"mismatched queries: {mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Cold-import time and RSS of the core package, checked against a budget.
+
+Each measurement runs in a fresh interpreter. Exits with status 1 when the import takes longer
+than --max-ms, grows RSS by more than --max-rss-mib, or pulls in a UI/dataframe package.
+
+Run from src/:  python -m benchmarks.import_budget
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+CORE_MODULES = ("patient.patient", "patient.protocol", "patient.batch", "patient.simulation")
+HEAVY_MODULES = ("numpy", "pandas", "pyarrow", "streamlit")
+DEFAULT_MAX_MS = 50.0
+DEFAULT_MAX_RSS_MIB = 10.0
+
+_PROBE = """
+import json, resource, sys, time
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start
+rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "import_ms": elapsed * 1e3,
+    "rss_kib": rss_after - rss_before,
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure_import(modules=CORE_MODULES, repeat=5):
+    """Best-of-`repeat` cold import of `modules`: {"import_ms", "rss_kib", "heavy"}."""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(modules=tuple(modules), heavy=HEAVY_MODULES)],
+            cwd=SRC_DIR, check=True, capture_output=True, text=True,
+        ).stdout
+        runs.append(json.loads(output))
+    return min(runs, key=lambda run: run["import_ms"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-ms", type=float, default=DEFAULT_MAX_MS)
+    parser.add_argument("--max-rss-mib", type=float, default=DEFAULT_MAX_RSS_MIB)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    result = measure_import(repeat=args.repeat)
+    print(f"modules:   {', '.join(CORE_MODULES)}")
+    print(f"import:    {result['import_ms']:.1f} ms (budget {args.max_ms:.0f} ms)")
+    print(f"rss:       {result['rss_kib'] / 1024:.1f} MiB (budget {args.max_rss_mib:.0f} MiB)")
+    print(f"heavy:     {', '.join(result['heavy']) or 'none'}")
+
+    failures = []
+    if result["import_ms"] > args.max_ms:
+        failures.append("import time over budget")
+    if result["rss_kib"] > args.max_rss_mib * 1024:
+        failures.append("RSS over budget")
+    if result["heavy"]:
+        failures.append(f"core imports {', '.join(result['heavy'])}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
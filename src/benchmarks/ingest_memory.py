@@ -0,0 +1,57 @@
+"""Peak memory and throughput of patient.ingest for growing export sizes.
+
+Run from src/:  python -m benchmarks.ingest_memory --patients 500 1000 4000
+"""
+import argparse
+import csv
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from patient.ingest import ingest
+
+
+def write_export(path, patients, panels_per_patient, seed=0):
+    """Write a sorted CSV with one BMP row and one VBG row per panel."""
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["patient_id", "time", "sodium", "potassium", "chloride", "bicarbonate", "pH", "glucose"])
+        for number in range(patients):
+            admitted = start + timedelta(days=number)
+            for hour in range(panels_per_patient):
+                stamp = (admitted + timedelta(hours=hour)).isoformat()
+                writer.writerow([f"MRN{number:07d}", stamp, round(rng.uniform(120, 145), 1),
+                                 round(rng.uniform(2.5, 6.0), 1), round(rng.uniform(90, 110), 1),
+                                 round(rng.uniform(5, 24), 1), "", ""])
+                writer.writerow([f"MRN{number:07d}", stamp, "", "", "", "",
+                                 round(rng.uniform(6.8, 7.45), 2), round(rng.uniform(150, 600))])
+    return patients * panels_per_patient * 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, nargs="+", default=[500, 1000, 4000])
+    parser.add_argument("--panels", type=int, default=48, help="panels per patient")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for patients in args.patients:
+            source = Path(directory) / f"labs-{patients}.csv"
+            rows = write_export(source, patients, args.panels)
+            tracemalloc.start()
+            start = time.perf_counter()
+            panels = ingest([source], Path(directory) / f"panels-{patients}.parquet", chunk_rows=8192)
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{rows:>9,} rows ({source.stat().st_size / 2**20:6.1f} MiB) -> {panels:>8,} panels: "
+                  f"{panels / seconds:>8,.0f} panels/s, peak {peak / 2**20:5.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Memory held by one patient's lab series over a stay: list-of-tuples vs columnar buffers.
+
+Run from src/:  python -m benchmarks.patient_memory --hours 72
+"""
+import argparse
+import random
+import tracemalloc
+from datetime import datetime, timedelta
+
+from patient.patient import Patient
+
+
+def random_panel(rng):
+    return (
+        rng.uniform(120, 145), rng.uniform(2.5, 6.0), rng.uniform(90, 110),
+        rng.uniform(5, 24), rng.uniform(6.8, 7.45), rng.uniform(150, 600),
+    )
+
+
+def fill_lists(hours, seed, start):
+    """Store panels the way Patient did before columnar series: lists of (datetime, floats) tuples."""
+    rng = random.Random(seed)
+    series = {name: [] for name in ("glucose", "electrolytes", "corrected_sodium", "pH", "anion_gap")}
+    for hour in range(hours):
+        sodium, potassium, chloride, bicarbonate, pH, glucose = random_panel(rng)
+        time = start + timedelta(hours=hour)
+        series["electrolytes"].append((time, sodium, potassium, chloride, bicarbonate))
+        series["pH"].append((time + timedelta(microseconds=1), pH))
+        series["glucose"].append((time + timedelta(microseconds=2), glucose))
+        series["corrected_sodium"].append((time + timedelta(microseconds=3), sodium + 0.016 * (glucose - 100)))
+        series["anion_gap"].append((time + timedelta(microseconds=4), (sodium + potassium) - (chloride + bicarbonate)))
+    return series
+
+
+def fill_patient(hours, seed, start):
+    rng = random.Random(seed)
+    patient = Patient(patient_id="bench", name="Bench", age=45, weight=70, gender="Other")
+    for hour in range(hours):
+        sodium, potassium, chloride, bicarbonate, pH, glucose = random_panel(rng)
+        time = start + timedelta(hours=hour)
+        patient.series("electrolytes").append(time, sodium, potassium, chloride, bicarbonate)
+        patient.series("pH").append(time, pH)
+        patient.series("glucose").append(time, glucose)
+        patient.series("corrected_sodium").append(time, sodium + 0.016 * (glucose - 100))
+        patient.series("anion_gap").append(time, (sodium + potassium) - (chloride + bicarbonate))
+    return patient
+
+
+def measure(build, *args):
+    """Return (bytes still allocated by build(*args), result)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(*args)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=int, default=72, help="hourly panels in the stay")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = datetime(2024, 1, 1, 8, 0)
+    list_bytes, _ = measure(fill_lists, args.hours, args.seed, start)
+    columnar_bytes, patient = measure(fill_patient, args.hours, args.seed, start)
+    samples = 5 * args.hours
+
+    print(f"{args.hours} hourly panels ({samples} series samples)")
+    print(f"list of tuples:  {list_bytes:>8,} bytes  ({list_bytes / samples:,.0f} B/sample)")
+    print(f"columnar:        {columnar_bytes:>8,} bytes  ({columnar_bytes / samples:,.0f} B/sample)")
+    print(f"buffer capacity: {sum(patient.series(name).nbytes for name in Patient.SERIES):>8,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Events/sec of the vectorized protocol replay, checked against the per-event reference.
+
+Also diffs the default protocol against a variant with a lower potassium cut over the same log.
+
+Run from src/:  python -m benchmarks.replay --patients 100000 --panels 24
+"""
+import argparse
+import copy
+import time
+
+from patient.protocol import DEFAULT_RULES, Protocol
+from patient.replay import EventLog, diff_protocols, replay, replay_scalar
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=100_000)
+    parser.add_argument("--panels", type=int, default=24, help="hourly panels per patient")
+    parser.add_argument("--check-patients", type=int, default=500, help="patients replayed by the reference too")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    log = EventLog.synthetic(args.patients, args.panels, args.seed)
+    start = time.perf_counter()
+    result = replay(log)
+    seconds = time.perf_counter() - start
+    print(f"events:          {len(log):,}")
+    print(f"panels scored:   {len(result):,}")
+    print(f"vectorized:      {len(log) / seconds:,.0f} events/sec")
+
+    sample = EventLog.synthetic(args.check_patients, args.panels, args.seed)
+    start = time.perf_counter()
+    reference = replay_scalar(sample)
+    scalar_seconds = time.perf_counter() - start
+    vectorized = replay(sample)
+    mismatches = sum(
+        (vectorized.patient_id(row), vectorized.time(row), vectorized.recommendations(row)) != reference[row]
+        for row in range(len(reference))
+    ) + abs(len(vectorized) - len(reference))
+    print(f"per-event:       {len(sample) / scalar_seconds:,.0f} events/sec")
+    print(f"mismatched rows: {mismatches}")
+
+    rules = copy.deepcopy(DEFAULT_RULES)
+    rules["version"] = 2
+    rules["tables"]["fluids"]["inputs"][2]["cuts"] = [3.5]  # potassium
+    diff = diff_protocols(log, Protocol(DEFAULT_RULES), Protocol(rules))
+    print(f"protocol diff:   {len(diff):,} of {len(result):,} panels change with a potassium cut of 3.5")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
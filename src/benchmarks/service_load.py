@@ -0,0 +1,146 @@
+"""Load generator for the headless scoring service: p50/p99 latency and requests/sec.
+
+Starts the service with one worker process and with one per core, drives it with concurrent
+keep-alive connections (each admitting its own patients and then posting panels to them) and
+prints a row per configuration.
+
+Run from src/:  python -m benchmarks.service_load --seconds 10 --connections 64
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import time
+
+from patient.service import DEFAULT_PORT, run_workers
+
+
+PATIENTS_PER_CONNECTION = 4
+
+
+async def _request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    response = json.loads(await reader.readexactly(length))
+    if status != 200:
+        raise RuntimeError(f"{method} {path} -> {status}: {response}")
+    return response
+
+
+async def _connection(host, port, number, deadline, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    rng = random.Random(number)
+    patient_ids = []
+    for offset in range(PATIENTS_PER_CONNECTION):
+        admitted = await _request(reader, writer, "POST", "/patients", {
+            "patient_id": f"load-{port}-{number}-{offset}", "name": "Load", "age": 50, "weight": 70, "gender": "Other",
+        })
+        patient_ids.append(admitted["patient_id"])
+    while time.perf_counter() < deadline:
+        panel = {
+            "sodium": rng.uniform(120, 145), "potassium": rng.uniform(2.5, 6.0), "chloride": rng.uniform(90, 110),
+            "bicarbonate": rng.uniform(5, 24), "pH": rng.uniform(6.8, 7.45), "glucose": rng.uniform(150, 600),
+        }
+        start = time.perf_counter()
+        await _request(reader, writer, "POST", f"/patients/{rng.choice(patient_ids)}/panels", panel)
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+def _client_process(host, ports, connections, seconds, offset):
+    async def run():
+        latencies = []
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(
+            _connection(host, ports[(offset + number) % len(ports)], offset + number, deadline, latencies)
+            for number in range(connections)
+        ))
+        return latencies
+
+    return asyncio.run(run())
+
+
+def _wait_until_up(host, ports, timeout=30):
+    async def probe(port):
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+                await _request(reader, writer, "GET", "/health")
+                writer.close()
+                return
+            except OSError:
+                if time.perf_counter() > deadline:
+                    raise
+                await asyncio.sleep(0.05)
+
+    async def probe_all():
+        await asyncio.gather(*(probe(port) for port in ports))
+
+    asyncio.run(probe_all())
+
+
+def run_load(workers, connections, seconds, host="127.0.0.1", port=DEFAULT_PORT, client_processes=None):
+    """Start `workers` service processes, drive them and return the result row."""
+    ports = [port + number for number in range(workers)]
+    servers = run_workers(workers, host, port)
+    try:
+        _wait_until_up(host, ports)
+        client_processes = client_processes or workers
+        per_process = max(1, connections // client_processes)
+        with multiprocessing.Pool(client_processes) as pool:
+            start = time.perf_counter()
+            results = pool.starmap(_client_process, [
+                (host, ports, per_process, seconds, number * per_process) for number in range(client_processes)
+            ])
+            elapsed = time.perf_counter() - start
+    finally:
+        for server in servers:
+            server.terminate()
+            server.join()
+
+    latencies = sorted(latency for result in results for latency in result)
+    return {
+        "workers": workers,
+        "connections": per_process * client_processes,
+        "requests": len(latencies),
+        "requests_per_s": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1e3,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    configurations = [1] if cores == 1 else [1, cores]
+    print(f"{'workers':>7} {'conns':>6} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for workers in configurations:
+        row = run_load(workers, args.connections, args.seconds, port=args.port)
+        print(f"{row['workers']:>7} {row['connections']:>6} {row['requests']:>9} {row['requests_per_s']:>9,.0f} "
+              f"{row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f}")
+    if cores == 1:
+        print("Single core machine: the all-cores configuration is the same as the single-core one.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Memory and read latency of the shared-memory cohort against per-process Patient copies.
+
+Builds a cohort of --patients x --panels lab panels, then starts --readers processes per mode:
+"shared" readers attach to one SharedCohort block, "copies" readers unpickle their own Patient
+objects as every Streamlit or worker process holds them today. Each reader reports its RSS and
+PSS (shared pages split between the processes mapping them) growth and the latency of reading a
+patient's latest panel and its whole anion gap history. A final run has readers check latest
+panels while the writer keeps appending, counting torn reads.
+
+Run from src/:  python -m benchmarks.shared_cohort --patients 1000 --panels 200 --readers 4
+"""
+import argparse
+import multiprocessing
+import pickle
+import random
+import time
+from datetime import datetime, timedelta
+
+from patient.clock import VirtualClock
+from patient.patient import DKATreatment, Patient
+from patient.shared import FIELDS, SharedCohort
+
+
+def _memory_kib():
+    """(RSS, PSS) of this process in KiB."""
+    values = {}
+    with open("/proc/self/smaps_rollup") as rollup:
+        for line in rollup:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0])
+    return values["Rss"], values["Pss"]
+
+
+def _percentiles_us(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2] * 1e6, samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6
+
+
+def build(patients, panels, seed=0):
+    """`patients` Patients with `panels` hourly random panels each, published to a new SharedCohort."""
+    cohort = SharedCohort.create(patients=patients, panels=panels)
+    clock = VirtualClock()
+    rng = random.Random(seed)
+    roster = []
+    for number in range(patients):
+        patient = Patient(patient_id=f"shared-{number}", name=None, age=50, weight=70, gender="Other", clock=clock)
+        treatment = DKATreatment(rng=rng)
+        treatment.admit_patient(patient)
+        roster.append((patient, treatment))
+    for _ in range(panels):
+        for patient, treatment in roster:
+            treatment.log_bloodwork(*treatment.generate_random_bloodwork())
+            cohort.publish(patient)
+        clock.advance(timedelta(hours=1))
+    return cohort, [patient for patient, _ in roster]
+
+
+def _shared_reader(name, reads, results):
+    rss, pss = _memory_kib()
+    cohort = SharedCohort.open(name)
+    patient_ids = cohort.patient_ids()
+    for patient_id in patient_ids:  # touch every page, as a reader scanning the census would
+        cohort.values(patient_id).sum()
+    loaded = _memory_kib()
+    rng = random.Random(1)
+    latest, history = [], []
+    for _ in range(reads):
+        patient_id = rng.choice(patient_ids)
+        start = time.perf_counter()
+        cohort.latest(patient_id)
+        latest.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        cohort.values(patient_id, "anion_gap").mean()
+        history.append(time.perf_counter() - start)
+    results.put((loaded[0] - rss, loaded[1] - pss, _percentiles_us(latest), _percentiles_us(history)))
+    cohort.close()
+
+
+def _copy_reader(payload, reads, results):
+    rss, pss = _memory_kib()
+    patients = {patient.patient_id: patient for patient in pickle.loads(payload)}
+    del payload
+    loaded = _memory_kib()
+    rng = random.Random(1)
+    patient_ids = list(patients)
+    latest, history = [], []
+    for _ in range(reads):
+        patient = patients[rng.choice(patient_ids)]
+        start = time.perf_counter()
+        patient.get_electrolytes(), patient.get_pH(), patient.get_glucose()
+        patient.get_corrected_sodium(), patient.get_anion_gap()
+        latest.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        patient.series("anion_gap").values("anion_gap").mean()
+        history.append(time.perf_counter() - start)
+    results.put((loaded[0] - rss, loaded[1] - pss, _percentiles_us(latest), _percentiles_us(history)))
+
+
+def _collect(processes, results):
+    """One result per process, failing instead of waiting forever if a process died."""
+    import queue
+
+    rows = []
+    while len(rows) < len(processes):
+        try:
+            rows.append(results.get(timeout=1))
+        except queue.Empty:
+            failed = [process.exitcode for process in processes if process.exitcode]
+            if failed:
+                raise RuntimeError(f"reader process exited with {failed[0]}") from None
+    for process in processes:
+        process.join()
+    return rows
+
+
+def _run_readers(context, target, argument, readers, reads):
+    results = context.Queue()
+    processes = [context.Process(target=target, args=(argument, reads, results)) for _ in range(readers)]
+    for process in processes:
+        process.start()
+    return _collect(processes, results)
+
+
+def _torn_reader(name, seconds, results):
+    cohort = SharedCohort.open(name)
+    patient_ids = cohort.patient_ids()
+    deadline = time.perf_counter() + seconds
+    reads = torn = 0
+    last = {}
+    while time.perf_counter() < deadline:
+        patient_id = random.choice(patient_ids)
+        stamp, panel = cohort.latest(patient_id)
+        reads += 1
+        derived = panel["sodium"] + (0.016 * (panel["glucose"] - 100))
+        gap = (panel["sodium"] + panel["potassium"]) - (panel["chloride"] + panel["bicarbonate"])
+        torn += (derived != panel["corrected_sodium"] or gap != panel["anion_gap"]
+                 or stamp < last.get(patient_id, stamp))
+        last[patient_id] = stamp
+    results.put((reads, torn))
+    cohort.close()
+
+
+def torn_read_check(context, readers, seconds=2.0, patients=64):
+    """Readers poll latest panels while this process appends; returns (reads, torn reads, panels written)."""
+    cohort = SharedCohort.create(patients=patients, panels=1_000_000 // patients)
+    start = datetime(2024, 1, 1)
+    for number in range(patients):
+        cohort.append(f"torn-{number}", start, 140, 4, 100, 10, 7.1, 300)
+    results = context.Queue()
+    processes = [context.Process(target=_torn_reader, args=(cohort.name, seconds, results)) for _ in range(readers)]
+    for process in processes:
+        process.start()
+    rng = random.Random(2)
+    written = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline and written < cohort.panel_capacity * (patients - 1):
+        written += 1
+        cohort.append(f"torn-{written % patients}", start + timedelta(minutes=written), rng.uniform(120, 145),
+                      rng.uniform(2.5, 6), rng.uniform(90, 110), rng.uniform(5, 24), rng.uniform(6.8, 7.45),
+                      rng.uniform(150, 600))
+    rows = _collect(processes, results)
+    cohort.close()
+    cohort.unlink()
+    return sum(row[0] for row in rows), sum(row[1] for row in rows), written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--panels", type=int, default=200)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--reads", type=int, default=20_000, help="timed reads per reader")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")  # readers start empty instead of sharing our heap
+    start = time.perf_counter()
+    cohort, patients = build(args.patients, args.panels)
+    print(f"cohort:          {args.patients:,} patients x {args.panels} panels x {len(FIELDS)} fields, "
+          f"{cohort.memory.size / 2**20:.1f} MiB shared, built in {time.perf_counter() - start:.1f} s")
+    payload = pickle.dumps(patients)
+
+    print(f"{'mode':<8} {'RSS MiB':>9} {'PSS MiB':>9} {'latest p50/p99 us':>19} {'history p50/p99 us':>19}")
+    for mode, target, argument in (("shared", _shared_reader, cohort.name), ("copies", _copy_reader, payload)):
+        rows = _run_readers(context, target, argument, args.readers, args.reads)
+        rss = sum(row[0] for row in rows) / len(rows) / 1024
+        pss = sum(row[1] for row in rows) / len(rows) / 1024
+        latest = max(row[2][0] for row in rows), max(row[2][1] for row in rows)
+        history = max(row[3][0] for row in rows), max(row[3][1] for row in rows)
+        print(f"{mode:<8} {rss:>9.1f} {pss:>9.1f} {latest[0]:>9.1f}/{latest[1]:<9.1f} "
+              f"{history[0]:>9.1f}/{history[1]:<9.1f}")
+    print("(memory is growth per reader process; latency is the worst reader's percentile)")
+
+    reads, torn, written = torn_read_check(context, args.readers)
+    print(f"torn reads:      {torn} of {reads:,} latest-panel reads while writing {written:,} panels")
+    cohort.close()
+    cohort.unlink()
+    if torn:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
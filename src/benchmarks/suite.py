@@ -0,0 +1,512 @@
+"""Benchmark suite for the Patient/DKATreatment hot paths and the Streamlit rerun.
+
+Run from src/:
+    python -m benchmarks.suite                    # run, save results, compare with the baseline
+    python -m benchmarks.suite --save-baseline    # run and store the results as the new baseline
+    python -m benchmarks.suite --only app.rerun   # run the cases whose name contains a substring
+
+Every metric is "lower is better" (microseconds or KiB). A metric regresses when it exceeds the
+baseline by more than the tolerance; the process then exits with status 1.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from pathlib import Path
+
+from history import PanelHistory
+from patient.patient import DKATreatment, Patient
+
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+APP_PATH = BENCHMARK_DIR.parent / "app.py"
+DEFAULT_BASELINE = BENCHMARK_DIR / "baseline.json"
+DEFAULT_OUTPUT = BENCHMARK_DIR / "results.json"
+
+BENCHMARKS = {}  # name -> function returning {metric: value}
+
+
+def benchmark(name):
+    """Register a benchmark case under `name`."""
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+###########################################################
+# Helpers
+###########################################################
+def new_patient():
+    return Patient(patient_id="bench", name="Bench", age=45, weight=70, gender="Other")
+
+
+def dka_panel(rng):
+    """A panel with an open anion gap, so every protocol branch past resolution runs."""
+    return (
+        rng.uniform(125, 145),  # sodium
+        rng.uniform(3.0, 5.5),  # potassium
+        rng.uniform(95, 105),  # chloride
+        rng.uniform(5, 15),  # bicarbonate
+        rng.uniform(6.9, 7.3),  # pH
+        rng.uniform(150, 600),  # glucose
+    )
+
+
+def per_call_us(fn, number, repeat=5):
+    """Best-of-`repeat` microseconds per call of fn()."""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def latency_percentiles_us(fn, calls):
+    """p50/p99 microseconds over `calls` individually timed calls of fn()."""
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    return {
+        "p50_us": samples[len(samples) // 2] / 1e3,
+        "p99_us": samples[min(len(samples) - 1, int(len(samples) * 0.99))] / 1e3,
+    }
+
+
+def peak_kib(fn):
+    """Peak traced Python allocation while running fn(), in KiB."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+###########################################################
+# Imports
+###########################################################
+@benchmark("import.core")
+def bench_import_core(calls):
+    from benchmarks.import_budget import measure_import
+
+    result = measure_import()
+    if result["heavy"]:
+        raise RuntimeError(f"core package imports {', '.join(result['heavy'])}")
+    return {"cold_import_us": result["import_ms"] * 1e3}
+
+
+###########################################################
+# Patient
+###########################################################
+@benchmark("patient.add_electrolytes")
+def bench_add_electrolytes(calls):
+    patient = new_patient()
+    return {"us_per_call": per_call_us(lambda: patient.add_electrolytes(140, 4.2, 100, 12), calls)}
+
+
+@benchmark("patient.add_anion_gap")
+def bench_add_anion_gap(calls):
+    patient = new_patient()
+    return {"us_per_call": per_call_us(lambda: patient.add_anion_gap(140, 4.2, 100, 12), calls)}
+
+
+@benchmark("patient.add_corrected_sodium")
+def bench_add_corrected_sodium(calls):
+    patient = new_patient()
+    patient.add_electrolytes(140, 4.2, 100, 12)
+    patient.add_glucose(420)
+    return {"us_per_call": per_call_us(lambda: patient.add_corrected_sodium(140, 420), calls)}
+
+
+###########################################################
+# DKATreatment
+###########################################################
+@benchmark("treatment.analyze_bloodwork")
+def bench_analyze_bloodwork(calls):
+    patient = new_patient()
+    treatment = DKATreatment()
+    treatment.admit_patient(patient)
+    treatment.log_bloodwork(132, 4.5, 100, 10, 7.1, 420)
+    return latency_percentiles_us(lambda: treatment.analyze_bloodwork(patient), calls)
+
+
+@benchmark("treatment.treat_patient")
+def bench_treat_patient(calls):
+    runs = max(calls // 100, 10)
+    seeds = iter(range(10 * runs))
+
+    def simulate():
+        patient = new_patient()
+        treatment = DKATreatment(rng=random.Random(next(seeds)))
+        treatment.admit_patient(patient)
+        treatment.treat_patient(patient, max_steps=72, verbose=False)
+
+    return {"us_per_run": per_call_us(simulate, runs, repeat=3), "peak_kib": peak_kib(simulate)}
+
+
+###########################################################
+# LabStore
+###########################################################
+@benchmark("store.append_panel[patients=2000]")
+def bench_store_append_panel(calls):
+    from patient.store import LabStore
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        store = LabStore(Path(directory) / "labs.sqlite3")
+        treatments = []
+        for number in range(2000):
+            patient = Patient(patient_id=f"bench-{number}", name="Bench", age=45, weight=70, gender="Other")
+            treatment = DKATreatment()
+            treatment.admit_patient(patient)
+            store.attach(patient)
+            treatments.append(treatment)
+
+        panels = iter([(treatments[number % len(treatments)], dka_panel(rng)) for number in range(calls)])
+
+        def append_panel():
+            treatment, panel = next(panels)
+            with store.batch():
+                treatment.log_bloodwork(*panel)
+
+        latencies = latency_percentiles_us(append_panel, calls // 2)
+        start = time.perf_counter()
+        store.open_patient("bench-0")
+        latencies["open_patient_us"] = (time.perf_counter() - start) * 1e6
+        store.close()
+        return latencies
+
+
+###########################################################
+# Alerts
+###########################################################
+@benchmark("alerts.panels[patients=500]")
+def bench_alerts_panels(calls):
+    from benchmarks.alerts import admit, record, synthetic_panels
+    from patient.alerts import AlertEngine
+
+    feed = synthetic_panels(500, 24)
+
+    def record_all():
+        patients = admit(500)
+        engine = AlertEngine(history=None)
+        for patient in patients:
+            engine.attach(patient)
+        return record(patients, feed)
+
+    return {"us_per_panel": min(record_all() for _ in range(3)) / len(feed) * 1e6}
+
+
+###########################################################
+# Snapshots
+###########################################################
+@benchmark("snapshot.roundtrip[panels=500]")
+def bench_snapshot_roundtrip(calls):
+    from patient import snapshot
+
+    rng = random.Random(0)
+    patient = new_patient()
+    treatment = DKATreatment()
+    treatment.admit_patient(patient)
+    for _ in range(500):
+        treatment.log_bloodwork(*dka_panel(rng))
+        treatment.all_recommendations.append(list(treatment.analyze_bloodwork(patient)))
+    data = snapshot.dumps(patient, treatment)
+    number = max(calls // 100, 10)
+    return {
+        "dumps_us": per_call_us(lambda: snapshot.dumps(patient, treatment), number),
+        "loads_us": per_call_us(lambda: snapshot.loads(data), number),
+        "size_kib": len(data) / 1024,
+    }
+
+
+###########################################################
+# Derived metrics
+###########################################################
+@benchmark("derived.metrics[panels=1000]")
+def bench_derived_metrics(calls):
+    from patient.derived import METRICS
+
+    rng = random.Random(0)
+    patient = new_patient()
+    treatment = DKATreatment()
+    treatment.admit_patient(patient)
+    for _ in range(1000):
+        treatment.log_bloodwork(*dka_panel(rng))
+    metrics = patient.derived
+
+    def read_all():
+        for name in METRICS:
+            metrics.value(name)
+
+    def new_panel_then_read():
+        treatment.log_bloodwork(*dka_panel(rng))
+        read_all()
+
+    read_all()
+    results = {
+        "series_us": per_call_us(lambda: [metrics.series(name) for name in METRICS], max(calls // 100, 10)),
+        "latest_cached_us": per_call_us(read_all, calls),
+    }
+    # Both of these grow the history, so they run last.
+    logging_us = per_call_us(lambda: treatment.log_bloodwork(*dka_panel(rng)), calls)
+    results["latest_after_panel_us"] = per_call_us(new_panel_then_read, calls) - logging_us
+    return results
+
+
+###########################################################
+# Export and trend charts
+###########################################################
+def long_stay(panels, seed=0):
+    """A patient with `panels` panels a minute apart, filled without DKATreatment."""
+    from datetime import datetime, timedelta
+
+    rng = random.Random(seed)
+    patient = new_patient()
+    start = datetime(2024, 1, 1)
+    for minute in range(panels):
+        sodium, potassium, chloride, bicarbonate, pH, glucose = dka_panel(rng)
+        time = start + timedelta(minutes=minute)
+        patient.add_electrolytes(sodium, potassium, chloride, bicarbonate, time=time)
+        patient.add_pH(pH, time=time)
+        patient.add_glucose(glucose, time=time)
+    return patient
+
+
+@benchmark("export.trend_chart[panels=20000]")
+def bench_trend_chart(calls):
+    from datetime import timedelta
+
+    from patient.downsample import downsample
+    from patient.export import PanelTable, panel_batch
+
+    rng = random.Random(1)
+    patient = long_stay(20_000)
+
+    def chart_data():
+        batch = panel_batch(patient, ["anion_gap"])
+        return downsample(batch.column("time").to_numpy(), batch.column(1).to_numpy(), 300)
+
+    panels = PanelTable(patient)
+    panels.update()
+    panels.table()
+    number = max(calls // 1000, 5)
+    # More repeats than usual: the first hundred or so calls run up to twice as slow while the
+    # allocator settles on reusing these large arrays.
+    results = {
+        "chart_data_us": per_call_us(chart_data, number, repeat=10),
+        "batch_all_columns_us": per_call_us(lambda: panel_batch(patient), number, repeat=10),
+        "table_rerun_us": per_call_us(lambda: (panels.update(), panels.table()), number),
+    }
+
+    def add_panel():
+        sodium, potassium, chloride, bicarbonate, pH, glucose = dka_panel(rng)
+        time = patient.get_electrolytes()[0] + timedelta(minutes=1)
+        patient.add_electrolytes(sodium, potassium, chloride, bicarbonate, time=time)
+        patient.add_pH(pH, time=time)
+        patient.add_glucose(glucose, time=time)
+
+    def add_panel_then_update():
+        add_panel()
+        panels.update()
+        panels.table()
+
+    # Both of these grow the history, so they run last.
+    adding_us = per_call_us(add_panel, number, repeat=10)
+    results["table_new_panel_us"] = per_call_us(add_panel_then_update, number, repeat=10) - adding_us
+    return results
+
+
+@benchmark("export.parquet_incremental[panels=2000]")
+def bench_parquet_incremental(calls):
+    import pyarrow.parquet  # noqa: F401  (imported up front, not inside the first timed write)
+
+    from patient.export import ParquetExport
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        patient = new_patient()
+        treatment = DKATreatment()
+        treatment.admit_patient(patient)
+        export = ParquetExport(Path(directory) / "panels.parquet", row_group_rows=512)
+        seconds = 0.0
+        for _ in range(2000):
+            treatment.log_bloodwork(*dka_panel(rng))
+            start = time.perf_counter()
+            export.write(patient)
+            seconds += time.perf_counter() - start
+        export.close()
+        return {"write_us_per_panel": seconds / 2000 * 1e6}
+
+
+###########################################################
+# Lab feed
+###########################################################
+@benchmark("feed.replay[messages=10000]")
+def bench_feed_replay(calls):
+    import asyncio
+
+    from patient.feed import replay, simulated_messages
+
+    messages = list(simulated_messages(10_000, patients=500))
+    metrics = asyncio.run(replay(messages))
+    if metrics.processed != len(messages):
+        raise RuntimeError(f"lab feed processed {metrics.processed} of {len(messages)} messages ({metrics.last_error})")
+    return {
+        "us_per_message": 1e6 / metrics.throughput(),
+        "p50_latency_us": metrics.latency_percentile(50) * 1e6,
+        "p99_latency_us": metrics.latency_percentile(99) * 1e6,
+    }
+
+
+###########################################################
+# Streamlit rerun
+###########################################################
+def seeded_app(history_entries, seed=0):
+    """An AppTest of src/app.py whose session already holds `history_entries` lab panels."""
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    patient = new_patient()
+    treatment = DKATreatment()
+    treatment.admit_patient(patient)
+    history = PanelHistory()
+    for _ in range(history_entries):
+        sodium, potassium, chloride, bicarbonate, pH, glucose = dka_panel(rng)
+        treatment.log_bloodwork(sodium, potassium, chloride, bicarbonate, pH, glucose)
+        treatment.admission_status = treatment.admission_status or treatment.determine_severity(pH)
+        history.append(
+            {
+                "Time": "08:00 - 01/01/2024",
+                "Sodium": sodium,
+                "Potassium": potassium,
+                "Chloride": chloride,
+                "Bicarbonate": bicarbonate,
+                "pH": pH,
+                "Glucose": glucose,
+                "Anion Gap": patient.get_anion_gap()[1],
+            },
+            treatment.analyze_bloodwork(patient),
+        )
+
+    app = AppTest.from_file(str(APP_PATH), default_timeout=120)
+    app.session_state["patient_id"] = patient.patient_id
+    app.session_state["patient"] = patient
+    app.session_state["treatment"] = treatment
+    app.session_state["history"] = history
+    return app
+
+
+@contextlib.contextmanager
+def shared_script_cache():
+    """Have every AppTest run reuse one ScriptCache, as a server's Runtime does.
+
+    AppTest compiles the script afresh on each run (twice with a pages/ directory), which a server
+    does once per edit of the file; left in, compiling app.py dominates the rerun's time and peak
+    memory, and grows with the script's length rather than with the work a rerun does.
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    cache = ScriptCache()
+    saved = app_test.ScriptCache, local_script_runner.ScriptCache
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: cache
+    try:
+        yield
+    finally:
+        app_test.ScriptCache, local_script_runner.ScriptCache = saved
+
+
+def rerun_benchmark(history_entries):
+    def bench(calls):
+        app = seeded_app(history_entries)
+        reruns = max(calls // 2000, 3)
+        with contextlib.redirect_stdout(io.StringIO()), shared_script_cache():
+            app.run()
+            if app.exception:
+                raise RuntimeError(f"app.py raised during rerun: {app.exception[0].message}")
+            return {"us_per_rerun": per_call_us(app.run, 1, repeat=reruns), "peak_kib": peak_kib(app.run)}
+    return bench
+
+
+for _entries in (1, 24, 200):
+    benchmark(f"app.rerun[history={_entries}]")(rerun_benchmark(_entries))
+
+
+###########################################################
+# Runner
+###########################################################
+def run(names, calls):
+    results = {}
+    for name in names:
+        results[name] = {metric: round(value, 2) for metric, value in BENCHMARKS[name](calls).items()}
+        metrics = ", ".join(f"{metric}={value:,.1f}" for metric, value in results[name].items())
+        print(f"{name:<34} {metrics}")
+    return results
+
+
+def compare(results, baseline, tolerance, memory_tolerance):
+    """Return a list of (case, metric, baseline, current) that regressed beyond tolerance."""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(name, {}).get(metric)
+            if reference is None:
+                continue
+            allowed = memory_tolerance if metric.endswith("_kib") else tolerance
+            if value > reference * (1 + allowed):
+                regressions.append((name, metric, reference, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", action="append", help="run cases whose name contains this (repeatable)")
+    parser.add_argument("--calls", type=int, default=20_000, help="calls per micro-benchmark")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative slowdown")
+    parser.add_argument("--memory-tolerance", type=float, default=0.2, help="allowed relative memory growth")
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if not args.only or any(part in name for part in args.only)]
+    results = run(names, args.calls)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+    if args.save_baseline:
+        if args.baseline.exists():
+            # Keep cases that were not part of this run.
+            stored = json.loads(args.baseline.read_text())
+            report["results"] = {**stored["results"], **results}
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    args.output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"Results saved to {args.output}")
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+
+    regressions = compare(results, json.loads(args.baseline.read_text())["results"],
+                          args.tolerance, args.memory_tolerance)
+    for name, metric, reference, value in regressions:
+        print(f"REGRESSION {name} {metric}: {reference:,.1f} -> {value:,.1f} ({value / reference - 1:+.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+import pyarrow as pa  # ships with streamlit; Arrow tables skip the pandas conversion in st.dataframe
+
+
+UNITS = {
+    "Sodium": "mmol/L",
+    "Potassium": "mmol/L",
+    "Chloride": "mmol/L",
+    "Bicarbonate": "mmol/L",
+    "pH": "pH scale",
+    "Glucose": "mg/dL",
+    "Anion Gap": "mmol/L",
+}
+TESTS = tuple(UNITS)
+COLUMNS = ("Time",) + TESTS
+
+
+class PanelHistory:
+    """Lab panels entered during a session, kept as one column-wise table that only grows.
+
+    Rendered per-panel tables are memoized, so a rerun only builds the table of a panel that
+    has not been displayed before.
+    """
+
+    def __init__(self):
+        self.columns = {name: [] for name in COLUMNS}
+        self.recommendations = []
+        self._tables = []
+
+    def __len__(self):
+        return len(self.recommendations)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.entry(index)
+
+    def append(self, measurements, recommendations):
+        """Add one panel: a {column: value} dict and the recommendations given for it."""
+        for name in COLUMNS:
+            self.columns[name].append(measurements[name])
+        self.recommendations.append(list(recommendations))
+
+    def entry(self, index):
+        """Return panel `index` as (measurements dict, recommendations)."""
+        return {name: self.columns[name][index] for name in COLUMNS}, self.recommendations[index]
+
+    def latest(self):
+        """Return the measurements of the latest panel."""
+        return self.entry(-1)[0]
+
+    def measurement_table(self, index):
+        """Return the Test/Value/Units table of panel `index`, built once."""
+        self._tables.extend([None] * (len(self) - len(self._tables)))
+        if self._tables[index] is None:
+            self._tables[index] = pa.table({
+                "Test": list(TESTS),
+                "Value": [self.columns[test][index] for test in TESTS],
+                "Units": [UNITS[test] for test in TESTS],
+            })
+        return self._tables[index]
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import streamlit as st
+
+from patient.clock import FOLLOW_UP_INTERVAL
+from patient.patient import DKASeverity
+from ward import add_simulated_patients, get_lab_feed, get_registry
+
+
+SORTS = {
+    "Anion gap (highest first)": ("anion_gap", True),
+    "Time since last lab (longest first)": ("last_lab", False),
+}
+# label -> function(registry, now) returning the matching patient ids, or None for everyone
+QUERIES = {
+    "All patients": lambda registry, now: None,
+    "Latest K < 3.5": lambda registry, now: registry.census.latest("potassium", hi=3.5),
+    "Anion gap > 20 for more than 6 hours": lambda registry, now: registry.census.exceeding(
+        "anion_gap>20", timedelta(hours=6), now
+    ),
+    "Latest pH < 7.0": lambda registry, now: registry.census.latest("pH", hi=7.0),
+    "Overdue for hourly labs": lambda registry, now: [
+        entry.patient.patient_id for entry in registry.overdue(now, FOLLOW_UP_INTERVAL)
+    ],
+}
+
+registry = get_registry()
+feed = get_lab_feed()
+
+st.title("🏥 Ward Board")
+
+with st.sidebar:
+    if st.button("➕ Add 50 simulated patients"):
+        add_simulated_patients(50)
+
+severities = st.multiselect(
+    "Severity", list(DKASeverity), default=list(DKASeverity), format_func=lambda severity: severity.value
+)
+sort, descending = SORTS[st.radio("Sort by", list(SORTS), horizontal=True)]
+query = QUERIES[st.selectbox("Show", list(QUERIES))]
+
+
+@st.fragment(run_every=2 if feed is not None else None)  # follow results arriving from the lab feed
+def write_board():
+    if feed is not None:
+        summary = feed.metrics.summary()
+        st.caption(
+            f"Lab feed: {summary['processed']} results, {summary['failed']} failed, "
+            f"p99 latency {summary['latency_p99_ms']} ms"
+        )
+    now = datetime.now()
+    entries = registry.board(
+        severities=severities, sort=sort, descending=descending, patient_ids=query(registry, now)
+    )
+    if not entries:
+        st.info("No matching patients. Create one on the main page or add simulated patients from the sidebar.")
+    else:
+        st.caption(f"{len(entries)} of {len(registry)} active patients")
+        st.dataframe(
+            pd.DataFrame({
+                "Name": [entry.patient.name or entry.patient.patient_id for entry in entries],
+                "Severity": [entry.severity.value if entry.severity else "" for entry in entries],
+                "Anion Gap": [entry.anion_gap for entry in entries],
+                "Minutes Since Last Lab": [
+                    round((now - entry.last_lab).total_seconds() / 60) if entry.last_lab else None for entry in entries
+                ],
+                "Insulin Drip": [entry.patient.insulin_drip for entry in entries],
+                "Alerts": [
+                    ", ".join(alert.rule.name for alert in registry.alerts.active(entry.patient.patient_id))
+                    for entry in entries
+                ],
+                "Latest Recommendation": [
+                    next((rec for rec in entry.recommendations if rec.startswith("Run IV")),
+                         entry.recommendations[0] if entry.recommendations else "")
+                    for entry in entries
+                ],
+            }),
+            hide_index=True,
+        )
+
+
+write_board()
@@ -0,0 +1,260 @@
+"""Streaming alerts on dangerous lab trajectories.
+
+The protocol scores one panel at a time; these rules look at how an analyte moved over a recent
+time window. Each (patient, rule) keeps monotonic deques of the window's samples, so the window
+max and min, and the fall, rise and rates derived from them, cost O(1) amortized per sample.
+Samples leave a window only by age. If a feed floods one patient past MAX_WINDOW_SAMPLES, the
+oldest sample is dropped and the window's rule is not evaluated (its alert state is kept) until the
+dropped sample would have aged out, since until then the window max or min may be missing.
+
+A rule is a plain dict (see DEFAULT_ALERTS):
+
+    name          unique name, used to deduplicate
+    analyte       a patient.census.ANALYTES name
+    measure       "value"      latest value
+                  "fall"       window max - latest            "rise"       latest - window min
+                  "fall_rate"  fall per hour since the max    "rise_rate"  rise per hour since the min
+                  "change"     largest of fall and rise
+    window_hours  how far back the window reaches (not needed for "value")
+    above/below   the measure fires when > above or < below
+    requires      optional "insulin_drip": only evaluate while the patient's drip runs
+    message       shown to clinicians
+
+An alert fires once when its rule becomes true and re-arms only after the rule clears.
+"""
+import math
+import threading
+from collections import deque
+from datetime import timedelta
+
+from patient.census import ANALYTES
+from patient.patient import Patient
+
+
+DEFAULT_ALERTS = [
+    {
+        "name": "glucose_falling_fast",
+        "analyte": "glucose",
+        "measure": "fall_rate",
+        "window_hours": 2,
+        "above": 100,
+        "message": "Glucose falling faster than 100 mg/dL/hr",
+    },
+    {
+        "name": "potassium_crash_on_insulin",
+        "analyte": "potassium",
+        "measure": "fall",
+        "window_hours": 4,
+        "above": 1.0,
+        "requires": "insulin_drip",
+        "message": "Potassium fell more than 1 mmol/L in 4 hours on the insulin drip",
+    },
+    {
+        "name": "hypokalemia_on_insulin",
+        "analyte": "potassium",
+        "measure": "value",
+        "below": 3.3,
+        "requires": "insulin_drip",
+        "message": "Potassium below 3.3 mmol/L on the insulin drip: hold insulin and replace potassium",
+    },
+    {
+        "name": "sodium_changing_fast",
+        "analyte": "corrected_sodium",
+        "measure": "change",
+        "window_hours": 24,
+        "above": 10,
+        "message": "Corrected sodium changed more than 10 mmol/L in 24 hours",
+    },
+]
+
+MEASURES = ("value", "fall", "rise", "fall_rate", "rise_rate", "change")
+MAX_WINDOW_SAMPLES = 256  # per deque of a (patient, rule) window; bounds memory if a feed floods one patient
+
+
+class AlertRule:
+    """One compiled alert definition."""
+
+    __slots__ = (
+        "name", "analyte", "measure", "window", "above", "below", "requires", "message", "_high", "_low", "_rate",
+        "_above", "_below",
+    )
+
+    def __init__(self, definition):
+        self.name = definition["name"]
+        self.analyte = definition["analyte"]
+        self.measure = definition["measure"]
+        if self.analyte not in ANALYTES:
+            raise ValueError(f"{self.name}: unknown analyte {self.analyte!r}")
+        if self.measure not in MEASURES:
+            raise ValueError(f"{self.name}: measure must be one of {MEASURES}, got {self.measure!r}")
+        if self.measure != "value" and "window_hours" not in definition:
+            raise ValueError(f"{self.name}: measure {self.measure!r} needs window_hours")
+        self.window = timedelta(hours=definition.get("window_hours", 0))
+        self.above = definition.get("above")
+        self.below = definition.get("below")
+        if self.above is None and self.below is None:
+            raise ValueError(f"{self.name}: needs 'above' or 'below'")
+        self.requires = definition.get("requires")
+        if self.requires not in (None, "insulin_drip"):
+            raise ValueError(f"{self.name}: unknown requirement {self.requires!r}")
+        self.message = definition.get("message", self.name)
+        self._high = self.measure in ("fall", "fall_rate", "change")  # needs the window max
+        self._low = self.measure in ("rise", "rise_rate", "change")  # needs the window min
+        self._rate = self.measure in ("fall_rate", "rise_rate")
+        # Unset bounds as infinities, so checking one is a single comparison.
+        self._above = math.inf if self.above is None else self.above
+        self._below = -math.inf if self.below is None else self.below
+
+    def breached(self, value):
+        return value > self._above or value < self._below
+
+
+class Alert:
+    """A fired alert."""
+
+    __slots__ = ("rule", "patient_id", "time", "value")
+
+    def __init__(self, rule: AlertRule, patient_id, time, value):
+        self.rule = rule
+        self.patient_id = patient_id
+        self.time = time
+        self.value = value  # the rule's measure when it fired
+
+    @property
+    def message(self):
+        return self.rule.message
+
+    def __repr__(self):
+        return f"Alert({self.rule.name!r}, {self.patient_id!r}, {self.time}, {self.value:.4g})"
+
+
+class _Window:
+    """Monotonic deques of (time, value) over one rule's window for one patient."""
+
+    __slots__ = ("high", "low", "last", "alert", "dropped")
+
+    def __init__(self):
+        self.high = deque()  # values decreasing: front is the window max
+        self.low = deque()  # values increasing: front is the window min
+        self.last = None  # time of the latest sample
+        self.alert = None  # the firing Alert until the rule clears
+        self.dropped = None  # time of the latest sample dropped over MAX_WINDOW_SAMPLES while still in the window
+
+
+class AlertEngine:
+    """Evaluates alert rules incrementally on every sample of the patients it follows."""
+
+    def __init__(self, definitions=DEFAULT_ALERTS, history=1000):
+        self.rules = [AlertRule(definition) for definition in definitions]
+        if len({rule.name for rule in self.rules}) != len(self.rules):
+            raise ValueError("alert rule names must be unique")
+        self._by_series = {}  # series -> [(field index, rule)]
+        for rule in self.rules:
+            series, index = ANALYTES[rule.analyte]
+            self._by_series.setdefault(series, []).append((index, rule))
+        self._windows = {}  # patient_id -> {series: [(field index, rule, _Window)]}
+        self._lock = threading.Lock()
+        self.listeners = []  # called with each new Alert
+        self.history = deque(maxlen=history)  # latest fired alerts, oldest first
+
+    def attach(self, patient: Patient):
+        """Evaluate the patient's future samples."""
+        patient.subscribe(self._on_sample)
+        return self
+
+    def detach(self, patient: Patient):
+        """Stop following a patient and forget its windows and active alerts."""
+        patient.unsubscribe(self._on_sample)
+        with self._lock:
+            self._windows.pop(patient.patient_id, None)
+
+    def _on_sample(self, patient, series, row):
+        if series in self._by_series:
+            self.observe(patient.patient_id, series, row, patient.insulin_drip)
+
+    def observe(self, patient_id, series, row, insulin_drip=False):
+        """Feed one sample row (time, *values); returns the alerts it fired."""
+        fired = []
+        time = row[0]
+        with self._lock:
+            windows = self._windows.get(patient_id)
+            if windows is None:
+                windows = self._windows[patient_id] = {
+                    name: [(index, rule, _Window()) for index, rule in rules] for name, rules in self._by_series.items()
+                }
+            for index, rule, window in windows.get(series, ()):
+                value = row[1 + index]
+                if value is None or value != value:
+                    continue
+                if window.last is not None and time < window.last:
+                    continue  # late samples do not move the window
+                window.last = time
+                if rule.measure == "value":
+                    measure = value
+                else:
+                    measure = _measure(rule, window, time, value)
+                    if window.dropped is not None:
+                        continue  # the window lost samples over its cap: its measure is not trustworthy yet
+                if measure is not None and rule.breached(measure) and (rule.requires is None or insulin_drip):
+                    if window.alert is None:
+                        window.alert = Alert(rule, patient_id, time, measure)
+                        fired.append(window.alert)
+                else:
+                    window.alert = None
+            self.history.extend(fired)
+        for alert in fired:
+            for listener in self.listeners:
+                listener(alert)
+        return fired
+
+    def active(self, patient_id):
+        """The patient's alerts that fired and have not cleared since."""
+        with self._lock:
+            windows = self._windows.get(patient_id, {})
+            return [window.alert for rules in windows.values() for _, _, window in rules if window.alert is not None]
+
+
+def _measure(rule, window, time, value):
+    """Push a sample into the window and return the rule's windowed measure, or None if undefined yet.
+
+    Sets window.dropped while a sample dropped over MAX_WINDOW_SAMPLES is still inside the window.
+    """
+    cutoff = time - rule.window
+    if rule._high:
+        high = window.high
+        while high and high[-1][1] <= value:
+            high.pop()
+        high.append((time, value))
+        while high[0][0] < cutoff:
+            high.popleft()
+        if len(high) > MAX_WINDOW_SAMPLES:
+            _drop_oldest(window, high)
+    if rule._low:
+        low = window.low
+        while low and low[-1][1] >= value:
+            low.pop()
+        low.append((time, value))
+        while low[0][0] < cutoff:
+            low.popleft()
+        if len(low) > MAX_WINDOW_SAMPLES:
+            _drop_oldest(window, low)
+    if window.dropped is not None and window.dropped < cutoff:
+        window.dropped = None  # every dropped sample has aged out: the deques hold the whole window again
+
+    if rule._rate:
+        start, extreme = window.high[0] if rule._high else window.low[0]
+        hours = (time - start).total_seconds() / 3600
+        if not hours:
+            return None
+        return (extreme - value if rule._high else value - extreme) / hours
+    if rule.measure == "fall":
+        return window.high[0][1] - value
+    if rule.measure == "rise":
+        return value - window.low[0][1]
+    return max(window.high[0][1] - value, value - window.low[0][1])  # change
+
+
+def _drop_oldest(window, samples):
+    dropped = samples.popleft()[0]
+    if window.dropped is None or dropped > window.dropped:
+        window.dropped = dropped
@@ -0,0 +1,97 @@
+from patient import derived, protocol as dka_protocol
+from patient.protocol import FOLLOW_UP_MESSAGE, RESOLVED_MESSAGE, START_INSULIN_MESSAGE
+
+
+def _column(values):
+    import numpy as np  # loaded on first use so importing the package stays cheap
+
+    return np.asarray(values, dtype=np.float64)
+
+
+def determine_severity(pH, protocol=None):
+    """Vectorized DKATreatment.determine_severity; returns indexes into protocol.severity_table.outcomes."""
+    return (protocol or dka_protocol.active()).severity_table.indexes(pH)
+
+
+def check_resolution(anion_gap, protocol=None):
+    """Vectorized DKATreatment.check_resolution."""
+    import numpy as np
+
+    table = (protocol or dka_protocol.active()).resolution_table
+    return np.asarray(table.outcomes, dtype=bool)[table.indexes(anion_gap)]
+
+
+def recommend_fluids(glucose, corrected_sodium, potassium, protocol=None):
+    """Vectorized fluid choice of DKATreatment.analyze_bloodwork; returns indexes into protocol.fluid_table.outcomes."""
+    return (protocol or dka_protocol.active()).fluid_table.indexes(glucose, corrected_sodium, potassium)
+
+
+class BatchScores:
+    """Per-row protocol outputs for a batch of lab panels."""
+
+    def __init__(self, protocol, severity, resolved, start_insulin, fluids):
+        self.protocol = protocol
+        self.severity = severity
+        self.resolved = resolved
+        self.start_insulin = start_insulin
+        self.fluids = fluids
+
+    def __len__(self):
+        return len(self.severity)
+
+    def severity_of(self, row):
+        """Return the DKASeverity for one row."""
+        return self.protocol.severity_table.outcomes[self.severity[row]]
+
+    def fluids_of(self, row):
+        """Return the fluid recommendation for one row, or None once DKA has resolved."""
+        return None if self.resolved[row] else self.protocol.fluid_table.outcomes[self.fluids[row]]
+
+    def recommendations(self, row):
+        """Return the recommendation list DKATreatment.analyze_bloodwork gives for one row."""
+        if self.resolved[row]:
+            return [RESOLVED_MESSAGE]
+        recommendations = []
+        if self.start_insulin[row]:
+            recommendations.append(START_INSULIN_MESSAGE)
+        recommendations.append(self.protocol.fluid_table.outcomes[self.fluids[row]])
+        recommendations.append(FOLLOW_UP_MESSAGE)
+        return recommendations
+
+
+def score_panels(panels=None, protocol=None, **columns):
+    """Score many lab panels in one vectorized pass.
+
+    Columns are taken from `panels` (a pandas DataFrame or any mapping of arrays) and/or keyword
+    arrays: glucose, pH, potassium and either corrected_sodium/anion_gap or the raw sodium,
+    chloride and bicarbonate they are derived from. An optional insulin_drip column marks rows
+    whose patient is already on a drip. Uses the active protocol unless one is given.
+    """
+    import numpy as np
+
+    protocol = protocol or dka_protocol.active()
+    if panels is not None:
+        columns = {**{name: panels[name] for name in panels.keys()}, **columns}
+
+    glucose = _column(columns["glucose"])
+    potassium = _column(columns["potassium"])
+    if "corrected_sodium" in columns:
+        corrected_sodium = _column(columns["corrected_sodium"])
+    else:
+        corrected_sodium = derived.corrected_sodium(_column(columns["sodium"]), glucose)
+    if "anion_gap" in columns:
+        anion_gap = _column(columns["anion_gap"])
+    else:
+        anion_gap = derived.anion_gap(
+            _column(columns["sodium"]), potassium, _column(columns["chloride"]), _column(columns["bicarbonate"])
+        )
+    insulin_drip = np.broadcast_to(np.asarray(columns.get("insulin_drip", False), dtype=bool), glucose.shape)
+
+    resolved = check_resolution(anion_gap, protocol)
+    return BatchScores(
+        protocol=protocol,
+        severity=determine_severity(columns["pH"], protocol),
+        resolved=resolved,
+        start_insulin=~resolved & ~insulin_drip,
+        fluids=recommend_fluids(glucose, corrected_sodium, potassium, protocol),
+    )
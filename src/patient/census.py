@@ -0,0 +1,194 @@
+"""Indexed queries across every patient on the census.
+
+A Census follows patients through Patient.subscribe and keeps, per analyte, a SortedIndex of each
+patient's latest value, plus threshold watches that track exceedance episodes (intervals during
+which a patient's value stayed past a threshold). Both are updated by the add_* calls, so queries
+are a bisect plus the hits instead of a walk over every patient's history:
+
+    census.latest("potassium", hi=3.5)                          # latest K < 3.5
+    census.exceeding("anion_gap>20", timedelta(hours=6), now)   # AG > 20 for more than 6 hours
+"""
+import threading
+from bisect import bisect_left, insort
+from itertools import count
+
+from patient.index import SortedIndex
+from patient.patient import Patient
+
+
+# analyte -> (series, field index)
+ANALYTES = {
+    field: (series, index) for series, fields in Patient.SERIES.items() for index, field in enumerate(fields)
+}
+ANALYTES["glucose"] = ANALYTES.pop("glucose_mg_dl")
+ANALYTES["ketones"] = ANALYTES.pop("beta_hydroxybutyrate_mmol_L")
+
+DEFAULT_WATCHES = (
+    ("anion_gap>20", "anion_gap", ">", 20),
+    ("potassium<3.5", "potassium", "<", 3.5),
+    ("pH<7.0", "pH", "<", 7.0),
+)
+
+
+class Episode:
+    """One stretch of a patient's values past a watch threshold; `end` is None while it lasts."""
+
+    __slots__ = ("patient_id", "start", "end", "peak")
+
+    def __init__(self, patient_id, start, peak):
+        self.patient_id = patient_id
+        self.start = start
+        self.end = None  # time of the first sample back within the threshold
+        self.peak = peak  # furthest value past the threshold
+
+    def duration(self, now=None):
+        return (self.end if self.end is not None else now) - self.start
+
+    def __repr__(self):
+        return f"Episode({self.patient_id!r}, {self.start}, {self.end}, peak={self.peak})"
+
+
+class ThresholdWatch:
+    """Exceedance episodes of one analyte beyond a threshold ("<" or ">", strict)."""
+
+    __slots__ = ("name", "analyte", "comparison", "threshold", "_open", "_current", "_closed", "_seq")
+
+    def __init__(self, name, analyte, comparison, threshold):
+        if analyte not in ANALYTES:
+            raise ValueError(f"unknown analyte {analyte!r}; expected one of {sorted(ANALYTES)}")
+        if comparison not in ("<", ">"):
+            raise ValueError(f"comparison must be '<' or '>', got {comparison!r}")
+        self.name = name
+        self.analyte = analyte
+        self.comparison = comparison
+        self.threshold = threshold
+        self._open = SortedIndex()  # patient_id -> start of the open episode
+        self._current = {}  # patient_id -> open Episode
+        self._closed = []  # sorted [(end, start, patient_id, seq, Episode)]
+        self._seq = count()  # breaks ties so Episodes are never compared
+
+    def exceeds(self, value):
+        return value < self.threshold if self.comparison == "<" else value > self.threshold
+
+    def update(self, patient_id, time, value):
+        """Open, extend or close the patient's episode with a new latest value."""
+        episode = self._current.get(patient_id)
+        if self.exceeds(value):
+            if episode is None:
+                self._current[patient_id] = Episode(patient_id, time, value)
+                self._open.set(patient_id, time)
+            elif (value < episode.peak) if self.comparison == "<" else (value > episode.peak):
+                episode.peak = value
+        elif episode is not None:
+            self.close(patient_id, time)
+
+    def close(self, patient_id, time):
+        """End the patient's open episode at `time`, if there is one."""
+        episode = self._current.pop(patient_id, None)
+        if episode is not None:
+            self._open.discard(patient_id)
+            episode.end = time
+            insort(self._closed, (time, episode.start, patient_id, next(self._seq), episode))
+
+    def open_before(self, time):
+        """Patients whose open episode started before `time`, longest-running first."""
+        return self._open.range(hi=time)
+
+    def current(self, patient_id):
+        """The patient's open Episode, or None."""
+        return self._current.get(patient_id)
+
+    def episodes(self, start=None, end=None):
+        """Episodes overlapping [start, end), closed ones by end time and then the open ones."""
+        lo = 0 if start is None else bisect_left(self._closed, (start,))
+        closed = [
+            episode for finished, began, _, _, episode in self._closed[lo:]
+            if (start is None or finished > start) and (end is None or began < end)
+        ]
+        still_open = [self._current[patient_id] for patient_id in self._open.range(hi=end)]
+        return closed + still_open
+
+
+class Census:
+    """Latest-value indexes and threshold watches over a set of patients."""
+
+    def __init__(self, watches=DEFAULT_WATCHES):
+        self._lock = threading.Lock()
+        self._latest = {analyte: SortedIndex() for analyte in ANALYTES}
+        self._times = {}  # (patient_id, series) -> time of the latest indexed sample
+        self._analytes = {}  # series -> [(analyte, field index)]
+        for analyte, (series, index) in ANALYTES.items():
+            self._analytes.setdefault(series, []).append((analyte, index))
+        self.watches = {}
+        self._watching = {}  # analyte -> [ThresholdWatch]
+        for watch in watches:
+            self.watch(*watch)
+
+    def watch(self, name, analyte, comparison, threshold):
+        """Track episodes of `analyte` past `threshold` from the next sample on."""
+        watch = ThresholdWatch(name, analyte, comparison, threshold)
+        with self._lock:
+            self.watches[name] = watch
+            self._watching.setdefault(analyte, []).append(watch)
+        return watch
+
+    def attach(self, patient: Patient):
+        """Index `patient`'s recorded samples and follow its future ones."""
+        with self._lock:
+            for series in self._analytes:
+                for row in patient.series(series):
+                    self._index(patient.patient_id, series, row)
+            patient.subscribe(self._on_sample)
+        return self
+
+    def detach(self, patient: Patient):
+        """Stop following `patient` and drop it from every index; past episodes are kept."""
+        with self._lock:
+            patient.unsubscribe(self._on_sample)
+            for index in self._latest.values():
+                index.discard(patient.patient_id)
+            for series in self._analytes:
+                self._times.pop((patient.patient_id, series), None)
+            for watch in self.watches.values():
+                watch.close(patient.patient_id, patient.clock.now())
+
+    def _on_sample(self, patient, series, row):
+        if series in self._analytes:
+            with self._lock:
+                self._index(patient.patient_id, series, row)
+
+    def _index(self, patient_id, series, row):
+        time = row[0]
+        latest = self._times.get((patient_id, series))
+        if latest is not None and time < latest:
+            return  # a late sample does not change the latest value
+        self._times[patient_id, series] = time
+        for analyte, index in self._analytes[series]:
+            value = row[1 + index]
+            if value is None or value != value:
+                continue
+            self._latest[analyte].set(patient_id, value)
+            for watch in self._watching.get(analyte, ()):
+                watch.update(patient_id, time, value)
+
+    ###########################################################
+    # Queries
+    ###########################################################
+    def value(self, analyte, patient_id):
+        """The patient's latest value of `analyte`, or None."""
+        return self._latest[analyte].get(patient_id)
+
+    def latest(self, analyte, lo=None, hi=None):
+        """Patients whose latest `analyte` value is in [lo, hi), in value order."""
+        with self._lock:
+            return self._latest[analyte].range(lo, hi)
+
+    def exceeding(self, watch, longer_than, now):
+        """Patients past a watch's threshold continuously for more than `longer_than`, longest first."""
+        with self._lock:
+            return self.watches[watch].open_before(now - longer_than)
+
+    def episodes(self, watch, start=None, end=None):
+        """A watch's Episodes overlapping [start, end)."""
+        with self._lock:
+            return self.watches[watch].episodes(start, end)
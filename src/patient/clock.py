@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """Wall-clock time. advance() is a no-op: real time passes by itself."""
+
+    __slots__ = ()
+
+    def now(self):
+        return datetime.now()
+
+    def advance(self, delta):
+        pass
+
+
+class VirtualClock:
+    """A clock that only moves when told to, for replays and faster-than-real-time simulation."""
+
+    __slots__ = ("time",)
+
+    def __init__(self, start=None):
+        self.time = start or datetime(2024, 1, 1)
+
+    def now(self):
+        return self.time
+
+    def advance(self, delta):
+        self.time += delta
+
+    def set(self, time):
+        self.time = time
+
+
+SYSTEM_CLOCK = SystemClock()
+FOLLOW_UP_INTERVAL = timedelta(hours=1)  # between simulated panels, as FOLLOW_UP_MESSAGE asks
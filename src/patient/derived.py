@@ -0,0 +1,244 @@
+"""Metrics derived from a patient's recorded labs, computed when read instead of when recorded.
+
+METRICS is the dependency graph. Each metric has a formula and its inputs, which are recorded
+fields ("series.field"), patient attributes ("@weight") or other metrics. Formulas use plain
+arithmetic, so the same function takes floats for one panel or NumPy arrays for a whole series.
+
+A panel is an electrolytes sample. Every other input is joined as of the panel's time: it takes
+its latest sample at or before that time.
+
+DerivedMetrics memoizes per-panel values. A new sample invalidates only what it can change: the
+panels at or after its time, for the metrics that depend on its series.
+"""
+from bisect import bisect_left, insort
+
+from patient.series import from_epoch_us, to_epoch_us
+
+
+NORMAL_ANION_GAP = 12.0  # mEq/L, the protocol's resolution cut
+NORMAL_BICARBONATE = 24.0  # mEq/L
+TARGET_POTASSIUM = 4.0  # mEq/L
+POTASSIUM_SPACE = 0.4  # L/kg of body weight the potassium deficit is spread over
+ANCHOR = "electrolytes"  # the series whose samples are panels
+
+
+###########################################################
+# Formulas
+###########################################################
+def corrected_sodium(sodium, glucose):
+    """Sodium corrected for hyperglycemia: +1.6 mEq/L per 100 mg/dL of glucose above 100."""
+    return sodium + (0.016 * (glucose - 100))
+
+
+def anion_gap(sodium, potassium, chloride, bicarbonate):
+    """Anion gap with potassium: (Na + K) - (Cl + HCO3)."""
+    return (sodium + potassium) - (chloride + bicarbonate)
+
+
+def effective_osmolality(sodium, glucose):
+    """Effective serum osmolality (mOsm/kg): 2 Na + glucose / 18."""
+    return 2 * sodium + glucose / 18
+
+
+def delta_delta(anion_gap, bicarbonate):
+    """Delta-delta ratio: rise in anion gap over fall in bicarbonate; undefined at normal bicarbonate."""
+    return _ratio(anion_gap - NORMAL_ANION_GAP, NORMAL_BICARBONATE - bicarbonate)
+
+
+def potassium_deficit(potassium, weight):
+    """Approximate total-body potassium deficit (mEq); negative above the target potassium."""
+    return (TARGET_POTASSIUM - potassium) * POTASSIUM_SPACE * weight
+
+
+def _ratio(numerator, denominator):
+    if isinstance(denominator, (int, float)):
+        return numerator / denominator if denominator else None
+    import numpy as np
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator != 0, numerator / denominator, np.nan)
+
+
+# metric -> (formula, inputs in formula argument order)
+METRICS = {
+    "corrected_sodium": (corrected_sodium, ("electrolytes.sodium", "glucose.glucose_mg_dl")),
+    "anion_gap": (anion_gap, (
+        "electrolytes.sodium", "electrolytes.potassium", "electrolytes.chloride", "electrolytes.bicarbonate",
+    )),
+    "effective_osmolality": (effective_osmolality, ("electrolytes.sodium", "glucose.glucose_mg_dl")),
+    "delta_delta": (delta_delta, ("anion_gap", "electrolytes.bicarbonate")),
+    "potassium_deficit": (potassium_deficit, ("electrolytes.potassium", "@weight")),
+}
+
+
+def _series_inputs(name, seen=()):
+    """Recorded series `name` depends on, directly or through other metrics."""
+    if name in seen:
+        raise ValueError(f"derived metric cycle: {' -> '.join((*seen, name))}")
+    series = {ANCHOR}
+    for spec in METRICS[name][1]:
+        if spec in METRICS:
+            series |= _series_inputs(spec, (*seen, name))
+        elif not spec.startswith("@"):
+            series.add(spec.partition(".")[0])
+    return series
+
+
+# series -> metrics a new sample of it can change
+DEPENDENTS = {}
+for name in METRICS:
+    for series in _series_inputs(name):
+        DEPENDENTS.setdefault(series, []).append(name)
+# metric -> patient attributes it reads directly, which memoized values are checked against
+ATTRIBUTES = {
+    name: tuple(spec[1:] for spec in inputs if spec.startswith("@")) for name, (_, inputs) in METRICS.items()
+}
+
+
+def _parse(spec):
+    if spec in METRICS:
+        return "metric", spec, None
+    if spec.startswith("@"):
+        return "attribute", spec[1:], None
+    series, _, field = spec.partition(".")
+    return "series", series, field
+
+
+# metric -> (formula, [(kind, name, field)]), the inputs parsed once
+_PLANS = {name: (formula, tuple(_parse(spec) for spec in inputs)) for name, (formula, inputs) in METRICS.items()}
+
+
+def _missing(value):
+    return value is None or value != value  # NaN
+
+
+class DerivedMetrics:
+    """Lazily computed, memoized METRICS of one patient's panels; see Patient.derived."""
+
+    __slots__ = ("patient", "_memo", "_times")
+
+    def __init__(self, patient):
+        self.patient = patient
+        self._memo = {name: {} for name in METRICS}  # metric -> {panel epoch µs: (attributes, value)}
+        self._times = {name: [] for name in METRICS}  # metric -> sorted panel epoch µs in _memo
+
+    def invalidate(self, series, time):
+        """Forget memoized panels at or after `time` of the metrics that depend on `series`."""
+        stamp = None
+        for name in DEPENDENTS.get(series, ()):
+            times = self._times[name]
+            if times:
+                stamp = to_epoch_us(time) if stamp is None else stamp
+            if times and times[-1] >= stamp:
+                index = bisect_left(times, stamp)
+                memo = self._memo[name]
+                for stale in times[index:]:
+                    del memo[stale]
+                del times[index:]
+
+    def clear(self):
+        for name in METRICS:
+            self._memo[name].clear()
+            self._times[name].clear()
+
+    def value(self, name, time=None):
+        """(panel time, value) of a metric at the latest panel taken at or before `time` (default: the latest panel).
+
+        The value is None when an input has no sample at or before the panel or the metric is
+        undefined there; (None, None) when there is no such panel.
+        """
+        if name not in METRICS:
+            raise KeyError(f"unknown derived metric {name!r}; expected one of {sorted(METRICS)}")
+        anchor = self.patient.series(ANCHOR)
+        index = (len(anchor) - 1 if len(anchor) else None) if time is None else anchor.asof(time)
+        if index is None:
+            return None, None
+        stamp = anchor.stamp(index)
+        return from_epoch_us(stamp), self._value(name, stamp)
+
+    def _value(self, name, stamp):
+        attributes = tuple(getattr(self.patient, attribute) for attribute in ATTRIBUTES[name])
+        memoized = self._memo[name].get(stamp)
+        if memoized is not None and memoized[0] == attributes:
+            return memoized[1]
+        formula, inputs = _PLANS[name]
+        arguments = []
+        for kind, source, field in inputs:
+            if kind == "series":
+                series = self.patient.series(source)
+                index = series.asof(stamp)
+                argument = None if index is None else series.value(index, field)
+            elif kind == "metric":
+                argument = self._value(source, stamp)
+            else:
+                argument = getattr(self.patient, source)
+            if _missing(argument):
+                break
+            arguments.append(argument)
+        value = formula(*arguments) if len(arguments) == len(inputs) else None
+        if memoized is None:
+            insort(self._times[name], stamp)
+        self._memo[name][stamp] = (attributes, value)
+        return value
+
+    def panel_times(self, since=None):
+        """datetime64[us] times of every panel in time order, or only of those taken after `since`."""
+        import numpy as np
+
+        anchor = self.patient.series(ANCHOR)
+        times = anchor.times() if anchor.ordered else np.sort(anchor.times(), kind="stable")
+        if since is not None:
+            times = times[np.searchsorted(times, np.datetime64(to_epoch_us(since), "us"), side="right"):]
+        return times
+
+    def columns(self, names, since=None):
+        """Vectorized values at every panel, or those taken after `since`: (times, {name: float64 array}).
+
+        `names` are METRICS or recorded fields ("series.field"); values are NaN where undefined.
+        """
+        import numpy as np
+
+        times = self.panel_times(since)
+        computed = {}
+        return times, {name: self._column(name, times, computed, np) for name in names}
+
+    def series(self, name):
+        """Vectorized metric over every panel: (datetime64[us] times, float64 values, NaN where undefined)."""
+        times, columns = self.columns((name,))
+        return times, columns[name]
+
+    def _column(self, spec, times, computed, np):
+        if spec not in computed:
+            if spec in METRICS:
+                formula, inputs = METRICS[spec]
+                arguments = [self._column(argument, times, computed, np) for argument in inputs]
+                computed[spec] = np.asarray(formula(*arguments), dtype=float)
+            elif spec.startswith("@"):
+                attribute = getattr(self.patient, spec[1:])
+                computed[spec] = np.nan if attribute is None else float(attribute)
+            else:
+                series_name, _, field = spec.partition(".")
+                if series_name not in computed:  # one as-of join per series, shared by its fields
+                    computed[series_name] = self._asof_index(series_name, times, np)
+                index = computed[series_name]
+                if index is None:
+                    computed[spec] = np.full(len(times), np.nan)
+                else:
+                    values = self.patient.series(series_name).values(field)[index]
+                    # Panels are in time order, so those before the series' first sample lead.
+                    computed[spec] = np.where(index >= 0, values, np.nan) if len(index) and index[0] < 0 else values
+        return computed[spec]
+
+    def _asof_index(self, series_name, times, np):
+        """Per panel, the index of the series sample as of it (-1 before the first); None for an empty series."""
+        series = self.patient.series(series_name)
+        if not len(series):
+            return None
+        sample_times = series.times()
+        if series.ordered:
+            if len(sample_times) == len(times) and np.array_equal(sample_times, times):
+                return np.arange(len(times))  # sampled with every panel, e.g. the anchor itself
+            return np.searchsorted(sample_times, times, side="right") - 1
+        order = np.argsort(sample_times, kind="stable")
+        position = np.searchsorted(sample_times[order], times, side="right") - 1
+        return np.where(position >= 0, order[np.maximum(position, 0)], -1)
@@ -0,0 +1,51 @@
+"""Downsampling of long series for charts.
+
+Largest-Triangle-Three-Buckets (Steinarsson, 2013) keeps the first and last points and, from each
+of `points` - 2 equal buckets in between, the point forming the largest triangle with the point
+kept from the previous bucket and the mean of the next bucket. Peaks and troughs survive, and a
+chart's payload stays at `points` however many samples it covers.
+"""
+
+
+def lttb(x, y, points):
+    """Indexes of the `points` samples of (x, y) that LTTB keeps, in order; all of them if there are fewer."""
+    import numpy as np
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    count = len(x)
+    if points >= count or points < 3:
+        return np.arange(count)
+    # Bucket b (0 <= b < points - 2) covers samples [edges[b], edges[b + 1]); the last "next bucket"
+    # is the final sample alone.
+    edges = np.append(np.floor(np.arange(points - 1) * ((count - 2) / (points - 2))).astype(np.int64) + 1, count)
+    sizes = np.diff(edges)
+    # Mean of each bucket's successor, all at once; only the choice of point depends on the previous one.
+    mean_x = (np.add.reduceat(x, edges[:-1]) / sizes)[1:].tolist()
+    mean_y = (np.add.reduceat(y, edges[:-1]) / sizes)[1:].tolist()
+    bounds = edges.tolist()
+    keep = [0]
+    ax, ay = x[0], y[0]
+    for bucket in range(points - 2):
+        lo, hi = bounds[bucket], bounds[bucket + 1]
+        bucket_x, bucket_y = x[lo:hi], y[lo:hi]
+        # Twice the triangle area, without the abs: argmax of its square is the largest triangle.
+        areas = (ax - mean_x[bucket]) * (bucket_y - ay) - (ax - bucket_x) * (mean_y[bucket] - ay)
+        kept = lo + int(np.argmax(areas * areas))
+        keep.append(kept)
+        ax, ay = x[kept], y[kept]
+    keep.append(count - 1)
+    return np.array(keep, dtype=np.int64)
+
+
+def downsample(times, values, points):
+    """(times, values) reduced to at most `points` samples by LTTB, dropping NaN values first."""
+    import numpy as np
+
+    times = np.asarray(times)
+    values = np.asarray(values, dtype=float)
+    defined = ~np.isnan(values)
+    if not defined.all():
+        times, values = times[defined], values[defined]
+    keep = lttb(times.astype("datetime64[us]").astype(np.int64), values, points)
+    return times[keep], values[keep]
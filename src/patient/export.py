@@ -0,0 +1,177 @@
+"""Columnar export of Patient panels: Arrow record batches and incrementally written Parquet.
+
+A panel is an electrolytes sample, as in patient.derived. The other recorded analytes are joined
+to it as of its time, and the derived metrics are computed vectorized over the whole series. The
+columns come straight from the TimeSeries buffers, so a batch costs a few NumPy passes, not a
+walk over sample tuples.
+
+    batch = panel_batch(patient)                   # pyarrow.RecordBatch, one row per panel
+    panels = PanelTable(patient); panels.update()  # the same, kept current a few panels at a time
+    with ParquetExport("course.parquet") as export:
+        export.write(patient)                      # appends only panels newer than the last write
+
+Run from src/:  python -m patient.export checkpoints/*.dkas -o panels.parquet
+"""
+import argparse
+from functools import lru_cache
+
+from patient.derived import ANCHOR, METRICS
+
+
+# column -> recorded field ("series.field") or derived metric it is read from
+COLUMNS = {
+    "sodium": "electrolytes.sodium",
+    "potassium": "electrolytes.potassium",
+    "chloride": "electrolytes.chloride",
+    "bicarbonate": "electrolytes.bicarbonate",
+    "pH": "pH.pH",
+    "glucose": "glucose.glucose_mg_dl",
+    "ketones": "ketones.beta_hydroxybutyrate_mmol_L",
+    **{name: name for name in METRICS},
+}
+DEFAULT_ROW_GROUP_ROWS = 65_536
+
+
+def schema(columns=None):
+    """Arrow schema of panel batches with the given COLUMNS (all by default)."""
+    return _schema(tuple(columns or COLUMNS))
+
+
+@lru_cache(maxsize=32)
+def _schema(columns):
+    import pyarrow as pa
+
+    return pa.schema(
+        [("patient_id", pa.string()), ("time", pa.timestamp("us"))] + [(column, pa.float64()) for column in columns]
+    )
+
+
+def panel_batch(patient, columns=None, since=None):
+    """One pyarrow.RecordBatch row per panel of `patient`, or per panel taken after `since`.
+
+    `columns` picks from COLUMNS (all by default); values are NaN where an analyte has no sample
+    at or before the panel.
+    """
+    import pyarrow as pa
+
+    columns = list(columns or COLUMNS)
+    times, values = patient.derived.columns([COLUMNS[column] for column in columns], since)
+    identifier = pa.scalar(patient.patient_id, pa.string())
+    arrays = [pa.repeat(identifier, len(times)), pa.array(times, pa.timestamp("us"))]
+    arrays += [pa.array(values[COLUMNS[column]], pa.float64()) for column in columns]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema(columns))
+
+
+class PanelTable:
+    """One patient's panels as an Arrow table that grows with the stay.
+
+    update() appends only the panels taken since the previous update, so keeping the table current
+    costs the new panels, not the whole history. As with ParquetExport, panels are taken as
+    complete when first appended.
+    """
+
+    def __init__(self, patient, columns=None):
+        self.patient = patient
+        self.columns = list(columns or COLUMNS)
+        self.rows = 0
+        self._batches = []  # record batches not yet combined into the table
+        self._table = None
+        self._latest = None  # time of the latest panel in the table
+        self._anchor_samples = 0  # length of the anchor series at the last update
+
+    def update(self):
+        """Append the patient's new panels; returns how many there were."""
+        samples = len(self.patient.series(ANCHOR))
+        if samples == self._anchor_samples:
+            return 0
+        self._anchor_samples = samples
+        batch = panel_batch(self.patient, self.columns, self._latest)
+        if batch.num_rows:
+            self._latest = batch.column(1)[-1].as_py()
+            self._batches.append(batch)
+            self.rows += batch.num_rows
+        return batch.num_rows
+
+    def table(self):
+        """The panels appended so far, as a pyarrow.Table with one chunk per column."""
+        import pyarrow as pa
+
+        if self._table is None:
+            self._table = schema(self.columns).empty_table()
+        if self._batches:
+            self._table = pa.concat_tables([self._table, pa.Table.from_batches(self._batches)]).combine_chunks()
+            self._batches = []
+        return self._table
+
+
+class ParquetExport:
+    """Parquet file of panels from many patients, written a row group at a time.
+
+    Each write(patient) adds only the panels taken after that patient's last exported one, so
+    calling it after every panel appends as the stay goes on. Write a panel once it is complete:
+    analytes recorded after the write are not revisited.
+    """
+
+    def __init__(self, path, columns=None, row_group_rows=DEFAULT_ROW_GROUP_ROWS):
+        self.path = path
+        self.columns = list(columns or COLUMNS)
+        self.row_group_rows = row_group_rows
+        self.rows = 0  # panels written to the file so far
+        self._writer = None
+        self._pending = []  # batches of the next row group
+        self._pending_rows = 0
+        self._exported = {}  # patient_id -> time of the latest exported panel
+
+    def write(self, patient):
+        """Queue the patient's new panels; returns how many there were."""
+        batch = panel_batch(patient, self.columns, self._exported.get(patient.patient_id))
+        if batch.num_rows:
+            self._exported[patient.patient_id] = batch.column(1)[-1].as_py()
+            self._pending.append(batch)
+            self._pending_rows += batch.num_rows
+            if self._pending_rows >= self.row_group_rows:
+                self.flush()
+        return batch.num_rows
+
+    def flush(self):
+        """Write the queued panels as one row group."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._pending:
+            return
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, schema(self.columns))
+        self._writer.write_table(pa.Table.from_batches(self._pending), row_group_size=self._pending_rows)
+        self.rows += self._pending_rows
+        self._pending, self._pending_rows = [], 0
+
+    def close(self):
+        """Flush and finish the file; a file with no panels is still written, with the schema."""
+        import pyarrow.parquet as pq
+
+        self.flush()
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, schema(self.columns))
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    from patient import snapshot
+
+    parser = argparse.ArgumentParser(description="Export patient snapshots (.dkas) to a Parquet table of panels.")
+    parser.add_argument("snapshots", nargs="+", help="snapshot files, e.g. $DKA_CHECKPOINT_DIR/*.dkas")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--row-group-rows", type=int, default=DEFAULT_ROW_GROUP_ROWS)
+    args = parser.parse_args()
+
+    with ParquetExport(args.output, row_group_rows=args.row_group_rows) as export:
+        for path in args.snapshots:
+            export.write(snapshot.load(path)[0])
+    print(f"Wrote {export.rows} panels to {args.output}")
@@ -0,0 +1,357 @@
+"""Asyncio consumer for lab results pushed by the lab system (LIS).
+
+Messages are JSON objects (one per line on a file or socket) with a patient_id, a time and any of
+the analytes in ingest.ANALYTES; each message is one panel. A LabFeed spreads messages over a fixed
+number of shards by patient, each with a bounded queue and a single worker, so:
+
+- a patient's messages are applied in the order they arrived (one shard, one worker);
+- different patients are processed concurrently;
+- a slow consumer makes `submit` wait instead of letting queues grow (backpressure).
+
+Patient updates and DKATreatment.analyze_bloodwork run on a thread pool, off the event loop, and
+the resulting recommendations are published to the PatientRegistry the ward board reads.
+
+Run from src/:  python -m patient.feed labs.jsonl      (replay a file and print metrics)
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+from patient.ingest import ANALYTES, record_panel
+from patient.patient import DKATreatment, Patient
+from patient.registry import PatientRegistry
+
+
+DEFAULT_SHARDS = 4
+DEFAULT_QUEUE_SIZE = 256  # messages per shard before submit() blocks
+LATENCY_WINDOW = 10_000  # latest latencies kept for percentiles
+
+
+class LabMessage:
+    """One panel from the lab system."""
+
+    __slots__ = ("patient_id", "time", "values", "received")
+
+    def __init__(self, patient_id, time, values, received=None):
+        self.patient_id = str(patient_id)
+        self.time = time
+        self.values = values  # {analyte: value}
+        self.received = received  # perf_counter() when the feed accepted it
+
+    @classmethod
+    def from_json(cls, line):
+        return cls.from_dict(json.loads(line))
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a message from a decoded JSON object; unknown keys are ignored."""
+        stamp = data["time"]
+        return cls(
+            data["patient_id"],
+            stamp if isinstance(stamp, datetime) else datetime.fromisoformat(stamp),
+            {analyte: float(data[analyte]) for analyte in ANALYTES if data.get(analyte) is not None},
+        )
+
+
+class FeedMetrics:
+    """Counters and latencies of a LabFeed; latency is from acceptance to published recommendations.
+
+    Only the latest `latency_window` latencies are kept, in a fixed-size ring, so a feed that runs
+    for weeks holds and sorts as many as a short replay.
+    """
+
+    def __init__(self, latency_window=LATENCY_WINDOW):
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.new_patients = 0
+        self.max_queue_depth = 0
+        self.blocked_seconds = 0.0  # time submit() spent waiting on full queues
+        self.last_error = None
+        self.latency_window = latency_window
+        self.latencies = array("d")  # seconds, of the latest `latency_window` processed messages
+        self._latency_slot = 0  # ring position the next latency overwrites once the window is full
+        self.started = None
+        self.finished = None
+
+    def observe_latency(self, seconds):
+        """Record one processed message's latency."""
+        if len(self.latencies) < self.latency_window:
+            self.latencies.append(seconds)
+            return
+        self.latencies[self._latency_slot] = seconds
+        self._latency_slot = (self._latency_slot + 1) % self.latency_window
+
+    def latency_percentiles(self, *qs):
+        """Return the q-th percentiles (0-100) of the kept latencies in seconds, or Nones before any message."""
+        if not self.latencies:
+            return tuple(None for _ in qs)
+        ordered = sorted(self.latencies)
+        return tuple(ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))] for q in qs)
+
+    def latency_percentile(self, q):
+        """Return the q-th percentile (0-100) latency in seconds, or None before any message."""
+        return self.latency_percentiles(q)[0]
+
+    def throughput(self):
+        """Processed messages per second between the first acceptance and the latest publish."""
+        if not self.processed or self.finished is None or self.finished <= self.started:
+            return 0.0
+        return self.processed / (self.finished - self.started)
+
+    def summary(self):
+        p50, p99 = self.latency_percentiles(50, 99)
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "failed": self.failed,
+            "new_patients": self.new_patients,
+            "throughput_per_s": round(self.throughput(), 1),
+            "latency_p50_ms": None if p50 is None else round(p50 * 1e3, 3),
+            "latency_p99_ms": None if p99 is None else round(p99 * 1e3, 3),
+            "max_queue_depth": self.max_queue_depth,
+            "blocked_s": round(self.blocked_seconds, 3),
+        }
+
+
+class LabFeed:
+    """Apply lab messages to registered patients and publish their recommendations.
+
+    `panel_context` is a context-manager factory wrapped around each panel (e.g. LabStore.batch),
+    `on_result(entry, recommendations)` is called after each analysis and `on_new_patient(patient)`
+    before a patient first seen on the feed is registered; all run on the worker thread. Messages
+    for unknown patients are dropped instead if create_patients is False.
+    """
+
+    def __init__(self, registry: PatientRegistry, shards=DEFAULT_SHARDS, queue_size=DEFAULT_QUEUE_SIZE,
+                 panel_context=None, on_result=None, on_new_patient=None, create_patients=True, executor=None):
+        self.registry = registry
+        self.shards = shards
+        self.queue_size = queue_size
+        self.panel_context = panel_context or nullcontext
+        self.on_result = on_result
+        self.on_new_patient = on_new_patient
+        self.create_patients = create_patients
+        self.metrics = FeedMetrics()
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._queues = []
+        self._workers = []
+
+    async def start(self):
+        """Create the shard queues and workers on the running loop."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.shards, thread_name_prefix="lab-feed")
+        self._queues = [asyncio.Queue(self.queue_size) for _ in range(self.shards)]
+        self._workers = [asyncio.create_task(self._work(queue)) for queue in self._queues]
+        return self
+
+    async def stop(self):
+        """Wait for queued messages to be processed, then stop the workers."""
+        await self.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def join(self):
+        for queue in self._queues:
+            await queue.join()
+
+    ###########################################################
+    # Intake
+    ###########################################################
+    def _queue_for(self, patient_id):
+        return self._queues[hash(patient_id) % self.shards]
+
+    async def submit(self, message):
+        """Queue a message (LabMessage, dict or JSON line) behind earlier ones for the same patient.
+
+        Waits while the patient's shard queue is full.
+        """
+        if isinstance(message, str):
+            message = LabMessage.from_json(message)
+        elif not isinstance(message, LabMessage):
+            message = LabMessage.from_dict(message)
+        message.received = time.perf_counter()
+        metrics = self.metrics
+        if metrics.started is None:
+            metrics.started = message.received
+        metrics.received += 1
+        queue = self._queue_for(message.patient_id)
+        if queue.full():
+            await queue.put(message)
+            metrics.blocked_seconds += time.perf_counter() - message.received
+        else:
+            queue.put_nowait(message)
+        metrics.max_queue_depth = max(metrics.max_queue_depth, queue.qsize())
+
+    async def consume(self, source):
+        """Submit every message of a sync or async iterable; returns the number submitted.
+
+        Malformed messages are counted as failed and skipped.
+        """
+        count = 0
+        if hasattr(source, "__aiter__"):
+            async for message in source:
+                count += await self._submit_or_fail(message)
+        else:
+            for message in source:
+                count += await self._submit_or_fail(message)
+        return count
+
+    async def _submit_or_fail(self, message):
+        try:
+            await self.submit(message)
+        except (KeyError, TypeError, ValueError) as error:
+            self.metrics.failed += 1
+            self.metrics.last_error = f"bad message: {error!r}"
+            return 0
+        return 1
+
+    ###########################################################
+    # Processing
+    ###########################################################
+    async def _work(self, queue):
+        loop = asyncio.get_running_loop()
+        metrics = self.metrics
+        while True:
+            message = await queue.get()
+            try:
+                created = await loop.run_in_executor(self._executor, self._process, message)
+            except Exception as error:  # keep the shard alive; the message is counted and dropped
+                metrics.failed += 1
+                metrics.last_error = f"{message.patient_id}: {error!r}"
+            else:
+                metrics.processed += 1
+                metrics.new_patients += created
+                metrics.finished = time.perf_counter()
+                metrics.observe_latency(metrics.finished - message.received)
+            finally:
+                queue.task_done()
+
+    def _process(self, message):
+        """Apply one message and publish recommendations; runs on the executor.
+
+        Returns whether a new patient was registered for it.
+        """
+        entry = self.registry.get(message.patient_id)
+        created = entry is None
+        if created:
+            if not self.create_patients:
+                raise KeyError(f"unknown patient {message.patient_id}")
+            patient = Patient(patient_id=message.patient_id, name=None, age=None, weight=None, gender=None)
+            treatment = DKATreatment()
+            treatment.admit_patient(patient)
+            if self.on_new_patient is not None:
+                self.on_new_patient(patient)
+            entry = self.registry.register(patient, treatment)
+        patient, treatment = entry.patient, entry.treatment
+        with self.panel_context():
+            scored = record_panel(patient, message.time, message.values)
+        if "pH" in message.values and treatment.admission_status is None:
+            treatment.admission_status = treatment.determine_severity(message.values["pH"])
+        if not scored:
+            return created
+        recommendations = list(treatment.analyze_bloodwork(patient))
+        self.registry.set_recommendations(patient.patient_id, recommendations)
+        if self.on_result is not None:
+            self.on_result(entry, recommendations)
+        return created
+
+
+###########################################################
+# Sources
+###########################################################
+async def read_jsonl(path, follow=False, poll_interval=0.5, chunk_bytes=1 << 16):
+    """Yield the non-blank lines of a JSON-lines file; with follow=True keep waiting for appended lines."""
+    with open(path) as handle:
+        pending = ""
+        while True:
+            chunk = await asyncio.to_thread(handle.read, chunk_bytes)
+            if not chunk:
+                if not follow:
+                    break
+                await asyncio.sleep(poll_interval)
+                continue
+            *lines, pending = (pending + chunk).split("\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if pending.strip():
+            yield pending
+
+
+async def read_stream(reader: asyncio.StreamReader):
+    """Yield the non-blank lines of a stream of JSON lines, e.g. a socket connection."""
+    async for line in reader:
+        line = line.decode()
+        if line.strip():
+            yield line
+
+
+async def serve(feed: LabFeed, host="127.0.0.1", port=9100):
+    """Accept LIS connections and feed their JSON lines into `feed`; returns the asyncio Server."""
+    async def handle(reader, writer):
+        try:
+            await feed.consume(read_stream(reader))
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+def simulated_messages(count, patients=100, seed=0, start=None, interval=timedelta(hours=1)):
+    """In-process stand-in for the LIS: `count` random panels spread round-robin over `patients`.
+
+    Each patient's panels are `interval` apart, so per-patient times increase.
+    """
+    rng = random.Random(seed)
+    treatment = DKATreatment(rng=rng)
+    start = start or datetime(2024, 1, 1)
+    for number in range(count):
+        sodium, potassium, chloride, bicarbonate, pH, glucose = treatment.generate_random_bloodwork()
+        yield LabMessage(
+            f"lis-{number % patients:05d}",
+            start + interval * (number // patients),
+            {"sodium": sodium, "potassium": potassium, "chloride": chloride, "bicarbonate": bicarbonate,
+             "pH": pH, "glucose": glucose},
+        )
+
+
+async def replay(messages, registry=None, **options):
+    """Push `messages` through a fresh LabFeed as fast as it accepts them; returns its metrics."""
+    feed = LabFeed(PatientRegistry() if registry is None else registry, **options)
+    async with feed:
+        await feed.consume(messages)
+    return feed.metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a JSON-lines lab feed and print throughput/latency.")
+    parser.add_argument("input", nargs="?", help="JSON-lines file; simulated messages if omitted")
+    parser.add_argument("--messages", type=int, default=10_000, help="simulated messages")
+    parser.add_argument("--patients", type=int, default=500, help="simulated patients")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS)
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE)
+    args = parser.parse_args()
+
+    source = read_jsonl(args.input) if args.input else simulated_messages(args.messages, args.patients)
+    metrics = asyncio.run(replay(source, shards=args.shards, queue_size=args.queue_size))
+    for name, value in metrics.summary().items():
+        print(f"{name + ':':18} {value}")
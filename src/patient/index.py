@@ -0,0 +1,46 @@
+from bisect import bisect_left, insort
+
+
+class SortedIndex:
+    """Maps keys to orderable values and keeps the keys sorted by value.
+
+    Updates are a bisect plus a list insert/delete; range queries are a bisect plus the hits.
+    Keys must be orderable too, to break ties between equal values.
+    """
+
+    __slots__ = ("_values", "_order")
+
+    def __init__(self):
+        self._values = {}  # key -> value
+        self._order = []  # sorted [(value, key)]
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+    def set(self, key, value):
+        """Index `key` under `value`, replacing its previous value."""
+        self.discard(key)
+        self._values[key] = value
+        insort(self._order, (value, key))
+
+    def discard(self, key):
+        """Remove `key` from the index if present."""
+        if key in self._values:
+            del self._order[bisect_left(self._order, (self._values.pop(key), key))]
+
+    def keys(self, descending=False):
+        """Keys ordered by value."""
+        ordered = reversed(self._order) if descending else self._order
+        return [key for _, key in ordered]
+
+    def range(self, lo=None, hi=None):
+        """Keys with lo <= value < hi, in value order; either bound may be None."""
+        start = 0 if lo is None else bisect_left(self._order, (lo,))
+        stop = len(self._order) if hi is None else bisect_left(self._order, (hi,))
+        return [key for _, key in self._order[start:stop]]
@@ -0,0 +1,189 @@
+"""Streaming import of historical lab exports (CSV or Parquet) through Patient/DKATreatment.
+
+Input rows carry a patient_id, a time and any of the analytes in ANALYTES; rows sharing a
+patient and time (e.g. a BMP and a VBG drawn together) form one panel. Files must be sorted by
+patient, then time, so only one patient's state is held at once and memory stays flat however
+large the export is.
+
+Run from src/:  python -m patient.ingest labs.csv more_labs.parquet -o panels.parquet
+"""
+import argparse
+import csv
+from datetime import datetime
+from itertools import groupby
+from pathlib import Path
+
+from patient.patient import DKATreatment, Patient
+
+
+ANALYTES = ("sodium", "potassium", "chloride", "bicarbonate", "pH", "glucose")
+ELECTROLYTES = ("sodium", "potassium", "chloride", "bicarbonate")
+DEFAULT_CHUNK_ROWS = 65_536
+
+
+###########################################################
+# Reading
+###########################################################
+def _number(value):
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+def _time(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def read_csv(path, rename=None):
+    """Yield rows of a CSV export one at a time as dicts with standard column names."""
+    rename = rename or {}
+    with open(path, newline="") as handle:
+        for row in csv.DictReader(handle):
+            yield {rename.get(column, column): value for column, value in row.items()}
+
+
+def read_parquet(path, rename=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield rows of a Parquet export, reading `chunk_rows` rows into memory at a time."""
+    import pyarrow.parquet as pq  # optional dependency, only needed for Parquet input
+
+    rename = rename or {}
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+        for row in batch.to_pylist():
+            yield {rename.get(column, column): value for column, value in row.items()}
+
+
+def read_rows(path, rename=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield the rows of a .csv or .parquet file."""
+    if Path(path).suffix.lower() in (".parquet", ".pq"):
+        return read_parquet(path, rename, chunk_rows)
+    return read_csv(path, rename)
+
+
+def group_panels(rows):
+    """Merge consecutive rows with the same (patient_id, time) into panels.
+
+    Yields (patient_id, time, {analyte: value}). Raises ValueError if the rows are not sorted by
+    patient_id, then time; checking the order against the previous panel alone keeps memory flat.
+    """
+    previous = None
+    for (patient_id, time), group in groupby(rows, key=lambda row: (str(row["patient_id"]), _time(row["time"]))):
+        if previous is not None and patient_id < previous[0]:
+            raise ValueError(f"rows for patient {patient_id} are not sorted; sort the input by patient and time")
+        if previous is not None and patient_id == previous[0] and time < previous[1]:
+            raise ValueError(f"rows for patient {patient_id} go back in time at {time}")
+        values = {}
+        for row in group:
+            for analyte in ANALYTES:
+                value = _number(row.get(analyte))
+                if value is not None:
+                    values[analyte] = value
+        previous = (patient_id, time)
+        yield patient_id, time, values
+
+
+###########################################################
+# Scoring
+###########################################################
+def record_panel(patient, time, values):
+    """Add one panel's analytes to a patient, deriving anion gap and corrected sodium as the app does.
+
+    Returns True once the patient has electrolytes, glucose and pH on record, i.e. when
+    analyze_bloodwork can run.
+    """
+    if all(analyte in values for analyte in ELECTROLYTES):
+        electrolytes = [values[analyte] for analyte in ELECTROLYTES]
+        patient.add_electrolytes(*electrolytes, time=time)
+        patient.add_anion_gap(*electrolytes, time=time)
+    if "pH" in values:
+        patient.add_pH(values["pH"], time=time)
+    if "glucose" in values:
+        patient.add_glucose(values["glucose"], time=time)
+
+    _, sodium, _, _, _ = patient.get_electrolytes()
+    _, glucose = patient.get_glucose()
+    _, pH = patient.get_pH()
+    scored = None not in (sodium, glucose, pH)
+    if scored and ("glucose" in values or "sodium" in values or patient.get_corrected_sodium()[1] is None):
+        patient.add_corrected_sodium(sodium, glucose, time=time)
+    return scored
+
+
+def replay_panels(panels):
+    """Feed panels through Patient/DKATreatment and yield one output record per panel.
+
+    Anion gap and corrected sodium are derived as the app does. Recommendations are those
+    analyze_bloodwork would have made, and are None until the patient has electrolytes,
+    glucose and pH on record.
+    """
+    for patient_id, patient_panels in groupby(panels, key=lambda panel: panel[0]):
+        patient = Patient(patient_id=patient_id, name=None, age=None, weight=None, gender=None)
+        treatment = DKATreatment()
+        treatment.admit_patient(patient)
+        for _, time, values in patient_panels:
+            scored = record_panel(patient, time, values)
+            _, pH = patient.get_pH()
+            yield {
+                "patient_id": patient_id,
+                "time": time,
+                **{analyte: values.get(analyte) for analyte in ANALYTES},
+                "corrected_sodium": patient.get_corrected_sodium()[1],
+                "anion_gap": patient.get_anion_gap()[1],
+                "severity": treatment.determine_severity(pH).name if pH is not None else None,
+                "recommendations": list(treatment.analyze_bloodwork(patient)) if scored else None,
+            }
+
+
+###########################################################
+# Writing
+###########################################################
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [("patient_id", pa.string()), ("time", pa.timestamp("us"))]
+        + [(analyte, pa.float64()) for analyte in ANALYTES + ("corrected_sodium", "anion_gap")]
+        + [("severity", pa.string()), ("recommendations", pa.list_(pa.string()))]
+    )
+
+
+def write_parquet(records, path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Write records to a Parquet file one row group per `chunk_rows` records; returns the count."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _schema()
+    written = 0
+    chunk = []
+    with pq.ParquetWriter(path, schema) as writer:
+        for record in records:
+            chunk.append(record)
+            if len(chunk) == chunk_rows:
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                written += len(chunk)
+                chunk.clear()
+        if chunk:
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            written += len(chunk)
+    return written
+
+
+def ingest(paths, output, rename=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Stream lab files through the protocol into a Parquet table of panels; returns the panel count."""
+    def rows():
+        for path in paths:
+            yield from read_rows(path, rename, chunk_rows)
+
+    return write_parquet(replay_panels(group_panels(rows())), output, chunk_rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream lab exports through the DKA protocol into Parquet.")
+    parser.add_argument("inputs", nargs="+", type=Path, help="CSV or Parquet files, sorted by patient and time")
+    parser.add_argument("-o", "--output", type=Path, required=True)
+    parser.add_argument("--rename", action="append", default=[], metavar="SOURCE=COLUMN",
+                        help="map a source column onto patient_id, time or an analyte")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    count = ingest(args.inputs, args.output, dict(item.split("=", 1) for item in args.rename), args.chunk_rows)
+    print(f"Wrote {count} panels to {args.output}")
@@ -0,0 +1,222 @@
+"""Opt-in latency histograms and counters, exported in Prometheus text format.
+
+Disabled unless DKA_METRICS is set (to "1" or to a file path the app rewrites after each rerun)
+or DKA_METRICS_PORT names a port to serve /metrics on. The switch is read at import time: when
+disabled, `timed` returns the function it decorates unchanged and `timer` returns a shared
+no-op context, so instrumented code pays nothing or one call respectively.
+
+    @timed("dka_treatment_seconds", operation="analyze_bloodwork")
+    def analyze_bloodwork(...): ...
+
+    with timer("dka_app_render_seconds", section="history"):
+        ...
+"""
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+
+ENABLED = os.environ.get("DKA_METRICS", "") not in ("", "0") or bool(os.environ.get("DKA_METRICS_PORT"))
+
+# Upper bounds in seconds, 1 µs to 10 s.
+DEFAULT_BUCKETS = tuple(float(f"{scale}e{exponent}") for exponent in range(-6, 1) for scale in (1, 2.5, 5)) + (10.0,)
+
+HELP = {
+    "dka_patient_add_seconds": "Time to record one sample with Patient.add_*.",
+    "dka_treatment_seconds": "Time spent in DKATreatment operations.",
+    "dka_app_render_seconds": "Time to render one section of the Streamlit app.",
+    "dka_app_reruns_total": "Streamlit script reruns.",
+}
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Histogram:
+    """Latency histogram with fixed bucket bounds (seconds)."""
+
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+
+class Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class MetricsRegistry:
+    """Histograms and counters by (name, labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # name -> {labels: Histogram}
+        self._counters = {}  # name -> {labels: Counter}
+
+    def histogram(self, name, **labels):
+        return self._get(self._histograms, Histogram, name, labels)
+
+    def counter(self, name, **labels):
+        return self._get(self._counters, Counter, name, labels)
+
+    def _get(self, family, kind, name, labels):
+        key = _labels(labels)
+        metric = family.get(name, {}).get(key)
+        if metric is None:
+            with self._lock:
+                metric = family.setdefault(name, {}).setdefault(key, kind())
+        return metric
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def export_text(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for name, series in sorted(self._counters.items()):
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, counter in sorted(series.items()):
+                lines.append(f"{name}{_format_labels(labels)} {counter.value}")
+        for name, series in sorted(self._histograms.items()):
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in sorted(series.items()):
+                with histogram._lock:
+                    counts, total, count = list(histogram.counts), histogram.sum, histogram.count
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(bound))])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total!r}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Atomically replace `path` with the current metrics (node_exporter textfile format)."""
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as handle:
+            handle.write(self.export_text())
+        os.replace(temporary, path)
+
+
+REGISTRY = MetricsRegistry()
+
+
+###########################################################
+# Instrumentation
+###########################################################
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe((time.perf_counter_ns() - self.start) / 1e9)
+
+
+_DISABLED = nullcontext()
+
+
+def timer(name, **labels):
+    """Context manager recording the duration of its block in histogram `name`."""
+    if not ENABLED:
+        return _DISABLED
+    return _Timer(REGISTRY.histogram(name, **labels))
+
+
+def timed(name, **labels):
+    """Decorator recording each call's duration in histogram `name`; a no-op when disabled."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        histogram = REGISTRY.histogram(name, **labels)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe((time.perf_counter_ns() - start) / 1e9)
+        return wrapper
+    return decorate
+
+
+def count(name, amount=1, **labels):
+    """Increment counter `name` when enabled."""
+    if ENABLED:
+        REGISTRY.counter(name, **labels).inc(amount)
+
+
+###########################################################
+# Export
+###########################################################
+def textfile_path():
+    """The file named by DKA_METRICS, or None when it is unset or just a switch."""
+    value = os.environ.get("DKA_METRICS", "")
+    return None if value in ("", "0", "1") else value
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve REGISTRY at http://host:port/metrics from a daemon thread; returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.export_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="dka-metrics", daemon=True).start()
+    return server
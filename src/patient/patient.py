@@ -1,218 +1,374 @@
-from datetime import datetime
 import random
-from enum import Enum
-import streamlit as st
-import pandas as pd
-import uuid  # For generating unique patient IDs
+import time as _time
 
+from patient import protocol
+from patient import derived
+from patient.clock import FOLLOW_UP_INTERVAL, SYSTEM_CLOCK
+from patient.instrumentation import timed
+from patient.protocol import DKASeverity, Protocol, FOLLOW_UP_MESSAGE, RESOLVED_MESSAGE, START_INSULIN_MESSAGE
+from patient.series import TimeSeries
 
-class DKASeverity(Enum):
-    """Enum for classifying the severity of Diabetic Ketoacidosis (DKA)."""
-    SEVERE = "Severe DKA"
-    MILD_MODERATE = "Mild to Moderate DKA"
-    MILD = "Mild DKA"
+
+DEFAULT_MAX_STEPS = 72  # hourly follow-up panels before a simulated run is counted as unresolved
+HISTORY_TRIM_INTERVAL = 64  # steps between history trims in DKATreatment.steps
 
 
 class Patient:
-    def __init__(self, patient_id, name, age, weight, gender):
-        """Initialize a patient with basic demographic info and empty lists for DKA-related data."""
+    """A DKA patient: demographics plus columnar time series of lab results."""
+
+    # name -> fields of each recorded series
+    SERIES = {
+        "glucose": ("glucose_mg_dl",),
+        "ketones": ("beta_hydroxybutyrate_mmol_L",),
+        "electrolytes": ("sodium", "potassium", "chloride", "bicarbonate"),
+        "corrected_sodium": ("corrected_sodium",),
+        "pH": ("pH",),
+        "anion_gap": ("anion_gap",),
+    }
+
+    __slots__ = (
+        "patient_id", "name", "age", "weight", "gender", "insulin_drip", "vital_signs", "clock", "_series",
+        "_listeners", "_derived",
+    )
+
+    def __init__(self, patient_id, name, age, weight, gender, clock=None):
+        """Initialize a patient with basic demographic info and empty series for DKA-related data."""
         self.patient_id = patient_id
         self.name = name
         self.age = age
         self.weight = weight  # kg
         self.gender = gender
+        self.clock = clock or SYSTEM_CLOCK  # stamps samples added without an explicit time
 
         self.insulin_drip = False
         self.vital_signs = []  # [(timestamp, heart_rate, blood_pressure, respiratory_rate)]
-        self.glucose_levels = []  # [(timestamp, glucose_mg_dl)]
-        self.ketone_levels = []  # [(timestamp, beta_hydroxybutyrate_mmol_L)]
-        self.electrolytes = []  # [(timestamp, sodium, potassium, chloride, bicarbonate)]
-        self.corrected_sodium = []  # [(timestamp, corrected_sodium)]
-        self.pH_levels = []  # [(timestamp, pH)]
-        self.anion_gap = []  # [(timestamp, anion_gap)]
+        self._series = {name: TimeSeries(fields) for name, fields in self.SERIES.items()}
+        self._listeners = []
+        self._derived = None
+
+    def __getstate__(self):
+        # Listeners belong to the process that registered them, and derived values are a cache,
+        # not part of the patient's data.
+        return {name: getattr(self, name) for name in self.__slots__ if name not in ("_listeners", "_derived")}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._listeners = []
+        self._derived = None
+
+    def series(self, name):
+        """Return the TimeSeries backing one of the SERIES."""
+        return self._series[name]
+
+    def trim_history(self, keep):
+        """Keep only the latest `keep` samples of every series, for long-running simulations."""
+        for series in self._series.values():
+            series.trim(keep)
+        if self._derived is not None:
+            self._derived.clear()
+
+    def subscribe(self, listener):
+        """Call listener(patient, series_name, row) after every recorded sample."""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        """Stop calling a listener added with subscribe()."""
+        self._listeners.remove(listener)
+
+    @property
+    def derived(self):
+        """Metrics computed from this patient's panels on read (see patient.derived)."""
+        if self._derived is None:
+            self._derived = derived.DerivedMetrics(self)
+        return self._derived
+
+    def _record(self, name, time, *values):
+        row = self._series[name].append(time, *values)
+        if self._derived is not None:
+            self._derived.invalidate(name, row[0])
+        for listener in self._listeners:
+            listener(self, name, row)
+        return row
+
+    def to_dict(self):
+        """Plain-data view of the patient, for debugging displays."""
+        return {
+            "patient_id": self.patient_id,
+            "name": self.name,
+            "age": self.age,
+            "weight": self.weight,
+            "gender": self.gender,
+            "insulin_drip": self.insulin_drip,
+            "vital_signs": self.vital_signs,
+            **{name: list(series) for name, series in self._series.items()},
+        }
+
+    # List-of-tuples views kept for existing callers; each call copies the series.
+    @property
+    def glucose_levels(self):
+        return list(self._series["glucose"])  # [(timestamp, glucose_mg_dl)]
+
+    @property
+    def ketone_levels(self):
+        return list(self._series["ketones"])  # [(timestamp, beta_hydroxybutyrate_mmol_L)]
+
+    @property
+    def electrolytes(self):
+        return list(self._series["electrolytes"])  # [(timestamp, sodium, potassium, chloride, bicarbonate)]
+
+    @property
+    def corrected_sodium(self):
+        return list(self._series["corrected_sodium"])  # [(timestamp, corrected_sodium)]
+
+    @property
+    def pH_levels(self):
+        return list(self._series["pH"])  # [(timestamp, pH)]
+
+    @property
+    def anion_gap(self):
+        return list(self._series["anion_gap"])  # [(timestamp, anion_gap)]
 
     ###########################################################
     # Glucose
     ###########################################################
-    def add_glucose(self, glucose_mg_dl):
-        """Record blood glucose level."""
-        time = datetime.now()
-        self.glucose_levels.append((time, glucose_mg_dl))
-        return time, self.glucose_levels[-1]
+    @timed("dka_patient_add_seconds", series="glucose")
+    def add_glucose(self, glucose_mg_dl, time=None):
+        """Record blood glucose level, taken now unless `time` is given."""
+        time = time or self.clock.now()
+        return time, self._record("glucose", time, glucose_mg_dl)
 
     def get_glucose(self):
         """Retrieve the latest glucose value."""
-        return self.glucose_levels[-1] if self.glucose_levels else (None, None)
+        return self._series["glucose"].last() or (None, None)
 
     ###########################################################
     # Electrolytes
     ###########################################################
-    def add_electrolytes(self, sodium, potassium, chloride, bicarbonate):
-        """Record electrolyte levels."""
-        time = datetime.now()
-        self.electrolytes.append((time, sodium, potassium, chloride, bicarbonate))
-        return time, self.electrolytes[-1]
+    @timed("dka_patient_add_seconds", series="electrolytes")
+    def add_electrolytes(self, sodium, potassium, chloride, bicarbonate, time=None):
+        """Record electrolyte levels, taken now unless `time` is given."""
+        time = time or self.clock.now()
+        return time, self._record("electrolytes", time, sodium, potassium, chloride, bicarbonate)
 
     def get_electrolytes(self):
         """Retrieve the latest electrolyte values."""
-        return self.electrolytes[-1] if self.electrolytes else (None, None, None, None, None)
+        return self._series["electrolytes"].last() or (None, None, None, None, None)
 
     ###########################################################
     # Corrected Sodium
     ###########################################################
-    def add_corrected_sodium(self, sodium, glucose):
-        """Record corrected sodium level."""
-        time, sodium, _, _, _ = self.get_electrolytes()
-        _, glucose = self.get_glucose()
-        corrected_sodium = sodium + (0.016 * (glucose - 100))  # Using the standard formula
-        self.corrected_sodium.append((time, corrected_sodium))
-        return time, self.corrected_sodium[-1]
+    @timed("dka_patient_add_seconds", series="corrected_sodium")
+    def add_corrected_sodium(self, sodium, glucose, time=None):
+        """Record sodium corrected for `glucose`, for now unless `time` is given."""
+        time = time or self.clock.now()
+        return time, self._record("corrected_sodium", time, derived.corrected_sodium(sodium, glucose))
 
     def get_corrected_sodium(self):
-        """Calculate the corrected sodium level based on glucose."""
-        return self.corrected_sodium[-1] if self.corrected_sodium else (None, None)
+        """Retrieve the latest corrected sodium, derived from the latest panel if none was recorded."""
+        return self._series["corrected_sodium"].last() or self.derived.value("corrected_sodium")
 
     ###########################################################
     # Anion Gap
     ###########################################################
     def calculate_anion_gap(self, sodium, potassium, chloride, bicarbonate):
-        """Calculate the anion gap: Na - (Cl + HCO3)."""
-        return (sodium + potassium) - (chloride + bicarbonate)
+        """Calculate the anion gap: (Na + K) - (Cl + HCO3)."""
+        return derived.anion_gap(sodium, potassium, chloride, bicarbonate)
 
-    def add_anion_gap(self, sodium, potassium, chloride, bicarbonate):
-        """Record anion gap calculation."""
+    @timed("dka_patient_add_seconds", series="anion_gap")
+    def add_anion_gap(self, sodium, potassium, chloride, bicarbonate, time=None):
+        """Record anion gap calculation, for now unless `time` is given."""
         anion_gap = self.calculate_anion_gap(sodium, potassium, chloride, bicarbonate)
-        time = datetime.now()
-        self.anion_gap.append((time, anion_gap))
-        return time, self.anion_gap[-1]
+        time = time or self.clock.now()
+        return time, self._record("anion_gap", time, anion_gap)
 
     def get_anion_gap(self):
-        """Retrieve the latest anion gap value."""
-        return self.anion_gap[-1] if self.anion_gap else (None, None)
+        """Retrieve the latest anion gap, derived from the latest panel if none was recorded."""
+        return self._series["anion_gap"].last() or self.derived.value("anion_gap")
 
     ###########################################################
     # pH
     ###########################################################
-    def add_pH(self, pH):
-        """Record blood pH level."""
-        time = datetime.now()
-        self.pH_levels.append((time, pH))
-        return time, self.pH_levels[-1]
+    @timed("dka_patient_add_seconds", series="pH")
+    def add_pH(self, pH, time=None):
+        """Record blood pH level, taken now unless `time` is given."""
+        time = time or self.clock.now()
+        return time, self._record("pH", time, pH)
 
     def get_pH(self):
         """Retrieve the latest pH value."""
-        return self.pH_levels[-1] if self.pH_levels else (None, None)
+        return self._series["pH"].last() or (None, None)
+
+    ###########################################################
+    # Derived indices (computed on read, see patient.derived)
+    ###########################################################
+    def get_effective_osmolality(self):
+        """Effective serum osmolality of the latest panel (mOsm/kg)."""
+        return self.derived.value("effective_osmolality")
+
+    def get_delta_delta(self):
+        """Delta-delta ratio of the latest panel."""
+        return self.derived.value("delta_delta")
+
+    def get_potassium_deficit(self):
+        """Approximate potassium deficit at the latest panel (mEq), from the patient's weight."""
+        return self.derived.value("potassium_deficit")
+
+
+class Step:
+    """One simulated panel: its values, what the protocol made of it, and the recommendations."""
+
+    __slots__ = (
+        "number", "time", "sodium", "potassium", "chloride", "bicarbonate", "pH", "glucose", "corrected_sodium",
+        "anion_gap", "severity", "resolved", "recommendations",
+    )
+
+    def __init__(self, number, time, panel, corrected_sodium, anion_gap, severity, resolved, recommendations):
+        self.number = number  # 0 for the admission panel, then hourly follow-ups
+        self.time = time
+        self.sodium, self.potassium, self.chloride, self.bicarbonate, self.pH, self.glucose = panel
+        self.corrected_sodium = corrected_sodium
+        self.anion_gap = anion_gap
+        self.severity: DKASeverity = severity
+        self.resolved = resolved
+        self.recommendations = recommendations
+
+    def __repr__(self):
+        return (f"Step({self.number}, {self.time}, pH={self.pH:.2f}, anion_gap={self.anion_gap:.1f}, "
+                f"{self.severity.name}, resolved={self.resolved})")
 
 
 class DKATreatment:
-    def __init__(self):
+    def __init__(self, rng: random.Random = None, protocol: Protocol = None, clock=None):
+        self.rng = rng  # source for generate_random_bloodwork; the global `random` module if None
+        self._protocol = protocol  # protocol to follow; the active one (see patient.protocol) if None
+        self.clock = clock  # stamps logged bloodwork; the patient's clock if None
         self.patient: Patient = None
         self.admission_status: DKASeverity = None
         self.current_recommendations = []
         self.all_recommendations = []
 
+    def protocol(self):
+        """Return the protocol this treatment follows."""
+        return self._protocol or protocol.active()
+
+    def _clock(self, patient=None):
+        return self.clock or (patient or self.patient).clock
+
     def check_resolution(self, anion_gap):
         """Check if DKA has resolved based on anion gap."""
-        if anion_gap < 12:
-            self.current_recommendations.append("✅ DKA Resolved")
+        if self.protocol().resolved(anion_gap):
+            self.current_recommendations.append(RESOLVED_MESSAGE)
             return True
         return False
 
     def determine_severity(self, pH):
         """Determine the severity of DKA based on pH value."""
-        if pH < 7:
-            return DKASeverity.SEVERE
-        elif 7 < pH < 7.24:
-            return DKASeverity.MILD_MODERATE
-        else:
-            return DKASeverity.MILD
+        return self.protocol().severity(pH)
 
     def admit_patient(self, patient):
         """Admit patient to the PCU or ICU based on DKA severity."""
         self.patient = patient
 
+    @timed("dka_treatment_seconds", operation="analyze_bloodwork")
     def analyze_bloodwork(self, patient: Patient):
+        """Return the recommendations for the patient's latest bloodwork."""
+        rules = self.protocol()
+        self.current_recommendations = []
         _, glucose = patient.get_glucose()
         _, corrected_sodium = patient.get_corrected_sodium()
         _, anion_gap = patient.get_anion_gap()
-        _, pH = patient.get_pH()
         _, sodium, potassium, chloride, bicarbonate = patient.get_electrolytes()
 
-        if self.check_resolution(anion_gap):
+        if rules.resolved(anion_gap):
+            self.current_recommendations.append(RESOLVED_MESSAGE)
             return self.current_recommendations
         if not patient.insulin_drip:
-            self.current_recommendations.append("Start insulin drip at 0.1 units/kg/hr")
+            self.current_recommendations.append(START_INSULIN_MESSAGE)
             patient.insulin_drip = True
-        if glucose > 250:
-            if corrected_sodium > 135:
-                if potassium > 4:
-                    self.current_recommendations.append("Run IV fluids 0.45 NS @ 250 cc / hr")
-                elif potassium < 4:
-                    self.current_recommendations.append("Run IV fluids 0.45 NS w 20 meq KCl @ 250 cc / hr")
-            elif corrected_sodium < 135:
-                if potassium > 4:
-                    self.current_recommendations.append("Run IV fluids NS @ 250 cc / hr")
-                elif potassium < 4:
-                    self.current_recommendations.append("Run IV fluids NS w 20 meq KCl @ 250 cc / hr")
-        elif glucose < 250:
-            if corrected_sodium > 135:
-                if potassium > 4:
-                    self.current_recommendations.append("Run IV fluids D5 0.45 NS @ 250 cc / hr")
-                else:
-                    self.current_recommendations.append("Run IV fluids D5 0.45 NS w 20 meq KCl @ 250 cc / hr")
-            elif corrected_sodium < 135:
-                if potassium > 4:
-                    self.current_recommendations.append("Run IV fluids D5 NS @ 250 cc / hr")
-                else:
-                    self.current_recommendations.append("Run IV fluids D5 NS w 20 meq KCl @ 250 cc / hr")
-        # st.write("Come back in 1 hour with electrolytes and blood sugar reading")
-        self.current_recommendations.append("Come back in 1 hour with electrolytes and blood sugar reading")
+        self.current_recommendations.append(rules.fluids(glucose, corrected_sodium, potassium))
+        self.current_recommendations.append(FOLLOW_UP_MESSAGE)
         return self.current_recommendations
 
-    def treat_patient(self, patient: Patient):
-        """Simulates the treatment of a patient with random bloodwork values until DKA is resolved."""
-        sodium, potassium, chloride, bicarbonate, pH, glucose = self.generate_random_bloodwork()
-
-        self.admission_status = self.determine_severity(pH)
-        self.log_bloodwork(sodium, potassium, chloride, bicarbonate, pH, glucose)
-        self.print_bloodwork()
-
-        while not self.check_resolution(patient.get_anion_gap()[1]):
-            recommendations = self.analyze_bloodwork(patient)
-            for rec in recommendations:
-                print(f"- {rec}")
-            self.all_recommendations.append(recommendations)
-            sodium, potassium, chloride, bicarbonate, pH, glucose = self.generate_random_bloodwork()
-            self.admission_status = self.determine_severity(pH)
-            self.log_bloodwork(sodium, potassium, chloride, bicarbonate, pH, glucose)
-            self.print_bloodwork()
+    def steps(self, patient: Patient, model=None, max_steps=DEFAULT_MAX_STEPS, timeout=None, history=None):
+        """Simulate treatment lazily, yielding a Step per panel until DKA resolves.
+
+        `model(patient)` returns each next panel (see patient.trajectory); random bloodwork by
+        default. Stops after `max_steps` follow-ups (None: no cap) or `timeout` wall-clock seconds.
+        The patient's history is kept whole by default; pass `history` to keep only the latest
+        `history` samples of each series, so memory stays constant however long the run.
+        """
+        model = model or (lambda patient: self.generate_random_bloodwork())
+        deadline = None if timeout is None else _time.monotonic() + timeout
+        number = 0
+        while True:
+            panel = model(patient)
+            self.log_bloodwork(*panel, patient=patient)
+            severity = self.determine_severity(panel[4])
+            if number == 0:
+                self.admission_status = severity
+            recommendations = list(self.analyze_bloodwork(patient))
+            time, anion_gap = patient.get_anion_gap()
+            resolved = self.protocol().resolved(anion_gap)
+            yield Step(number, time, panel, patient.get_corrected_sodium()[1], anion_gap, severity, resolved,
+                       recommendations)
+            if resolved or (max_steps is not None and number >= max_steps):
+                return
+            if deadline is not None and _time.monotonic() >= deadline:
+                return
+            number += 1
+            if history is not None and number % HISTORY_TRIM_INTERVAL == 0:
+                patient.trim_history(history)
+            self._clock(patient).advance(FOLLOW_UP_INTERVAL)
+
+    @timed("dka_treatment_seconds", operation="treat_patient")
+    def treat_patient(self, patient: Patient, max_steps=DEFAULT_MAX_STEPS, verbose=True, model=None):
+        """Simulates the treatment of a patient with random bloodwork values until DKA is resolved.
+
+        Stops after `max_steps` follow-up panels (None: no cap); returns whether DKA resolved.
+        Keeps the patient's full history and every step's recommendations in all_recommendations.
+        """
+        for step in self.steps(patient, model=model, max_steps=max_steps):
+            if verbose:
+                self.print_bloodwork(patient)
+            if step.resolved:
+                return True
+            if verbose:
+                for rec in step.recommendations:
+                    print(f"- {rec}")
+            self.all_recommendations.append(step.recommendations)
+        return False
 
     # needs API call
-    def log_bloodwork(self, sodium, potassium, chloride, bicarbonate, pH, glucose):
-        """Admit patient to PCU or ICU based on lab values."""
-        self.patient.add_electrolytes(sodium, potassium, chloride, bicarbonate)
-        self.patient.add_pH(pH)
-        self.patient.add_glucose(glucose)
-        self.patient.add_corrected_sodium(sodium, glucose)
-        self.patient.add_anion_gap(sodium, potassium, chloride, bicarbonate)
+    def log_bloodwork(self, sodium, potassium, chloride, bicarbonate, pH, glucose, patient: Patient = None):
+        """Record one panel for `patient` (the admitted patient by default)."""
+        patient = patient or self.patient
+        time = self._clock(patient).now()  # one panel, one timestamp
+        patient.add_electrolytes(sodium, potassium, chloride, bicarbonate, time=time)
+        patient.add_pH(pH, time=time)
+        patient.add_glucose(glucose, time=time)
+        patient.add_corrected_sodium(sodium, glucose, time=time)
+        patient.add_anion_gap(sodium, potassium, chloride, bicarbonate, time=time)
 
     def generate_random_bloodwork(self):
         """Generate random bloodwork values for a patient."""
-        sodium = random.uniform(120, 145)  # Normal: 135-145, DKA may be low or high
-        potassium = random.uniform(2.5, 6.0)  # Normal: 3.5-5.0, DKA often high
-        chloride = random.uniform(90, 110)  # Normal: 95-105, DKA slightly abnormal
-        bicarbonate = random.uniform(5, 24)  # Normal: 22-28, DKA low (<18)
-        pH = random.uniform(6.8, 7.45)  # Normal: 7.35-7.45, DKA low (<7.3)
-        glucose = random.uniform(150, 600)  # Normal: 70-140, DKA high (>250)
+        rng = self.rng or random
+        sodium = rng.uniform(120, 145)  # Normal: 135-145, DKA may be low or high
+        potassium = rng.uniform(2.5, 6.0)  # Normal: 3.5-5.0, DKA often high
+        chloride = rng.uniform(90, 110)  # Normal: 95-105, DKA slightly abnormal
+        bicarbonate = rng.uniform(5, 24)  # Normal: 22-28, DKA low (<18)
+        pH = rng.uniform(6.8, 7.45)  # Normal: 7.35-7.45, DKA low (<7.3)
+        glucose = rng.uniform(150, 600)  # Normal: 70-140, DKA high (>250)
         return sodium, potassium, chloride, bicarbonate, pH, glucose
 
-    def print_bloodwork(self):
-        """Print the latest bloodwork values for a patient."""
-        time, sodium, potassium, chloride, bicarbonate = self.patient.get_electrolytes()
-        time, pH = self.patient.get_pH()
-        time, glucose = self.patient.get_glucose()
-        time, anion_gap = self.patient.get_anion_gap()
-        time, corrected_sodium = self.patient.get_corrected_sodium()
+    def print_bloodwork(self, patient: Patient = None):
+        """Print the latest bloodwork values for a patient (the admitted patient by default)."""
+        patient = patient or self.patient
+        time, sodium, potassium, chloride, bicarbonate = patient.get_electrolytes()
+        time, pH = patient.get_pH()
+        time, glucose = patient.get_glucose()
+        time, anion_gap = patient.get_anion_gap()
+        time, corrected_sodium = patient.get_corrected_sodium()
         print(f"\nTime: {time}, Sodium: {sodium}, Potassium: {potassium}, \
 Chloride: {chloride}, Bicarbonate: {bicarbonate}")
         print(f"pH: {pH}, Glucose: {glucose}, Anion Gap: {anion_gap}, Corrected Sodium: {corrected_sodium}\n")
@@ -220,6 +376,8 @@ Chloride: {chloride}, Bicarbonate: {bicarbonate}")
 
 # Example usage
 if __name__ == "__main__":
+    import uuid  # For generating unique patient IDs
+
     patient = Patient(patient_id=str(uuid.uuid4()), name="John Doe", age=45, weight=70, gender="Male")
     dka_treatment = DKATreatment()
     dka_treatment.admit_patient(patient)
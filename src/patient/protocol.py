@@ -0,0 +1,182 @@
+import json
+import math
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from enum import Enum
+
+
+class DKASeverity(Enum):
+    """Enum for classifying the severity of Diabetic Ketoacidosis (DKA)."""
+    SEVERE = "Severe DKA"
+    MILD_MODERATE = "Mild to Moderate DKA"
+    MILD = "Mild DKA"
+
+
+RESOLVED_MESSAGE = "✅ DKA Resolved"
+START_INSULIN_MESSAGE = "Start insulin drip at 0.1 units/kg/hr"
+FOLLOW_UP_MESSAGE = "Come back in 1 hour with electrolytes and blood sugar reading"
+
+# The DKA protocol as threshold tables. Each input splits its value range at sorted cut points;
+# "equal" says whether a value equal to a cut falls in the band below or above it. Outcomes are
+# listed for every combination of bands, last input varying fastest.
+DEFAULT_RULES = {
+    "version": 1,
+    "tables": {
+        "severity": {
+            "inputs": [{"name": "pH", "cuts": [7.0, 7.24], "equal": "upper"}],
+            "outcomes": ["SEVERE", "MILD_MODERATE", "MILD"],
+        },
+        "resolution": {
+            "inputs": [{"name": "anion_gap", "cuts": [12], "equal": "upper"}],
+            "outcomes": [True, False],
+        },
+        "fluids": {
+            "inputs": [
+                {"name": "glucose", "cuts": [250], "equal": "lower"},
+                {"name": "corrected_sodium", "cuts": [135], "equal": "lower"},
+                {"name": "potassium", "cuts": [4], "equal": "lower"},
+            ],
+            "outcomes": [
+                # glucose <= 250
+                "Run IV fluids D5 NS w 20 meq KCl @ 250 cc / hr",
+                "Run IV fluids D5 NS @ 250 cc / hr",
+                "Run IV fluids D5 0.45 NS w 20 meq KCl @ 250 cc / hr",
+                "Run IV fluids D5 0.45 NS @ 250 cc / hr",
+                # glucose > 250
+                "Run IV fluids NS w 20 meq KCl @ 250 cc / hr",
+                "Run IV fluids NS @ 250 cc / hr",
+                "Run IV fluids 0.45 NS w 20 meq KCl @ 250 cc / hr",
+                "Run IV fluids 0.45 NS @ 250 cc / hr",
+            ],
+        },
+    },
+}
+
+
+class DecisionTable:
+    """A threshold table compiled to per-input band searches over a flat outcome tuple."""
+
+    __slots__ = ("names", "outcomes", "_axes")
+
+    def __init__(self, inputs, outcomes):
+        self.names = tuple(spec["name"] for spec in inputs)
+        self.outcomes = tuple(outcomes)
+        axes = []
+        stride = len(self.outcomes)
+        for spec in inputs:
+            cuts = tuple(float(cut) for cut in spec["cuts"])
+            if any(lo >= hi for lo, hi in zip(cuts, cuts[1:])):
+                raise ValueError(f"cuts for {spec['name']} must be strictly increasing: {cuts}")
+            if spec.get("equal", "upper") not in ("upper", "lower"):
+                raise ValueError(f"equal for {spec['name']} must be 'upper' or 'lower'")
+            stride //= len(cuts) + 1
+            axes.append((bisect_right if spec.get("equal", "upper") == "upper" else bisect_left, cuts, stride))
+        expected = math.prod(len(cuts) + 1 for _, cuts, _ in axes)
+        if len(self.outcomes) != expected:
+            raise ValueError(f"table over {self.names} needs {expected} outcomes, got {len(self.outcomes)}")
+        self._axes = tuple(axes)
+
+    def cuts(self, name):
+        """Return the cut points of input `name`."""
+        return self._axes[self.names.index(name)][1]
+
+    def index(self, *values):
+        """Return the outcome index for one set of input values."""
+        index = 0
+        for (search, cuts, stride), value in zip(self._axes, values):
+            if value != value:
+                raise ValueError("decision table inputs must not be NaN")
+            index += search(cuts, value) * stride
+        return index
+
+    def lookup(self, *values):
+        """Return the outcome for one set of input values."""
+        return self.outcomes[self.index(*values)]
+
+    def indexes(self, *columns):
+        """Vectorized `index` over NumPy-compatible columns."""
+        import numpy as np  # only batch callers pay for NumPy
+
+        index = 0
+        for (search, cuts, stride), column in zip(self._axes, columns):
+            column = np.asarray(column, dtype=np.float64)
+            if np.isnan(column).any():
+                raise ValueError("decision table inputs must not be NaN")
+            side = "right" if search is bisect_right else "left"
+            index = index + np.searchsorted(cuts, column, side=side) * stride
+        return np.asarray(index, dtype=np.intp)
+
+
+class Protocol:
+    """The DKA protocol compiled from a rules dict (see DEFAULT_RULES)."""
+
+    def __init__(self, rules):
+        tables = rules["tables"]
+        self.rules = rules
+        self.version = rules.get("version")
+        self.severity_table = DecisionTable(
+            tables["severity"]["inputs"], [DKASeverity[name] for name in tables["severity"]["outcomes"]]
+        )
+        self.resolution_table = DecisionTable(
+            tables["resolution"]["inputs"], [bool(outcome) for outcome in tables["resolution"]["outcomes"]]
+        )
+        self.fluid_table = DecisionTable(tables["fluids"]["inputs"], tables["fluids"]["outcomes"])
+
+    def severity(self, pH):
+        """Return the DKASeverity for a pH value."""
+        return self.severity_table.lookup(pH)
+
+    def resolved(self, anion_gap):
+        """Return whether DKA has resolved at this anion gap."""
+        return self.resolution_table.lookup(anion_gap)
+
+    def fluids(self, glucose, corrected_sodium, potassium):
+        """Return the IV fluid recommendation."""
+        return self.fluid_table.lookup(glucose, corrected_sodium, potassium)
+
+
+###########################################################
+# Active protocol
+###########################################################
+_active = Protocol(DEFAULT_RULES)
+_reload_lock = threading.Lock()
+_loaded_file = (None, None)  # (path, mtime) of the rules file behind _active
+
+
+def active():
+    """Return the protocol currently in force; hold on to it for one whole evaluation."""
+    return _active
+
+
+def load(rules):
+    """Compile `rules` and make them the active protocol. A bad rule set leaves the old one in place."""
+    global _active, _loaded_file
+    protocol = Protocol(rules)
+    with _reload_lock:
+        # A single rebinding, so readers see the old or the new protocol, never a mix.
+        _active = protocol
+        _loaded_file = (None, None)
+    return protocol
+
+
+def load_file(path):
+    """Load rules from a JSON file and make them active."""
+    global _active, _loaded_file
+    mtime = os.stat(path).st_mtime_ns
+    with open(path) as handle:
+        protocol = Protocol(json.load(handle))
+    with _reload_lock:
+        _active = protocol
+        _loaded_file = (os.fspath(path), mtime)
+    return protocol
+
+
+def reload_if_changed(path):
+    """Reload the rules file if it changed since it was last loaded; cheap enough for every rerun."""
+    if path is None:
+        return _active
+    loaded_path, loaded_mtime = _loaded_file
+    if loaded_path == os.fspath(path) and loaded_mtime == os.stat(path).st_mtime_ns:
+        return _active
+    return load_file(path)
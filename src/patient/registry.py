@@ -0,0 +1,145 @@
+import threading
+from datetime import datetime
+
+from patient.alerts import AlertEngine
+from patient.census import Census
+from patient.index import SortedIndex
+from patient.patient import DKASeverity, DKATreatment, Patient
+from patient.series import to_epoch_us
+
+
+LATEST = datetime.max  # asof() this for a series' newest sample by time
+
+
+def _is_latest(series, time):
+    """Whether no sample of `series` was taken after `time`."""
+    if series.ordered:
+        return True
+    return series.stamp(series.asof(LATEST)) <= to_epoch_us(time)
+
+
+class WardEntry:
+    """A registered patient plus the latest values the ward board shows."""
+
+    __slots__ = ("patient", "treatment", "severity", "anion_gap", "last_lab", "recommendations")
+
+    def __init__(self, patient: Patient, treatment: DKATreatment):
+        self.patient = patient
+        self.treatment = treatment
+        self.severity: DKASeverity = None
+        self.anion_gap = None
+        self.last_lab = None  # time of the latest recorded sample
+        self.recommendations = []
+
+
+class PatientRegistry:
+    """Process-wide set of active patients with secondary indexes for the ward board.
+
+    Indexes (severity, latest anion gap, time of last lab) are updated from each Patient's
+    add_* calls, so sorting and filtering never touch a patient's history. "Latest" is by sample
+    time: a result recorded late, after a newer one, does not replace it on the board. `census` answers
+    per-analyte and threshold-episode queries across the registered patients, and `alerts` watches
+    their lab trajectories.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}  # patient_id -> WardEntry
+        self._by_severity = {severity: set() for severity in DKASeverity}
+        self._anion_gap = SortedIndex()
+        self._last_lab = SortedIndex()
+        self.census = Census()
+        self.alerts = AlertEngine()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, patient_id):
+        return patient_id in self._entries
+
+    def get(self, patient_id):
+        """Return the WardEntry for a patient, or None."""
+        return self._entries.get(patient_id)
+
+    def register(self, patient: Patient, treatment: DKATreatment = None):
+        """Add a patient (and the treatment following them) to the registry."""
+        with self._lock:
+            if patient.patient_id in self._entries:
+                return self._entries[patient.patient_id]
+            entry = WardEntry(patient, treatment or DKATreatment())
+            self._entries[patient.patient_id] = entry
+            for name in ("pH", "anion_gap", "electrolytes", "glucose"):
+                series = patient.series(name)
+                index = series.asof(LATEST)
+                if index is not None:
+                    self._on_sample(patient, name, series.row(index))
+            patient.subscribe(self._on_sample)
+            self.census.attach(patient)
+            self.alerts.attach(patient)
+            return entry
+
+    def remove(self, patient_id):
+        """Drop a patient from the registry and all indexes."""
+        with self._lock:
+            entry = self._entries.pop(patient_id, None)
+            if entry is None:
+                return
+            entry.patient.unsubscribe(self._on_sample)
+            self.census.detach(entry.patient)
+            self.alerts.detach(entry.patient)
+            if entry.severity is not None:
+                self._by_severity[entry.severity].discard(patient_id)
+            self._anion_gap.discard(patient_id)
+            self._last_lab.discard(patient_id)
+
+    def set_recommendations(self, patient_id, recommendations):
+        """Store the latest recommendations shown for a patient."""
+        with self._lock:
+            self._entries[patient_id].recommendations = list(recommendations)
+
+    def _on_sample(self, patient, series, row):
+        with self._lock:
+            entry = self._entries.get(patient.patient_id)
+            if entry is None:
+                return
+            time = row[0]
+            late = not _is_latest(patient.series(series), time)  # the board keeps showing the newer value
+            if series == "pH" and not late:
+                severity = entry.treatment.determine_severity(row[1])
+                if entry.severity is not None:
+                    self._by_severity[entry.severity].discard(patient.patient_id)
+                self._by_severity[severity].add(patient.patient_id)
+                entry.severity = severity
+            elif series == "anion_gap" and not late:
+                entry.anion_gap = row[1]
+                self._anion_gap.set(patient.patient_id, row[1])
+            if entry.last_lab is None or time > entry.last_lab:
+                entry.last_lab = time
+                self._last_lab.set(patient.patient_id, time)
+
+    def board(self, severities=None, sort="anion_gap", descending=True, limit=None, patient_ids=None):
+        """Return WardEntries ordered by `sort` ("anion_gap" or "last_lab"), optionally filtered.
+
+        Patients without a value for the sort key come last.
+        """
+        with self._lock:
+            index = {"anion_gap": self._anion_gap, "last_lab": self._last_lab}[sort]
+            allowed = None
+            if severities is not None:
+                allowed = set().union(*(self._by_severity[severity] for severity in severities))
+            if patient_ids is not None:
+                allowed = set(patient_ids) if allowed is None else allowed.intersection(patient_ids)
+            ordered = index.keys(descending=descending)
+            ordered += [patient_id for patient_id in self._entries if patient_id not in index]
+            entries = [self._entries[patient_id] for patient_id in ordered if allowed is None or patient_id in allowed]
+            return entries[:limit] if limit is not None else entries
+
+    def by_severity(self, severity):
+        """Return the entries currently classified as `severity`."""
+        with self._lock:
+            return [self._entries[patient_id] for patient_id in self._by_severity[severity]]
+
+    def overdue(self, now, interval):
+        """Return entries whose last lab is older than `interval` before `now`, oldest first."""
+        with self._lock:
+            return [self._entries[patient_id] for patient_id in self._last_lab.range(hi=now - interval)]
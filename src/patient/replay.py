@@ -0,0 +1,294 @@
+"""Event log of Patient samples and a vectorized replay of the protocol over it.
+
+Every Patient mutation is a sample event (patient, series, time, values). An EventLog records them
+from live patients (Patient.subscribe), from a LabStore, or synthetically. `replay` re-drives a
+log through a protocol in a few NumPy passes: each panel's inputs are the latest value of every
+series as of that panel (a per-patient forward fill), and a panel is scored once all inputs exist,
+as DKATreatment.analyze_bloodwork would be after it. `diff_protocols` replays one log under two
+protocol versions and returns the panels whose recommendations differ.
+
+The log holds samples only, not insulin drip changes: replay assumes each patient's drip starts at
+their first unresolved panel and never stops, as DKATreatment does on its own. A drip started or
+stopped by hand (Patient.insulin_drip set outside analyze_bloodwork) is not seen, so replay and
+diff_protocols can misreport the recommendations of such a patient's later panels.
+
+Run from src/:  python -m benchmarks.replay
+"""
+from array import array
+from datetime import datetime
+
+from patient import derived, protocol as dka_protocol
+from patient.batch import check_resolution, score_panels
+from patient.patient import DKATreatment, Patient
+from patient.series import from_epoch_us, to_epoch_us
+
+
+SERIES = tuple(Patient.SERIES)  # event series codes are indexes into this
+MAX_FIELDS = 4  # widest series (electrolytes)
+
+
+class EventLog:
+    """Append-only columnar log of sample events across patients."""
+
+    def __init__(self):
+        self.patient_ids = []  # patient code -> patient_id
+        self._codes = {}  # patient_id -> patient code
+        self.patients = array("l")
+        self.series = array("b")
+        self.times = array("q")  # epoch microseconds
+        self.values = tuple(array("d") for _ in range(MAX_FIELDS))  # NaN-padded
+
+    def __len__(self):
+        return len(self.times)
+
+    def _code(self, patient_id):
+        code = self._codes.get(patient_id)
+        if code is None:
+            code = self._codes[patient_id] = len(self.patient_ids)
+            self.patient_ids.append(patient_id)
+        return code
+
+    def append(self, patient_id, series, time, *values):
+        self.patients.append(self._code(patient_id))
+        self.series.append(SERIES.index(series))
+        self.times.append(to_epoch_us(time) if isinstance(time, datetime) else time)
+        for column, value in zip(self.values, values + (None,) * (MAX_FIELDS - len(values))):
+            column.append(float("nan") if value is None else value)
+
+    def _on_sample(self, patient, series, row):
+        self.append(patient.patient_id, series, *row)
+
+    def attach(self, patient: Patient):
+        """Record every future sample of `patient`."""
+        patient.subscribe(self._on_sample)
+
+    def detach(self, patient: Patient):
+        patient.unsubscribe(self._on_sample)
+
+    def __iter__(self):
+        """Yield (patient_id, series, time, values) in log order."""
+        for index in range(len(self)):
+            width = len(Patient.SERIES[SERIES[self.series[index]]])
+            yield (
+                self.patient_ids[self.patients[index]], SERIES[self.series[index]],
+                from_epoch_us(self.times[index]), tuple(column[index] for column in self.values[:width]),
+            )
+
+    @classmethod
+    def from_store(cls, store, patient_ids=None):
+        """Load the samples of a LabStore (all patients by default) in the order they were written."""
+        log = cls()
+        for patient_id, series, time, *values in store.samples(patient_ids):
+            log.append(patient_id, series, time, *values)
+        return log
+
+    @classmethod
+    def synthetic(cls, patients, panels, seed=0, start=datetime(2024, 1, 1)):
+        """`panels` hourly random panels per patient, logged as DKATreatment.log_bloodwork would."""
+        import numpy as np
+
+        rng = np.random.default_rng(seed)
+        shape = (patients, panels)
+        sodium, potassium = rng.uniform(120, 145, shape), rng.uniform(2.5, 6.0, shape)
+        chloride, bicarbonate = rng.uniform(90, 110, shape), rng.uniform(5, 24, shape)
+        pH, glucose = rng.uniform(6.8, 7.45, shape), rng.uniform(150, 600, shape)
+        nan = np.full(shape, np.nan)
+        # One panel's events in log_bloodwork order, each as (series, v0, v1, v2, v3).
+        events = [
+            ("electrolytes", sodium, potassium, chloride, bicarbonate),
+            ("pH", pH, nan, nan, nan),
+            ("glucose", glucose, nan, nan, nan),
+            ("corrected_sodium", derived.corrected_sodium(sodium, glucose), nan, nan, nan),
+            ("anion_gap", derived.anion_gap(sodium, potassium, chloride, bicarbonate), nan, nan, nan),
+        ]
+        log = cls()
+        log.patient_ids = [f"synthetic-{number}" for number in range(patients)]
+        log._codes = {patient_id: code for code, patient_id in enumerate(log.patient_ids)}
+        hours = np.arange(panels, dtype=np.int64) * 3_600_000_000
+        times = np.broadcast_to(to_epoch_us(start) + hours, shape)
+        log.patients = array("l", np.repeat(np.arange(patients), panels * len(events)).astype("l").tobytes())
+        log.series = array("b", np.tile(np.array([SERIES.index(event[0]) for event in events], dtype="b"),
+                                        patients * panels).tobytes())
+        log.times = array("q", np.repeat(times.ravel(), len(events)).tobytes())
+        log.values = tuple(
+            array("d", np.stack([event[1 + field] for event in events], axis=-1).ravel().tobytes())
+            for field in range(MAX_FIELDS)
+        )
+        return log
+
+    def columns(self):
+        """Zero-copy NumPy views: (patients, series, times, values[MAX_FIELDS])."""
+        import numpy as np
+
+        return (
+            np.frombuffer(self.patients, dtype="l") if self.patients else np.zeros(0, dtype="l"),
+            np.frombuffer(self.series, dtype="b") if self.series else np.zeros(0, dtype="b"),
+            np.frombuffer(self.times, dtype=np.int64) if self.times else np.zeros(0, dtype=np.int64),
+            tuple(np.frombuffer(column) if column else np.zeros(0) for column in self.values),
+        )
+
+
+###########################################################
+# Replay
+###########################################################
+class ReplayResult:
+    """Scores of every scored panel of a replayed log, in (patient, time) order."""
+
+    def __init__(self, log, patients, times, scores):
+        self.log = log
+        self.patients = patients  # patient codes
+        self.times = times  # epoch microseconds
+        self.scores = scores  # patient.batch.BatchScores
+
+    def __len__(self):
+        return len(self.times)
+
+    def patient_id(self, row):
+        return self.log.patient_ids[self.patients[row]]
+
+    def time(self, row):
+        return from_epoch_us(int(self.times[row]))
+
+    def recommendations(self, row):
+        return self.scores.recommendations(row)
+
+
+def _panel_inputs(log):
+    """Forward-fill protocol inputs to the end of every (patient, time) panel."""
+    import numpy as np
+
+    patients, series, times, values = log.columns()
+    order = np.lexsort((times, patients))  # stable: events of one panel keep their log order
+    patients, series, times = patients[order], series[order], times[order]
+    positions = np.arange(len(order))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = patients[1:] != patients[:-1]
+    patient_start = np.maximum.accumulate(np.where(first, positions, 0))
+
+    def latest(code):
+        # Index of the latest event of `code` for the same patient at or before each event, else -1.
+        index = np.maximum.accumulate(np.where(series == code, positions, -1))
+        return np.where(index >= patient_start, order[np.maximum(index, 0)], -1)
+
+    def take(index, column):
+        return np.where(index >= 0, column[np.maximum(index, 0)], np.nan)
+
+    electrolytes = latest(SERIES.index("electrolytes"))
+    sodium, potassium, chloride, bicarbonate = (take(electrolytes, values[field]) for field in range(4))
+    glucose = take(latest(SERIES.index("glucose")), values[0])
+    pH = take(latest(SERIES.index("pH")), values[0])
+
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = (patients[1:] != patients[:-1]) | (times[1:] != times[:-1])
+    rows = last & ~(np.isnan(sodium) | np.isnan(glucose) | np.isnan(pH))
+    sodium, potassium, chloride, bicarbonate, glucose = (
+        column[rows] for column in (sodium, potassium, chloride, bicarbonate, glucose)
+    )
+    inputs = {
+        "glucose": glucose,
+        "corrected_sodium": derived.corrected_sodium(sodium, glucose),
+        "anion_gap": derived.anion_gap(sodium, potassium, chloride, bicarbonate),
+        "potassium": potassium,
+        "pH": pH[rows],
+    }
+    return patients[rows], times[rows], inputs
+
+
+def replay(log: EventLog, protocol=None, panels=None):
+    """Score every panel of `log` under `protocol` (the active one by default).
+
+    Patients start without an insulin drip, which starts at their first unresolved panel. Pass
+    `panels` = _panel_inputs(log) to replay one log under many protocols without refilling it.
+    """
+    import numpy as np
+
+    protocol = protocol or dka_protocol.active()
+    patients, times, inputs = panels or _panel_inputs(log)
+    unresolved = ~check_resolution(inputs["anion_gap"], protocol)
+    # Drip already running = an earlier unresolved panel of the same patient.
+    seen = np.cumsum(unresolved) - unresolved
+    first = np.ones(len(patients), dtype=bool)
+    first[1:] = patients[1:] != patients[:-1]
+    before_patient = np.maximum.accumulate(np.where(first, seen, 0))
+    insulin_drip = seen > before_patient
+    scores = score_panels(protocol=protocol, insulin_drip=insulin_drip, **inputs)
+    return ReplayResult(log, patients, times, scores)
+
+
+def replay_scalar(log: EventLog, protocol=None):
+    """Reference replay through Patient/DKATreatment, one event at a time.
+
+    Returns [(patient_id, time, recommendations)] for the same panels `replay` scores.
+    """
+    protocol = protocol or dka_protocol.active()
+    events = sorted(enumerate(log), key=lambda item: (log._codes[item[1][0]], item[1][2], item[0]))
+    results = []
+    state = {}
+    for position, (_, (patient_id, series, time, values)) in enumerate(events):
+        if patient_id not in state:
+            patient = Patient(patient_id=patient_id, name=None, age=None, weight=None, gender=None)
+            treatment = DKATreatment(protocol=protocol)
+            treatment.admit_patient(patient)
+            state[patient_id] = patient, treatment
+        patient, treatment = state[patient_id]
+        patient._record(series, time, *values)
+        following = events[position + 1][1] if position + 1 < len(events) else None
+        if following is not None and following[0] == patient_id and following[2] == time:
+            continue  # the panel is not complete yet
+        if None in (patient.get_electrolytes()[1], patient.get_glucose()[1], patient.get_pH()[1]):
+            continue
+        # Inputs as replay() derives them from the latest raw values.
+        _, sodium, potassium, chloride, bicarbonate = patient.get_electrolytes()
+        _, glucose = patient.get_glucose()
+        patient._record("corrected_sodium", time, derived.corrected_sodium(sodium, glucose))
+        patient._record("anion_gap", time, derived.anion_gap(sodium, potassium, chloride, bicarbonate))
+        results.append((patient_id, time, list(treatment.analyze_bloodwork(patient))))
+    return results
+
+
+###########################################################
+# Protocol diff
+###########################################################
+class ProtocolDiff:
+    """Panels of one log whose recommendations differ between two protocols."""
+
+    def __init__(self, before: ReplayResult, after: ReplayResult, rows):
+        self.before = before
+        self.after = after
+        self.rows = rows  # indexes into both results
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        """Yield dicts of patient_id, time and both protocols' severity and recommendations."""
+        for row in self.rows.tolist():
+            yield {
+                "patient_id": self.before.patient_id(row),
+                "time": self.before.time(row),
+                "severity_before": self.before.scores.severity_of(row).name,
+                "severity_after": self.after.scores.severity_of(row).name,
+                "recommendations_before": self.before.recommendations(row),
+                "recommendations_after": self.after.recommendations(row),
+            }
+
+
+def diff_protocols(log: EventLog, before, after):
+    """Replay `log` under two protocols and return the panels whose outputs differ."""
+    import numpy as np
+
+    panels = _panel_inputs(log)
+    results = replay(log, before, panels), replay(log, after, panels)
+
+    def outputs(result):
+        scores = result.scores
+        fluids = np.asarray(scores.protocol.fluid_table.outcomes, dtype=object)[scores.fluids]
+        severity = np.asarray([outcome.name for outcome in scores.protocol.severity_table.outcomes],
+                              dtype=object)[scores.severity]
+        return severity, scores.resolved, scores.start_insulin, np.where(scores.resolved, None, fluids)
+
+    changed = np.zeros(len(results[0]), dtype=bool)
+    for left, right in zip(outputs(results[0]), outputs(results[1])):
+        changed |= left != right
+    return ProtocolDiff(results[0], results[1], np.flatnonzero(changed))
+
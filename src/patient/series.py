@@ -0,0 +1,208 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+
+DEFAULT_CAPACITY = 32  # samples preallocated per series; doubles when full
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch_us(time):
+    """Convert a datetime to int64 microseconds since the epoch (naive times are taken as-is)."""
+    if time.tzinfo is not None:
+        time = time.astimezone().replace(tzinfo=None)
+    return (time - _EPOCH) // _MICROSECOND
+
+
+def from_epoch_us(stamp):
+    """Convert int64 microseconds since the epoch back to a naive datetime."""
+    return _EPOCH + timedelta(microseconds=stamp)
+
+
+def _allocate(typecode, capacity):
+    return array(typecode, bytes(array(typecode).itemsize * capacity))
+
+
+def _bytes(buffer):
+    # array.frombytes takes only byte-formatted buffers, not the typed memoryviews raw() returns.
+    return memoryview(buffer).cast("B")
+
+
+def _doubled(buffer):
+    # Build a new buffer rather than resizing in place: NumPy views of the old one stay valid.
+    grown = array(buffer.typecode, buffer)
+    grown.frombytes(bytes(buffer.itemsize * max(len(buffer), 1)))
+    return grown
+
+
+class TimeSeries:
+    """Append-only columnar store of timestamped samples.
+
+    Timestamps are kept as int64 epoch microseconds and each field as a float64 column, all in
+    preallocated typed buffers. Missing values (None) are stored as NaN.
+    """
+
+    __slots__ = ("fields", "_times", "_columns", "_size", "_ordered")
+
+    def __init__(self, fields, capacity=DEFAULT_CAPACITY):
+        self.fields = tuple(fields)
+        self._times = _allocate("q", capacity)
+        self._columns = tuple(_allocate("d", capacity) for _ in self.fields)
+        self._size = 0
+        self._ordered = True
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield self.row(index)
+
+    @property
+    def capacity(self):
+        return len(self._times)
+
+    @property
+    def ordered(self):
+        """Whether samples were appended in time order."""
+        return self._ordered
+
+    @property
+    def nbytes(self):
+        """Bytes held by the underlying buffers, including unused capacity."""
+        return sum(buffer.itemsize * len(buffer) for buffer in (self._times, *self._columns))
+
+    def append(self, time, *values):
+        """Append one sample and return it as a (time, *values) tuple."""
+        if len(values) != len(self.fields):
+            raise ValueError(f"expected {len(self.fields)} values {self.fields}, got {len(values)}")
+        index = self._size
+        if index == len(self._times):
+            self._times = _doubled(self._times)
+            self._columns = tuple(_doubled(column) for column in self._columns)
+        stamp = to_epoch_us(time)
+        if index and stamp < self._times[index - 1]:
+            self._ordered = False
+        self._times[index] = stamp
+        columns = self._columns
+        for column, value in zip(columns, values):
+            column[index] = float("nan") if value is None else value
+        self._size = index + 1
+        # The row as row(index) would rebuild it, without decoding the stamp of a naive datetime.
+        if type(time) is not datetime or time.tzinfo is not None:
+            time = from_epoch_us(stamp)
+        return (time, *[column[index] for column in columns])
+
+    def row(self, index):
+        """Return sample `index` as a (time, *values) tuple."""
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("sample index out of range")
+        return (from_epoch_us(self._times[index]), *(column[index] for column in self._columns))
+
+    def value(self, index, field):
+        """Return one field of sample `index`."""
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("sample index out of range")
+        return self._columns[self.fields.index(field)][index]
+
+    def last(self):
+        """Return the latest sample, or None if the series is empty."""
+        return self.row(self._size - 1) if self._size else None
+
+    def bounds(self, start=None, end=None):
+        """Return the index range [lo, hi) of samples with start <= time < end.
+
+        Only valid while samples were appended in time order; see `window` for the general case.
+        """
+        lo = 0 if start is None else bisect_left(self._times, to_epoch_us(start), 0, self._size)
+        hi = self._size if end is None else bisect_left(self._times, to_epoch_us(end), lo, self._size)
+        return lo, hi
+
+    def stamp(self, index):
+        """Return the time of sample `index` as epoch microseconds."""
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("sample index out of range")
+        return self._times[index]
+
+    def asof(self, time):
+        """Return the index of the latest sample taken at or before `time` (a datetime or epoch µs), or None."""
+        stamp = time if isinstance(time, int) else to_epoch_us(time)
+        if self._ordered:
+            index = bisect_right(self._times, stamp, 0, self._size) - 1
+            return index if index >= 0 else None
+        best = None
+        for index in range(self._size):
+            if self._times[index] <= stamp and (best is None or self._times[index] >= self._times[best]):
+                best = index
+        return best
+
+    def window(self, start=None, end=None):
+        """Return the samples with start <= time < end, in insertion order."""
+        if self._ordered:
+            return [self.row(index) for index in range(*self.bounds(start, end))]
+        lo = None if start is None else to_epoch_us(start)
+        hi = None if end is None else to_epoch_us(end)
+        return [
+            self.row(index) for index in range(self._size)
+            if (lo is None or self._times[index] >= lo) and (hi is None or self._times[index] < hi)
+        ]
+
+    def trim(self, keep):
+        """Drop all but the latest `keep` samples, keeping the capacity.
+
+        The survivors go into fresh buffers, so NumPy views of the old ones stay valid.
+        """
+        if self._size <= keep:
+            return
+        start = self._size - keep
+        times = _allocate("q", len(self._times))
+        times[:keep] = self._times[start:self._size]
+        columns = tuple(_allocate("d", len(self._times)) for _ in self.fields)
+        for column, old in zip(columns, self._columns):
+            column[:keep] = old[start:self._size]
+        self._times, self._columns, self._size = times, columns, keep
+
+    def raw(self):
+        """Return (ordered, times, columns): the used part of the buffers as memoryviews, for serialization."""
+        return (
+            self._ordered,
+            memoryview(self._times)[:self._size],
+            tuple(memoryview(column)[:self._size] for column in self._columns),
+        )
+
+    def restore(self, ordered, times, columns):
+        """Replace the contents with raw int64 times and float64 columns (bytes-like, as from raw())."""
+        if len(columns) != len(self.fields):
+            raise ValueError(f"expected {len(self.fields)} columns {self.fields}, got {len(columns)}")
+        self._times = array("q")
+        self._times.frombytes(_bytes(times))
+        self._columns = tuple(array("d") for _ in self.fields)
+        for column, data in zip(self._columns, columns):
+            column.frombytes(_bytes(data))
+        if any(len(column) != len(self._times) for column in self._columns):
+            raise ValueError("columns and times differ in length")
+        self._size = len(self._times)
+        self._ordered = ordered
+
+    def times(self):
+        """Zero-copy, read-only NumPy datetime64[us] view of the timestamps."""
+        return self._view(self._times, "int64").view("datetime64[us]")
+
+    def values(self, field):
+        """Zero-copy, read-only NumPy float64 view of one field."""
+        return self._view(self._columns[self.fields.index(field)], "float64")
+
+    def _view(self, buffer, dtype):
+        import numpy as np  # only needed by callers that ask for array views
+
+        view = np.frombuffer(buffer, dtype=dtype, count=self._size)
+        view.flags.writeable = False
+        return view
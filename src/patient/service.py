@@ -0,0 +1,411 @@
+"""Headless HTTP/JSON scoring service over Patient/DKATreatment, without the Streamlit UI.
+
+Endpoints (JSON bodies and responses):
+
+    POST /patients                             admit {patient_id?, name, age, weight, gender}; 409 if
+                                               patient_id is already admitted
+    POST /patients/<id>/panels                 record {time?, sodium, potassium, chloride,
+                                               bicarbonate, pH, glucose} and score it
+    GET  /patients/<id>/recommendations        latest recommendations
+    GET  /health                               liveness plus batching counters
+
+Panels arriving concurrently are scored together: the first pending panel opens a micro-batch
+that closes after `max_wait` seconds or `max_batch` panels and is evaluated in one vectorized
+pass (patient.batch). With a LabStore, patients are persisted and only the most recently used stay
+warm in an LRU cache, the rest being reopened on a cache miss; without one, every admitted patient
+stays in memory.
+
+Run from src/:  python -m patient.service --port 8700 [--workers 4] [--store labs.sqlite3]
+
+With --workers N, N processes listen on ports port..port+N-1 and each owns the patients routed
+to it; clients (or a proxy) must send a patient's requests to the same port.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from patient import protocol
+from patient.batch import score_panels
+from patient.ingest import ANALYTES, record_panel
+from patient.patient import DKATreatment, Patient
+
+
+DEFAULT_PORT = 8700
+DEFAULT_MAX_BATCH = 64
+DEFAULT_MAX_WAIT = 0.002  # seconds a micro-batch stays open for more panels
+DEFAULT_CACHE_SIZE = 10_000  # warm patients per process when a LabStore can reopen the rest
+
+
+class ServiceError(Exception):
+    """An error returned to the client as {"error": message} with an HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+###########################################################
+# Patient state
+###########################################################
+class PatientCache:
+    """LRU cache of (Patient, DKATreatment) pairs, optionally backed by a LabStore.
+
+    Patients are only evicted when the store can reopen them: without one, nothing is.
+    """
+
+    def __init__(self, store=None, capacity=DEFAULT_CACHE_SIZE):
+        self.store = store
+        self.capacity = capacity
+        self._states = OrderedDict()  # patient_id -> (Patient, DKATreatment)
+
+    def __len__(self):
+        return len(self._states)
+
+    def __contains__(self, patient_id):
+        """Whether the patient is cached or stored; unlike get(), this neither reopens nor evicts."""
+        return patient_id in self._states or (self.store is not None and self.store.has_patient(patient_id))
+
+    def add(self, patient: Patient):
+        treatment = DKATreatment()
+        treatment.admit_patient(patient)
+        if self.store is not None:
+            self.store.attach(patient)
+        self._put(patient.patient_id, (patient, treatment))
+        return patient, treatment
+
+    def get(self, patient_id):
+        """Return the (Patient, DKATreatment) for a patient; raises KeyError if unknown."""
+        state = self._states.get(patient_id)
+        if state is not None:
+            self._states.move_to_end(patient_id)
+            return state
+        if self.store is None:
+            raise KeyError(patient_id)
+        patient = self.store.open_patient(patient_id)  # KeyError if not stored either
+        treatment = DKATreatment()
+        treatment.admit_patient(patient)
+        _, pH = patient.get_pH()
+        if pH is not None:
+            treatment.admission_status = treatment.determine_severity(pH)
+        self._put(patient_id, (patient, treatment))
+        return patient, treatment
+
+    def _put(self, patient_id, state):
+        self._states[patient_id] = state
+        self._states.move_to_end(patient_id)
+        while self.store is not None and len(self._states) > self.capacity:
+            _, (evicted, _) = self._states.popitem(last=False)
+            self.store.detach(evicted)
+
+
+###########################################################
+# Micro-batching
+###########################################################
+class ScoringBatcher:
+    """Coalesce concurrent scoring requests into vectorized micro-batches.
+
+    A batch holds at most one panel per patient, so a patient's panels are scored in the order
+    they were submitted and each sees the insulin drip state left by the previous one.
+    """
+
+    INPUTS = ("glucose", "corrected_sodium", "anion_gap", "potassium", "pH")
+
+    def __init__(self, max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.scored = 0
+        self._pending = deque()  # (patient, treatment, inputs, future)
+        self._wakeup = None
+        self._task = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+    def score(self, patient, treatment, inputs):
+        """Queue one panel's protocol inputs; the returned future resolves to (severity, recommendations)."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((patient, treatment, inputs, future))
+        self._wakeup.set()
+        return future
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            if len(self._pending) < self.max_batch:
+                await asyncio.sleep(self.max_wait)
+            self._wakeup.clear()
+            while self._pending:
+                self._score_batch(self._take_batch())
+
+    def _take_batch(self):
+        batch, seen, deferred = [], set(), deque()
+        while self._pending and len(batch) < self.max_batch:
+            item = self._pending.popleft()
+            if item[0].patient_id in seen:
+                deferred.append(item)
+            else:
+                seen.add(item[0].patient_id)
+                batch.append(item)
+        deferred.extend(self._pending)
+        self._pending = deferred
+        return batch
+
+    def _score_batch(self, batch):
+        rules = protocol.active()
+        try:
+            scores = score_panels(
+                protocol=rules,
+                insulin_drip=[patient.insulin_drip for patient, _, _, _ in batch],
+                **{name: [inputs[name] for _, _, inputs, _ in batch] for name in self.INPUTS},
+            )
+        except Exception as error:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        self.batches += 1
+        self.scored += len(batch)
+        for row, (patient, treatment, _, future) in enumerate(batch):
+            recommendations = scores.recommendations(row)
+            if scores.start_insulin[row]:
+                patient.insulin_drip = True
+            treatment.current_recommendations = recommendations
+            if not future.done():
+                future.set_result((scores.severity_of(row), recommendations))
+
+
+###########################################################
+# Service
+###########################################################
+class ScoringService:
+    """Admit/add-panel/recommendations operations over cached patients."""
+
+    def __init__(self, store=None, cache_size=DEFAULT_CACHE_SIZE, max_batch=DEFAULT_MAX_BATCH,
+                 max_wait=DEFAULT_MAX_WAIT):
+        self.store = store
+        self.patients = PatientCache(store, cache_size)
+        self.batcher = ScoringBatcher(max_batch, max_wait)
+        self.requests = 0
+
+    def _state(self, patient_id):
+        try:
+            return self.patients.get(patient_id)
+        except KeyError:
+            raise ServiceError(404, f"unknown patient {patient_id}") from None
+
+    def admit(self, data):
+        patient_id = str(data.get("patient_id") or uuid.uuid4())
+        if patient_id in self.patients:
+            raise ServiceError(409, f"patient {patient_id} is already admitted")
+        patient = Patient(
+            patient_id=patient_id, name=data.get("name"), age=data.get("age"), weight=data.get("weight"),
+            gender=data.get("gender"),
+        )
+        self.patients.add(patient)
+        return {"patient_id": patient_id}
+
+    async def add_panel(self, patient_id, data):
+        patient, treatment = self._state(patient_id)
+        try:
+            values = {analyte: float(data[analyte]) for analyte in ANALYTES if data.get(analyte) is not None}
+            time = datetime.fromisoformat(data["time"]) if data.get("time") else datetime.now()
+        except (TypeError, ValueError) as error:
+            raise ServiceError(400, f"bad panel: {error}") from None
+        if not values:
+            raise ServiceError(400, f"panel has none of {', '.join(ANALYTES)}")
+
+        if self.store is not None:
+            with self.store.batch():
+                scored = record_panel(patient, time, values)
+        else:
+            scored = record_panel(patient, time, values)
+        if "pH" in values and treatment.admission_status is None:
+            treatment.admission_status = treatment.determine_severity(values["pH"])
+        if not scored:
+            return {"patient_id": patient_id, "severity": None, "recommendations": None}
+
+        inputs = {
+            "glucose": patient.get_glucose()[1],
+            "corrected_sodium": patient.get_corrected_sodium()[1],
+            "anion_gap": patient.get_anion_gap()[1],
+            "potassium": patient.get_electrolytes()[2],
+            "pH": patient.get_pH()[1],
+        }
+        severity, recommendations = await self.batcher.score(patient, treatment, inputs)
+        if self.store is not None and recommendations and recommendations[0] == protocol.START_INSULIN_MESSAGE:
+            self.store.save_patient(patient)
+        return {"patient_id": patient_id, "severity": severity.name, "recommendations": recommendations}
+
+    def recommendations(self, patient_id):
+        patient, treatment = self._state(patient_id)
+        return {"patient_id": patient_id, "recommendations": treatment.current_recommendations}
+
+    def health(self):
+        batches = self.batcher.batches
+        return {
+            "status": "ok",
+            "patients": len(self.patients),
+            "requests": self.requests,
+            "batches": batches,
+            "mean_batch_size": round(self.batcher.scored / batches, 2) if batches else None,
+        }
+
+    async def dispatch(self, method, path, body):
+        """Route one request; returns a JSON-serializable response or raises ServiceError."""
+        self.requests += 1
+        if not isinstance(body, dict):
+            raise ServiceError(400, "request body must be a JSON object")
+        parts = [part for part in path.split("?", 1)[0].split("/") if part]
+        if method == "GET" and parts == ["health"]:
+            return self.health()
+        if method == "POST" and parts == ["patients"]:
+            return self.admit(body)
+        if len(parts) == 3 and parts[0] == "patients":
+            if method == "POST" and parts[2] == "panels":
+                return await self.add_panel(parts[1], body)
+            if method == "GET" and parts[2] == "recommendations":
+                return self.recommendations(parts[1])
+        raise ServiceError(404, f"no route for {method} {path}")
+
+
+###########################################################
+# HTTP
+###########################################################
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict", 500: "Internal Server Error"}
+
+
+async def _read_request(reader):
+    """Return (method, path, headers, body) or None at end of stream."""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+def _response(status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+async def handle_connection(service: ScoringService, reader, writer):
+    """Serve HTTP/1.1 requests on one (keep-alive) connection."""
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                writer.write(_response(400, {"error": "malformed request"}, keep_alive=False))
+                break
+            if request is None:
+                break
+            method, path, headers, body = request
+            keep_alive = headers.get("connection", "").lower() != "close"
+            try:
+                payload = await service.dispatch(method, path, json.loads(body) if body else {})
+                status = 200
+            except ServiceError as error:
+                status, payload = error.status, {"error": str(error)}
+            except ValueError as error:
+                status, payload = 400, {"error": f"invalid JSON: {error}"}
+            except Exception as error:
+                status, payload = 500, {"error": repr(error)}
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host="127.0.0.1", port=DEFAULT_PORT, store_path=None, **options):
+    """Run the service until cancelled."""
+    store = None
+    if store_path:
+        from patient.store import LabStore
+
+        store = LabStore(store_path)
+    service = ScoringService(store, **options)
+    service.batcher.start()
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_connection(service, reader, writer), host, port, reuse_address=True
+    )
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.batcher.stop()
+        if store is not None:
+            store.close()
+
+
+def _serve_process(host, port, store_path, options):
+    try:
+        asyncio.run(serve(host, port, store_path, **options))
+    except KeyboardInterrupt:
+        pass
+
+
+def run_workers(workers, host="127.0.0.1", port=DEFAULT_PORT, store_path=None, **options):
+    """Start `workers` service processes on consecutive ports; returns the processes."""
+    processes = [
+        multiprocessing.Process(
+            target=_serve_process, args=(host, port + number, store_path, options), name=f"dka-service-{number}",
+            daemon=True,
+        )
+        for number in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    return processes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless DKA scoring service (HTTP/JSON).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=1, help="processes on ports port..port+workers-1")
+    parser.add_argument("--store", help="SQLite LabStore to persist patients in")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT * 1e3)
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE)
+    args = parser.parse_args()
+
+    options = {"max_batch": args.max_batch, "max_wait": args.max_wait_ms / 1e3, "cache_size": args.cache_size}
+    last_port = args.port + args.workers - 1
+    print(f"Serving on http://{args.host}:{args.port}" + (f"..{last_port}" if args.workers > 1 else ""))
+    if args.workers == 1:
+        _serve_process(args.host, args.port, args.store, options)
+    else:
+        processes = run_workers(args.workers, args.host, args.port, args.store, **options)
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,287 @@
+"""Cohort of lab panels in shared memory: one writer process, any number of zero-copy readers.
+
+Layout of the shared block (all little-endian, native NumPy arrays):
+
+    header     uint64[8]: magic, version, patient capacity, panel capacity, fields, patients, directory seq
+    seq        uint64[patients]       per-patient seqlock, odd while a panel is being written
+    count      int64[patients]        panels published per patient
+    ids        S64[patients]          patient ids, by slot
+    times      int64[patients, panels]            epoch microseconds
+    values     float64[patients, panels, fields]  FIELDS of each panel
+
+Rows are append-only: the writer fills row `count` and only then publishes count + 1, inside a
+seqlock (seq odd while writing, even when done). A published row never changes again, so views
+of rows [0, count) are safe to hand out without copying; `latest` and `panels` additionally retry
+until they read the same even seq before and after, so they never return a torn panel or a count
+that disagrees with its rows. The directory of patient ids uses the same scheme with one global
+seq. Ordering relies on stores becoming visible in program order, as on x86-64.
+
+Writer:  cohort = SharedCohort.create("dka-cohort"); ...; cohort.publish(patient)  # after each panel
+Reader:  cohort = SharedCohort.open("dka-cohort"); cohort.latest(patient_id)
+
+Run from src/:  python -m benchmarks.shared_cohort
+"""
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from patient import derived
+from patient.series import to_epoch_us
+
+
+MAGIC = 0x44_4B_41_43_4F_48_52_54  # "DKACOHRT"
+FORMAT_VERSION = 1
+FIELDS = ("sodium", "potassium", "chloride", "bicarbonate", "pH", "glucose", "corrected_sodium", "anion_gap")
+ID_BYTES = 64
+READ_TIMEOUT = 1.0  # seconds a reader keeps retrying before giving up on a busy writer
+
+
+class TornReadError(RuntimeError):
+    """A reader kept racing the writer for READ_TIMEOUT seconds."""
+
+
+def _retries():
+    """Yield attempt numbers until READ_TIMEOUT; after a failed attempt, yield the CPU to the writer."""
+    yield 0
+    deadline = time.monotonic() + READ_TIMEOUT
+    attempt = 1
+    while time.monotonic() < deadline:
+        os.sched_yield()  # the writer may be preempted mid-panel; spinning would only delay it
+        yield attempt
+        attempt += 1
+
+
+def _layout(patients, panels):
+    """[(name, dtype, shape, offset)] and the total size, every array 64-byte aligned."""
+    arrays = [
+        ("header", np.uint64, (8,)),
+        ("seq", np.uint64, (patients,)),
+        ("count", np.int64, (patients,)),
+        ("ids", f"S{ID_BYTES}", (patients,)),
+        ("times", np.int64, (patients, panels)),
+        ("values", np.float64, (patients, panels, len(FIELDS))),
+    ]
+    layout, offset = [], 0
+    for name, dtype, shape in arrays:
+        layout.append((name, dtype, shape, offset))
+        offset += np.dtype(dtype).itemsize * int(np.prod(shape))
+        offset += -offset % 64
+    return layout, offset
+
+
+class SharedCohort:
+    """Panels of many patients in one multiprocessing.shared_memory block."""
+
+    def __init__(self, memory: shared_memory.SharedMemory, writer):
+        self.memory = memory
+        self.writer = writer
+        header = np.ndarray((8,), dtype=np.uint64, buffer=memory.buf)
+        if int(header[0]) != MAGIC:
+            raise ValueError(f"shared memory {memory.name!r} is not a DKA cohort")
+        if int(header[1]) > FORMAT_VERSION:
+            raise ValueError(f"cohort format {int(header[1])} is newer than supported ({FORMAT_VERSION})")
+        self.capacity, self.panel_capacity = int(header[2]), int(header[3])
+        for name, dtype, shape, offset in _layout(self.capacity, self.panel_capacity)[0]:
+            array = np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=offset)
+            if not writer:
+                array.flags.writeable = False
+            setattr(self, f"_{name}", array)
+        self._slots = {}  # patient_id -> slot, refreshed from the shared directory
+        self._known = 0  # directory entries already in _slots
+
+    @classmethod
+    def create(cls, name=None, patients=1024, panels=256):
+        """Allocate a new cohort block and return its writer."""
+        layout, size = _layout(patients, panels)
+        memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((8,), dtype=np.uint64, buffer=memory.buf)
+        header[:] = (MAGIC, FORMAT_VERSION, patients, panels, len(FIELDS), 0, 0, 0)
+        return cls(memory, writer=True)
+
+    @classmethod
+    def open(cls, name):
+        """Attach to an existing cohort as a read-only reader."""
+        try:
+            memory = shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+        except TypeError:
+            from multiprocessing import resource_tracker
+
+            memory = shared_memory.SharedMemory(name=name)
+            # Otherwise the tracker unlinks the writer's block when this reader exits.
+            resource_tracker.unregister(memory._name, "shared_memory")
+        return cls(memory, writer=False)
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def close(self):
+        """Detach this process; drop every view handed out first."""
+        for name, _, _, _ in _layout(0, 0)[0]:
+            setattr(self, f"_{name}", None)
+        self.memory.close()
+
+    def unlink(self):
+        """Free the block once every process has closed it (writer only)."""
+        from multiprocessing import resource_tracker
+
+        # Readers spawned from this process share its resource tracker, and open() unregistered the
+        # block there; register it again (a no-op otherwise) so unlink's unregister finds it.
+        resource_tracker.register(self.memory._name, "shared_memory")
+        self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return int(self._header[5])
+
+    ###########################################################
+    # Writer
+    ###########################################################
+    def add_patient(self, patient_id):
+        """Give a patient a slot (idempotent) and return it."""
+        slot = self.slot(patient_id)
+        if slot is not None:
+            return slot
+        slot = len(self)
+        if slot == self.capacity:
+            raise ValueError(f"cohort is full ({self.capacity} patients)")
+        encoded = patient_id.encode()
+        if len(encoded) > ID_BYTES:  # the ids column would silently truncate it
+            raise ValueError(f"patient id {patient_id!r} is longer than {ID_BYTES} bytes")
+        header = self._header
+        header[6] += 1  # directory seqlock: odd while the new id is written
+        self._ids[slot] = encoded
+        header[5] = slot + 1
+        header[6] += 1
+        self._slots[patient_id] = slot
+        self._known = slot + 1
+        return slot
+
+    def append(self, patient_id, time, sodium, potassium, chloride, bicarbonate, pH, glucose):
+        """Publish one panel; corrected sodium and anion gap are derived as Patient does."""
+        slot = self.add_patient(patient_id)
+        row = int(self._count[slot])
+        if row == self.panel_capacity:
+            raise ValueError(f"patient {patient_id!r} has no room for more than {self.panel_capacity} panels")
+        # Everything that can fail happens before the seqlock: a seq left odd would lock readers out for good.
+        stamp = to_epoch_us(time)
+        values = (
+            sodium, potassium, chloride, bicarbonate, pH, glucose,
+            derived.corrected_sodium(sodium, glucose), derived.anion_gap(sodium, potassium, chloride, bicarbonate),
+        )
+        self._seq[slot] += 1
+        try:
+            self._times[slot, row] = stamp
+            self._values[slot, row] = values
+            self._count[slot] = row + 1
+        finally:
+            self._seq[slot] += 1
+
+    def publish(self, patient):
+        """Publish the patient's latest complete panel, once it has been recorded in full.
+
+        Call after DKATreatment.log_bloodwork or ingest.record_panel. The panel is the latest
+        electrolytes, pH and glucose, stamped with the newest of their times; returns False, and
+        publishes nothing, until all three are on record or if nothing changed since the last call.
+        """
+        time, sodium, potassium, chloride, bicarbonate = patient.get_electrolytes()
+        pH_time, pH = patient.get_pH()
+        glucose_time, glucose = patient.get_glucose()
+        if None in (time, pH_time, glucose_time):
+            return False
+        time = max(time, pH_time, glucose_time)
+        slot = self.add_patient(patient.patient_id)
+        row = int(self._count[slot])
+        if row and int(self._times[slot, row - 1]) >= to_epoch_us(time):
+            return False
+        self.append(patient.patient_id, time, sodium, potassium, chloride, bicarbonate, pH, glucose)
+        return True
+
+    ###########################################################
+    # Readers
+    ###########################################################
+    def _refresh(self):
+        header = self._header
+        for _ in _retries():
+            before = int(header[6])
+            if before % 2:
+                continue
+            known = int(header[5])
+            ids = self._ids[self._known:known].tolist()
+            if int(header[6]) == before:
+                for offset, patient_id in enumerate(ids):
+                    self._slots[patient_id.decode()] = self._known + offset
+                self._known = known
+                return
+        raise TornReadError("patient directory kept changing")
+
+    def slot(self, patient_id):
+        """The patient's slot, or None if it has none."""
+        slot = self._slots.get(patient_id)
+        if slot is None and self._known != len(self):
+            self._refresh()
+            slot = self._slots.get(patient_id)
+        return slot
+
+    def patient_ids(self):
+        """Ids of every patient in the cohort, in slot order."""
+        self._refresh()
+        return [patient_id.decode() for patient_id in self._ids[:self._known].tolist()]
+
+    def _slot(self, patient_id):
+        slot = self.slot(patient_id)
+        if slot is None:
+            raise KeyError(patient_id)
+        return slot
+
+    def count(self, patient_id):
+        """Panels published for a patient."""
+        return int(self._count[self._slot(patient_id)])
+
+    def times(self, patient_id):
+        """Zero-copy datetime64[us] view of the patient's published panel times."""
+        slot = self._slot(patient_id)
+        return self._times[slot, :int(self._count[slot])].view("datetime64[us]")
+
+    def values(self, patient_id, field=None):
+        """Zero-copy view of the patient's published panels: [panels, FIELDS], or one field's column."""
+        slot = self._slot(patient_id)
+        rows = self._values[slot, :int(self._count[slot])]
+        return rows if field is None else rows[:, FIELDS.index(field)]
+
+    def latest(self, patient_id):
+        """Consistent copy of the patient's latest panel as (epoch µs, {field: value}), or None."""
+        slot = self._slot(patient_id)
+        seq, count = self._seq, self._count
+        for _ in _retries():
+            before = int(seq[slot])
+            if before % 2:
+                continue
+            row = int(count[slot]) - 1
+            if row < 0:
+                return None
+            time, values = int(self._times[slot, row]), self._values[slot, row].tolist()
+            if int(seq[slot]) == before:
+                return time, dict(zip(FIELDS, values))
+        raise TornReadError(f"patient {patient_id!r} kept changing")
+
+    def panels(self, patient_id):
+        """Consistent copies of all of a patient's panels: (times int64[n], values float64[n, FIELDS])."""
+        slot = self._slot(patient_id)
+        seq, count = self._seq, self._count
+        for _ in _retries():
+            before = int(seq[slot])
+            if before % 2:
+                continue
+            rows = int(count[slot])
+            times, values = self._times[slot, :rows].copy(), self._values[slot, :rows].copy()
+            if int(seq[slot]) == before:
+                return times, values
+        raise TornReadError(f"patient {patient_id!r} kept changing")
@@ -0,0 +1,131 @@
+import argparse
+import random
+from collections import Counter
+from itertools import repeat
+
+from patient.clock import VirtualClock
+from patient.patient import DEFAULT_MAX_STEPS, DKATreatment, Patient
+
+
+class SimulationSummary:
+    """Aggregated outcome of many simulated treat_patient runs."""
+
+    def __init__(self):
+        self.runs = 0
+        self.unresolved = 0
+        self.resolution_hours = Counter()  # hours to resolution -> runs
+        self.recommendations = Counter()  # recommendation -> times given
+        self.severity = Counter()  # admission DKASeverity -> runs
+
+    def add(self, severity, hours, recommendations):
+        """Fold one run into the summary; `hours` is None for runs that hit the step cap."""
+        self.runs += 1
+        self.severity[severity] += 1
+        if hours is None:
+            self.unresolved += 1
+        else:
+            self.resolution_hours[hours] += 1
+        self.recommendations.update(recommendations)
+
+    @property
+    def resolved(self):
+        return self.runs - self.unresolved
+
+    def mean_resolution_hours(self):
+        """Mean hours to resolution over resolved runs."""
+        if not self.resolved:
+            return None
+        return sum(hours * runs for hours, runs in self.resolution_hours.items()) / self.resolved
+
+    def resolution_percentile(self, q):
+        """Hours by which `q` percent of resolved runs had resolved."""
+        if not self.resolved:
+            return None
+        rank = q / 100 * self.resolved
+        seen = 0
+        for hours in sorted(self.resolution_hours):
+            seen += self.resolution_hours[hours]
+            if seen >= rank:
+                return hours
+        return max(self.resolution_hours)
+
+
+def simulate_patient(seed, max_steps=DEFAULT_MAX_STEPS, model=None):
+    """Run one silent, seeded simulation through DKATreatment.steps.
+
+    `model` names a patient.trajectory.MODELS entry seeded with `seed`; by default panels come from
+    DKATreatment.generate_random_bloodwork. Returns (admission DKASeverity, hours to resolution or
+    None, recommendations given). The simulated patient keeps only its latest sample of each series.
+    """
+    patient = Patient(
+        patient_id=f"sim-{seed}", name="Simulated", age=45, weight=70, gender="Other", clock=VirtualClock()
+    )
+    treatment = DKATreatment(rng=random.Random(seed))
+    treatment.admit_patient(patient)
+    if model is not None:
+        from patient.trajectory import MODELS
+
+        model = MODELS[model](seed=seed)
+
+    severity, hours, recommendations = None, None, []
+    for step in treatment.steps(patient, model=model, max_steps=max_steps, history=1):
+        if step.number == 0:
+            severity = step.severity
+        if step.resolved:
+            hours = step.number
+        else:
+            recommendations += step.recommendations
+    return severity, hours, recommendations
+
+
+def _simulate_chunk(seeds, max_steps, model):
+    return [simulate_patient(seed, max_steps, model) for seed in seeds]
+
+
+def run_simulations(runs, seed=0, workers=None, max_steps=DEFAULT_MAX_STEPS, chunksize=256, model=None):
+    """Simulate `runs` patients across a process pool and aggregate the outcomes.
+
+    Every run gets its own seed drawn from `seed` up front, so the summary is identical for any
+    number of workers. workers=1 runs in-process.
+    """
+    seed_source = random.Random(seed)
+    seeds = [seed_source.getrandbits(64) for _ in range(runs)]
+    chunks = [seeds[start:start + chunksize] for start in range(0, runs, chunksize)]
+
+    summary = SimulationSummary()
+    if workers == 1:
+        for chunk in map(_simulate_chunk, chunks, repeat(max_steps), repeat(model)):
+            for outcome in chunk:
+                summary.add(*outcome)
+        return summary
+
+    from concurrent.futures import ProcessPoolExecutor  # pulls in multiprocessing; only pay for it here
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in executor.map(_simulate_chunk, chunks, repeat(max_steps), repeat(model)):
+            for outcome in chunk:
+                summary.add(*outcome)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of DKATreatment.steps.")
+    parser.add_argument("--runs", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="default: one per CPU")
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS)
+    parser.add_argument("--model", choices=("uniform", "walk"), help="trajectory model; default: random bloodwork")
+    args = parser.parse_args()
+
+    summary = run_simulations(args.runs, seed=args.seed, workers=args.workers, max_steps=args.max_steps,
+                              model=args.model)
+    print(f"Runs: {summary.runs}, resolved: {summary.resolved}, hit step cap: {summary.unresolved}")
+    print(f"Hours to resolution: mean {summary.mean_resolution_hours():.2f}, "
+          f"p50 {summary.resolution_percentile(50)}, p90 {summary.resolution_percentile(90)}, "
+          f"p99 {summary.resolution_percentile(99)}")
+    print("Admission severity:")
+    for severity, runs in summary.severity.most_common():
+        print(f"- {severity.value}: {runs}")
+    print("Recommendations:")
+    for rec, count in summary.recommendations.most_common():
+        print(f"- {rec}: {count}")
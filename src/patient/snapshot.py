@@ -0,0 +1,233 @@
+"""Versioned binary snapshots of Patient and DKATreatment state.
+
+Layout (little-endian):
+
+    header    "DKAS", u16 format version, u16 section count, u32 reserved
+    sections  count x (24-byte ASCII name, u64 offset, u64 length)
+    data      each section starts on an 8-byte boundary
+
+Sections are "meta" (UTF-8 JSON: demographics, insulin drip, treatment state), one
+"series:<name>" per Patient series: u32 samples, u32 fields, u32 ordered flag, u32 reserved, then
+the int64 epoch-microsecond times and one float64 column per field, and "recommendations": the
+treatment's recommendation history as u32 steps, u32 total, then u16 per-step counts and u16
+indexes into the meta string table (a few distinct messages repeat every panel). Readers skip sections and
+meta keys they do not know, and series fields are only ever appended, so readers take the fields
+they know and skip trailing ones. New data can be added without breaking old readers; the format
+version changes only for incompatible layouts.
+
+`loads`/`load` rebuild live objects; SnapshotFile memory-maps a file and exposes the columns as
+zero-copy read-only NumPy views without building a Patient.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate, chain
+
+from patient.patient import DKASeverity, DKATreatment, Patient
+
+
+MAGIC = b"DKAS"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sHHI")
+_SECTION = struct.Struct("<24sQQ")
+_SERIES_HEADER = struct.Struct("<IIII")
+_RECOMMENDATIONS_HEADER = struct.Struct("<II")
+_META = "meta"
+_RECOMMENDATIONS = "recommendations"
+_SERIES_PREFIX = "series:"
+
+if sys.byteorder != "little":  # columns are written as the raw native buffers
+    raise ImportError("patient.snapshot requires a little-endian platform")
+
+
+def _padding(size):
+    return b"\0" * (-size % 8)
+
+
+###########################################################
+# Writing
+###########################################################
+def _meta(patient, treatment, messages):
+    meta = {
+        "patient": {
+            "patient_id": patient.patient_id,
+            "name": patient.name,
+            "age": patient.age,
+            "weight": patient.weight,
+            "gender": patient.gender,
+            "insulin_drip": patient.insulin_drip,
+        },
+    }
+    if treatment is not None:
+        meta["treatment"] = {
+            "admission_status": treatment.admission_status.name if treatment.admission_status else None,
+            "current_recommendations": list(treatment.current_recommendations),
+            "messages": list(messages),
+            "protocol_version": treatment.protocol().version,
+        }
+    return json.dumps(meta, separators=(",", ":")).encode()
+
+
+def _series_section(series):
+    ordered, times, columns = series.raw()
+    return [_SERIES_HEADER.pack(len(times), len(columns), int(ordered), 0), times, *columns]
+
+
+def _recommendations_section(steps, messages):
+    flat = list(chain.from_iterable(steps))
+    for message in dict.fromkeys(flat):
+        messages.setdefault(message, len(messages))
+    counts, indexes = array("H", map(len, steps)), array("H", map(messages.__getitem__, flat))
+    return [_RECOMMENDATIONS_HEADER.pack(len(counts), len(indexes)), counts.tobytes(), indexes.tobytes()]
+
+
+def dumps(patient: Patient, treatment: DKATreatment = None):
+    """Serialize a patient (and optionally its treatment) to bytes."""
+    sections = [(_SERIES_PREFIX + name, _series_section(patient.series(name))) for name in Patient.SERIES]
+    messages = {}  # message -> index, filled by the recommendations section
+    if treatment is not None:
+        sections.append((_RECOMMENDATIONS, _recommendations_section(treatment.all_recommendations, messages)))
+    sections.insert(0, (_META, [_meta(patient, treatment, messages)]))
+
+    table_size = _HEADER.size + _SECTION.size * len(sections)
+    offset = table_size + len(_padding(table_size))
+    entries, chunks = [], []
+    for name, parts in sections:
+        length = sum(part.nbytes if isinstance(part, memoryview) else len(part) for part in parts)
+        entries.append(_SECTION.pack(name.encode("ascii"), offset, length))
+        chunks += parts
+        chunks.append(_padding(length))
+        offset += length + len(_padding(length))
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), 0) + b"".join(entries)
+    return b"".join([header, _padding(len(header)), *chunks])
+
+
+def save(path, patient: Patient, treatment: DKATreatment = None):
+    """Atomically write a snapshot file."""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as handle:
+        handle.write(dumps(patient, treatment))
+    os.replace(temporary, path)
+
+
+###########################################################
+# Reading
+###########################################################
+def _sections(buffer):
+    magic, version, count, _ = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("not a DKA snapshot")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"snapshot format {version} is newer than supported ({FORMAT_VERSION})")
+    sections = {}
+    for index in range(count):
+        name, offset, length = _SECTION.unpack_from(buffer, _HEADER.size + index * _SECTION.size)
+        sections[name.rstrip(b"\0").decode("ascii")] = (offset, length)
+    return sections
+
+
+def _series_parts(buffer, offset):
+    """Return (ordered, times, columns) memoryviews of a series section."""
+    count, fields, ordered, _ = _SERIES_HEADER.unpack_from(buffer, offset)
+    view = memoryview(buffer)
+    start = offset + _SERIES_HEADER.size
+    times = view[start:start + 8 * count]
+    columns = tuple(
+        view[start + 8 * count * (field + 1):start + 8 * count * (field + 2)] for field in range(fields)
+    )
+    return bool(ordered), times, columns
+
+
+def _recommendations(buffer, offset, messages):
+    steps, total = _RECOMMENDATIONS_HEADER.unpack_from(buffer, offset)
+    start = offset + _RECOMMENDATIONS_HEADER.size
+    counts, indexes = array("H"), array("H")
+    counts.frombytes(buffer[start:start + 2 * steps])
+    indexes.frombytes(buffer[start + 2 * steps:start + 2 * (steps + total)])
+    flat = list(map(messages.__getitem__, indexes))
+    ends = list(accumulate(counts))
+    return list(map(flat.__getitem__, map(slice, [0] + ends[:-1], ends)))
+
+
+def loads(data):
+    """Rebuild (Patient, DKATreatment or None) from snapshot bytes."""
+    sections = _sections(data)
+    offset, length = sections[_META]
+    meta = json.loads(bytes(memoryview(data)[offset:offset + length]))
+
+    fields = meta["patient"]
+    patient = Patient(
+        patient_id=fields["patient_id"], name=fields["name"], age=fields["age"], weight=fields["weight"],
+        gender=fields["gender"],
+    )
+    patient.insulin_drip = fields["insulin_drip"]
+    for name in Patient.SERIES:
+        if _SERIES_PREFIX + name in sections:
+            offset, _ = sections[_SERIES_PREFIX + name]
+            ordered, times, columns = _series_parts(data, offset)
+            known = len(Patient.SERIES[name])
+            if len(columns) < known:
+                raise ValueError(f"snapshot series {name!r} has {len(columns)} fields, expected at least {known}")
+            patient.series(name).restore(ordered, times, columns[:known])
+
+    treatment = None
+    if "treatment" in meta:
+        state = meta["treatment"]
+        treatment = DKATreatment()
+        treatment.admit_patient(patient)
+        if state["admission_status"]:
+            treatment.admission_status = DKASeverity[state["admission_status"]]
+        treatment.current_recommendations = state["current_recommendations"]
+        if _RECOMMENDATIONS in sections:
+            offset, _ = sections[_RECOMMENDATIONS]
+            treatment.all_recommendations = _recommendations(data, offset, state["messages"])
+    return patient, treatment
+
+
+def load(path):
+    """Read a snapshot file into (Patient, DKATreatment or None)."""
+    with open(path, "rb") as handle:
+        return loads(handle.read())
+
+
+class SnapshotFile:
+    """Read-only, memory-mapped view of a snapshot file.
+
+    Column accessors return NumPy views straight over the mapping; keep the SnapshotFile open
+    while using them.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self.sections = _sections(self._mmap)
+        offset, length = self.sections[_META]
+        self.meta = json.loads(self._mmap[offset:offset + length])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+
+    def _parts(self, series):
+        offset, _ = self.sections[_SERIES_PREFIX + series]
+        return _series_parts(self._mmap, offset)
+
+    def times(self, series):
+        """Zero-copy datetime64[us] view of one series' timestamps."""
+        import numpy as np
+
+        return np.frombuffer(self._parts(series)[1], dtype=np.int64).view("datetime64[us]")
+
+    def values(self, series, field):
+        """Zero-copy float64 view of one field of a series."""
+        import numpy as np
+
+        return np.frombuffer(self._parts(series)[2][Patient.SERIES[series].index(field)], dtype=np.float64)
@@ -0,0 +1,197 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from patient.patient import Patient
+from patient.series import from_epoch_us, to_epoch_us
+
+
+DEFAULT_RECENT = 24  # samples per series loaded when a patient is opened
+MAX_FIELDS = 4  # widest series (electrolytes)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    patient_id TEXT PRIMARY KEY,
+    name TEXT,
+    age REAL,
+    weight REAL,
+    gender TEXT,
+    insulin_drip INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS samples (
+    patient_id TEXT NOT NULL,
+    series TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    v0 REAL, v1 REAL, v2 REAL, v3 REAL
+);
+CREATE INDEX IF NOT EXISTS samples_by_patient ON samples (patient_id, series, ts);
+"""
+_INSERT_SAMPLE = "INSERT INTO samples (patient_id, series, ts, v0, v1, v2, v3) VALUES (?, ?, ?, ?, ?, ?, ?)"
+_UPSERT_PATIENT = """
+INSERT INTO patients (patient_id, name, age, weight, gender, insulin_drip) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (patient_id) DO UPDATE SET
+    name = excluded.name, age = excluded.age, weight = excluded.weight,
+    gender = excluded.gender, insulin_drip = excluded.insulin_drip
+"""
+
+
+class LabStore:
+    """Durable, append-only store of Patient samples in SQLite (WAL mode).
+
+    Attached patients append every add_* sample to the log. Inside `batch()` the samples of a
+    thread are buffered and written in one transaction when the block exits, or dropped if it
+    raises; outside it each sample commits on its own. Opening a patient loads only the most
+    recent samples of each series; older ones are read on demand with `history()`.
+    """
+
+    def __init__(self, path, recent=DEFAULT_RECENT):
+        self.path = str(path)
+        self.recent = recent
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints, no fsync per commit
+            self._local.connection = connection
+            self._local.pending = []
+            self._local.depth = 0
+        return connection
+
+    def close(self):
+        """Flush and close this thread's connection."""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            self.flush()
+            connection.close()
+            self._local.connection = None
+
+    ###########################################################
+    # Writing
+    ###########################################################
+    def save_patient(self, patient: Patient):
+        """Insert or update a patient's demographics and insulin drip state."""
+        with self._connection() as connection:
+            connection.execute(_UPSERT_PATIENT, (
+                patient.patient_id, patient.name, patient.age, patient.weight, patient.gender,
+                int(patient.insulin_drip),
+            ))
+
+    def attach(self, patient: Patient):
+        """Save a patient and append each of its future samples to the store."""
+        self.save_patient(patient)
+        patient.subscribe(self._on_sample)
+
+    def detach(self, patient: Patient):
+        patient.unsubscribe(self._on_sample)
+
+    def _on_sample(self, patient, series, row):
+        self._connection()
+        time, *values = row
+        values += [None] * (MAX_FIELDS - len(values))
+        self._local.pending.append((patient.patient_id, series, to_epoch_us(time), *values))
+        if not self._local.depth:
+            self.flush()
+
+    @contextmanager
+    def batch(self):
+        """Write every sample recorded in this thread inside the block as one transaction.
+
+        If the block raises, its samples are dropped instead, so a half-recorded panel never
+        reaches the store (the in-memory Patient still holds them). Nested blocks drop only their own.
+        """
+        self._connection()
+        pending = self._local.pending
+        mark = len(pending)
+        self._local.depth += 1
+        try:
+            yield self
+        except BaseException:
+            del pending[mark:]
+            raise
+        finally:
+            self._local.depth -= 1
+            if not self._local.depth:
+                self.flush()
+
+    def flush(self):
+        """Commit the samples buffered by this thread."""
+        pending = getattr(self._local, "pending", None)
+        if not pending:
+            return
+        with self._connection() as connection:
+            connection.executemany(_INSERT_SAMPLE, pending)
+        pending.clear()
+
+    ###########################################################
+    # Reading
+    ###########################################################
+    def patient_ids(self):
+        return [row[0] for row in self._connection().execute("SELECT patient_id FROM patients ORDER BY rowid")]
+
+    def has_patient(self, patient_id):
+        """Return whether the patient was saved, without opening it."""
+        query = "SELECT 1 FROM patients WHERE patient_id = ?"
+        return self._connection().execute(query, (patient_id,)).fetchone() is not None
+
+    def open_patient(self, patient_id, recent=None, attach=True):
+        """Rebuild a Patient holding the latest `recent` samples of each series.
+
+        With attach=True the patient keeps appending new samples to the store.
+        """
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT name, age, weight, gender, insulin_drip FROM patients WHERE patient_id = ?", (patient_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(patient_id)
+        name, age, weight, gender, insulin_drip = row
+        patient = Patient(patient_id=patient_id, name=name, age=age, weight=weight, gender=gender)
+        patient.insulin_drip = bool(insulin_drip)
+
+        limit = self.recent if recent is None else recent
+        for series_name, fields in Patient.SERIES.items():
+            rows = connection.execute(
+                "SELECT ts, v0, v1, v2, v3 FROM samples WHERE patient_id = ? AND series = ? "
+                "ORDER BY ts DESC, rowid DESC LIMIT ?",
+                (patient_id, series_name, limit),
+            ).fetchall()
+            series = patient.series(series_name)
+            for stamp, *values in reversed(rows):
+                series.append(from_epoch_us(stamp), *values[:len(fields)])
+        if attach:
+            patient.subscribe(self._on_sample)
+        return patient
+
+    def history(self, patient_id, series, start=None, end=None):
+        """Return stored samples of one series with start <= time < end as (time, *values) tuples."""
+        query = "SELECT ts, v0, v1, v2, v3 FROM samples WHERE patient_id = ? AND series = ?"
+        params = [patient_id, series]
+        if start is not None:
+            query += " AND ts >= ?"
+            params.append(to_epoch_us(start))
+        if end is not None:
+            query += " AND ts < ?"
+            params.append(to_epoch_us(end))
+        width = len(Patient.SERIES[series])
+        return [
+            (from_epoch_us(stamp), *values[:width])
+            for stamp, *values in self._connection().execute(query + " ORDER BY ts, rowid", params)
+        ]
+
+    def samples(self, patient_ids=None):
+        """Yield every stored sample (of `patient_ids`, default all) in the order it was written.
+
+        Samples are (patient_id, series, time, *values) tuples.
+        """
+        query = "SELECT patient_id, series, ts, v0, v1, v2, v3 FROM samples"
+        params = ()
+        if patient_ids is not None:
+            params = list(patient_ids)
+            query += f" WHERE patient_id IN ({', '.join('?' * len(params))})"
+        for patient_id, series, stamp, *values in self._connection().execute(query + " ORDER BY rowid", params):
+            yield (patient_id, series, from_epoch_us(stamp), *values[:len(Patient.SERIES[series])])
@@ -0,0 +1,276 @@
+"""Sensitivity of protocol outcomes to its threshold cut points.
+
+A sweep replays one cohort (an EventLog of simulated or stored patients) under every point of a
+threshold grid and summarizes the outcomes per point. Points run across a process pool, and each
+result is cached on disk under a key of (thresholds, cohort hash, code version), so rerunning a
+sweep or extending its grid only computes the new points.
+
+Run from src/:  python -m patient.sweep --grid glucose=200,250,300 --grid anion_gap=10,12,14
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+from contextlib import ExitStack
+from itertools import product, repeat
+
+from patient.protocol import DEFAULT_RULES, Protocol
+from patient.replay import EventLog, _panel_inputs, replay
+
+
+# threshold -> (table, input index, cut index) in the protocol rules
+THRESHOLDS = {
+    "glucose": ("fluids", 0, 0),
+    "corrected_sodium": ("fluids", 1, 0),
+    "potassium": ("fluids", 2, 0),
+    "anion_gap": ("resolution", 0, 0),
+    "pH_severe": ("severity", 0, 0),
+    "pH_mild": ("severity", 0, 1),
+}
+METRICS = (
+    "patients", "panels", "admitted_severe", "admitted_mild_moderate", "admitted_mild", "resolved_patients",
+    "median_hours_to_resolution", "insulin_starts", "kcl_panels", "dextrose_panels",
+)
+# Modules whose source decides a sweep's numbers; editing one invalidates the cache.
+CODE_MODULES = ("patient.protocol", "patient.derived", "patient.batch", "patient.replay", "patient.sweep")
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dka-sweep")
+
+
+def rules_for(thresholds, base=DEFAULT_RULES):
+    """A copy of `base` rules with the given cut points replaced."""
+    rules = copy.deepcopy(base)
+    for name, value in thresholds.items():
+        table, field, cut = THRESHOLDS[name]
+        rules["tables"][table]["inputs"][field]["cuts"][cut] = value
+    return rules
+
+
+def grid(**values):
+    """Every combination of the given threshold values, as dicts, last threshold varying fastest."""
+    unknown = set(values) - set(THRESHOLDS)
+    if unknown:
+        raise ValueError(f"unknown thresholds {sorted(unknown)}; expected some of {sorted(THRESHOLDS)}")
+    names = list(values)
+    return [dict(zip(names, point)) for point in product(*(values[name] for name in names))]
+
+
+###########################################################
+# Cache keys
+###########################################################
+def cohort_hash(log: EventLog):
+    """SHA-256 of an event log's contents."""
+    digest = hashlib.sha256()
+    digest.update("\n".join(log.patient_ids).encode())
+    for column in (log.patients, log.series, log.times, *log.values):
+        digest.update(memoryview(column).cast("B"))
+    return digest.hexdigest()
+
+
+def code_version():
+    """SHA-256 of the source of CODE_MODULES."""
+    import importlib
+
+    digest = hashlib.sha256()
+    for name in CODE_MODULES:
+        with open(importlib.import_module(name).__file__, "rb") as handle:
+            digest.update(handle.read())
+    return digest.hexdigest()
+
+
+def cell_key(thresholds, cohort, code):
+    """Cache key of one cell, from every cut point as rules_for(thresholds) resolves it.
+
+    Points that only differ in spelling (7 vs 7.0, a default left out or given) share a key.
+    """
+    rules = rules_for(thresholds)
+    cuts = {
+        name: float(rules["tables"][table]["inputs"][field]["cuts"][cut])
+        for name, (table, field, cut) in THRESHOLDS.items()
+    }
+    canonical = json.dumps({"cuts": cuts, "cohort": cohort, "code": code}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class SweepCache:
+    """One JSON file of metrics per swept cell, named by its cell_key."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, metrics):
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(temporary, "w") as handle:
+            json.dump(metrics, handle)
+        os.replace(temporary, self._path(key))
+
+
+###########################################################
+# Evaluation
+###########################################################
+def evaluate(log: EventLog, thresholds, panels=None):
+    """Replay `log` with the given thresholds and return its outcome metrics."""
+    import numpy as np
+
+    protocol = Protocol(rules_for(thresholds))
+    result = replay(log, protocol, panels)
+    scores = result.scores
+    patients = result.patients
+    times = result.times
+
+    codes, first = np.unique(patients, return_index=True)  # rows are in (patient, time) order
+    resolved_rows = np.flatnonzero(scores.resolved)
+    resolved_patients, first_resolved = np.unique(patients[resolved_rows], return_index=True)
+    started = times[first][np.searchsorted(codes, resolved_patients)]
+    hours = (times[resolved_rows[first_resolved]] - started) / 3.6e9
+
+    admitted = np.bincount(scores.severity[first], minlength=len(protocol.severity_table.outcomes))
+    admitted = {outcome.name: int(count) for outcome, count in zip(protocol.severity_table.outcomes, admitted)}
+    treated = scores.fluids[~scores.resolved]
+    outcomes = protocol.fluid_table.outcomes
+    kcl = np.array(["KCl" in outcome for outcome in outcomes])
+    dextrose = np.array([outcome.startswith("Run IV fluids D5") for outcome in outcomes])
+    return {
+        "patients": len(first),
+        "panels": len(times),
+        "admitted_severe": admitted.get("SEVERE", 0),
+        "admitted_mild_moderate": admitted.get("MILD_MODERATE", 0),
+        "admitted_mild": admitted.get("MILD", 0),
+        "resolved_patients": len(resolved_patients),
+        "median_hours_to_resolution": float(np.median(hours)) if len(hours) else None,
+        "insulin_starts": int(scores.start_insulin.sum()),
+        "kcl_panels": int(kcl[treated].sum()),
+        "dextrose_panels": int(dextrose[treated].sum()),
+    }
+
+
+_worker_log = None  # (log, panel inputs) of a pool worker, set once by _init_worker
+
+
+def _init_worker(log):
+    global _worker_log
+    _worker_log = log, _panel_inputs(log)
+
+
+def _evaluate_chunk(points):
+    log, panels = _worker_log
+    return [evaluate(log, thresholds, panels) for thresholds in points]
+
+
+class SweepResult:
+    """Tidy sweep table: one row per grid point, one column per threshold and metric."""
+
+    def __init__(self, columns, computed, cached):
+        self.columns = columns  # name -> list
+        self.computed = computed  # points evaluated by this run
+        self.cached = cached  # points read from the cache
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
+
+    def rows(self):
+        """Yield one dict per grid point."""
+        names = list(self.columns)
+        for values in zip(*self.columns.values()):
+            yield dict(zip(names, values))
+
+    def to_frame(self):
+        """The table as a pandas DataFrame."""
+        import pandas as pd
+
+        return pd.DataFrame(self.columns)
+
+
+def sweep(log: EventLog, points, workers=None, cache=None, chunksize=4):
+    """Evaluate every threshold point of `points` (see grid) on `log`, reusing cached cells.
+
+    workers=1 runs in-process; cache=None uses a SweepCache in DEFAULT_CACHE_DIR, False disables it.
+    """
+    if cache is None:
+        cache = SweepCache()
+    cohort, code = cohort_hash(log), code_version()
+    keys = [cell_key(thresholds, cohort, code) for thresholds in points]
+    metrics = [cache.get(key) if cache else None for key in keys]
+    missing = [index for index, found in enumerate(metrics) if found is None]
+    for thresholds in (points[index] for index in missing):
+        Protocol(rules_for(thresholds))  # reject invalid points (e.g. unordered pH cuts) before fanning out
+
+    chunks = [missing[start:start + chunksize] for start in range(0, len(missing), chunksize)]
+    work = [[points[index] for index in chunk] for chunk in chunks]
+    with ExitStack() as stack:
+        if workers == 1 or len(chunks) <= 1:
+            _init_worker(log)
+            results = map(_evaluate_chunk, work)
+        else:
+            from concurrent.futures import ProcessPoolExecutor  # only pay for multiprocessing here
+
+            executor = stack.enter_context(
+                ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(log,))
+            )
+            results = executor.map(_evaluate_chunk, work)
+        for chunk, chunk_metrics in zip(chunks, results):
+            for index, values in zip(chunk, chunk_metrics):
+                metrics[index] = values
+                if cache:
+                    cache.put(keys[index], values)
+
+    names = list(dict.fromkeys(name for thresholds in points for name in thresholds))
+    columns = {name: [thresholds.get(name, _default_cut(name)) for thresholds in points] for name in names}
+    columns.update({name: [values[name] for values in metrics] for name in METRICS})
+    columns["cohort"] = list(repeat(cohort[:12], len(points)))
+    columns["code_version"] = list(repeat(code[:12], len(points)))
+    return SweepResult(columns, computed=len(missing), cached=len(points) - len(missing))
+
+
+def _default_cut(name):
+    table, field, cut = THRESHOLDS[name]
+    return DEFAULT_RULES["tables"][table]["inputs"][field]["cuts"][cut]
+
+
+def _parse_grid(specs):
+    values = {}
+    for spec in specs:
+        name, _, listed = spec.partition("=")
+        values[name] = [float(value) for value in listed.split(",")]
+    return values
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Protocol threshold sensitivity sweep.")
+    parser.add_argument("--grid", action="append", required=True, metavar="NAME=V1,V2,...",
+                        help=f"threshold values to sweep (repeatable); names: {', '.join(THRESHOLDS)}")
+    parser.add_argument("--store", help="sweep the patients of this LabStore instead of a simulated cohort")
+    parser.add_argument("--patients", type=int, default=10_000, help="simulated cohort size")
+    parser.add_argument("--panels", type=int, default=24, help="hourly panels per simulated patient")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="default: one per CPU")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--output", help="write the table as CSV here instead of printing it")
+    args = parser.parse_args()
+
+    if args.store:
+        from patient.store import LabStore
+
+        cohort_log = EventLog.from_store(LabStore(args.store))
+    else:
+        cohort_log = EventLog.synthetic(args.patients, args.panels, args.seed)
+    result = sweep(cohort_log, grid(**_parse_grid(args.grid)), workers=args.workers,
+                   cache=False if args.no_cache else SweepCache(args.cache_dir))
+    print(f"{len(result)} points: {result.computed} computed, {result.cached} from cache")
+    if args.output:
+        result.to_frame().to_csv(args.output, index=False)
+        print(f"Results saved to {args.output}")
+    else:
+        print(result.to_frame().to_string(index=False))
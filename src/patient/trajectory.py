@@ -0,0 +1,111 @@
+"""Trajectory models that generate simulated lab panels for DKATreatment.steps.
+
+A model is a callable model(patient) returning the next panel as (sodium, potassium, chloride,
+bicarbonate, pH, glucose); it may look at the patient (e.g. insulin_drip) to react to treatment.
+Both models here draw their random numbers from NumPy in batches and hold a fixed-size buffer.
+"""
+PANEL = ("sodium", "potassium", "chloride", "bicarbonate", "pH", "glucose")
+
+# The ranges DKATreatment.generate_random_bloodwork draws from.
+UNIFORM_RANGES = {
+    "sodium": (120, 145),
+    "potassium": (2.5, 6.0),
+    "chloride": (90, 110),
+    "bicarbonate": (5, 24),
+    "pH": (6.8, 7.45),
+    "glucose": (150, 600),
+}
+DEFAULT_BATCH = 256  # panels drawn per RNG call
+
+
+class UniformPanels:
+    """Independent uniform panels over UNIFORM_RANGES."""
+
+    def __init__(self, seed=None, batch=DEFAULT_BATCH):
+        import numpy as np
+
+        self._rng = np.random.default_rng(seed)
+        self._low = np.array([UNIFORM_RANGES[name][0] for name in PANEL], dtype=float)
+        self._high = np.array([UNIFORM_RANGES[name][1] for name in PANEL], dtype=float)
+        self._batch = batch
+        self._panels = []
+        self._next = 0
+
+    def __call__(self, patient=None):
+        if self._next == len(self._panels):
+            self._panels = self._rng.uniform(self._low, self._high, (self._batch, len(PANEL))).tolist()
+            self._next = 0
+        panel = self._panels[self._next]
+        self._next += 1
+        return tuple(panel)
+
+
+class CorrelatedWalk:
+    """Mean-reverting random walk with physiologically correlated steps.
+
+    Each hour every analyte moves `rate` of the way toward its target plus correlated Gaussian noise
+    (bicarbonate with pH, sodium with chloride, potassium with glucose as insulin shifts both into
+    cells, sodium against glucose by dilution). Off the insulin drip the targets are the admission
+    values, so an untreated patient stays in DKA; on it they are normal values. Values are clipped to
+    physiological limits.
+    """
+
+    # analyte: (normal target, hourly reversion rate, hourly noise SD, lower limit, upper limit)
+    ANALYTES = {
+        "sodium": (138.0, 0.10, 1.5, 115.0, 160.0),
+        "potassium": (4.0, 0.20, 0.25, 2.0, 7.0),
+        "chloride": (104.0, 0.10, 1.5, 85.0, 120.0),
+        "bicarbonate": (22.0, 0.15, 1.2, 3.0, 30.0),
+        "pH": (7.38, 0.15, 0.025, 6.7, 7.5),
+        "glucose": (180.0, 0.20, 30.0, 60.0, 900.0),
+    }
+    CORRELATIONS = {
+        ("sodium", "chloride"): 0.6,
+        ("bicarbonate", "pH"): 0.8,
+        ("potassium", "glucose"): 0.3,
+        ("sodium", "glucose"): -0.3,
+    }
+
+    def __init__(self, seed=None, start=None, batch=DEFAULT_BATCH):
+        """`start` maps analytes to admission values; missing ones are drawn from UNIFORM_RANGES."""
+        import numpy as np
+
+        self._rng = np.random.default_rng(seed)
+        correlation = np.eye(len(PANEL))
+        for (first, second), value in self.CORRELATIONS.items():
+            correlation[PANEL.index(first), PANEL.index(second)] = value
+            correlation[PANEL.index(second), PANEL.index(first)] = value
+        spec = [self.ANALYTES[name] for name in PANEL]
+        self._scale = np.linalg.cholesky(correlation).T * [row[2] for row in spec]  # noise row = z @ _scale
+        # Per-analyte (normal target, rate, lower, upper); the per-step update is plain Python over
+        # six values, which beats NumPy's per-call overhead at this size.
+        self._limits = [(row[0], row[1], row[3], row[4]) for row in spec]
+        start = start or {}
+        self._admission = [
+            float(start[name] if name in start else self._rng.uniform(*UNIFORM_RANGES[name])) for name in PANEL
+        ]
+        self._state = None
+        self._batch = batch
+        self._noise = []
+        self._next = 0
+
+    def __call__(self, patient=None):
+        if self._state is None:
+            self._state = list(self._admission)
+            return tuple(self._state)
+        if self._next == len(self._noise):
+            self._noise = (self._rng.standard_normal((self._batch, len(PANEL))) @ self._scale).tolist()
+            self._next = 0
+        treated = patient is not None and patient.insulin_drip
+        noise = self._noise[self._next]
+        self._next += 1
+        self._state = [
+            min(upper, max(lower, value + rate * ((normal if treated else admitted) - value) + step))
+            for value, admitted, step, (normal, rate, lower, upper) in zip(
+                self._state, self._admission, noise, self._limits
+            )
+        ]
+        return tuple(self._state)
+
+
+MODELS = {"uniform": UniformPanels, "walk": CorrelatedWalk}
@@ -0,0 +1,159 @@
+import math
+from datetime import timedelta
+
+from patient import protocol
+
+
+DEFAULT_HALF_LIFE_HOURS = 6.0  # older panels count half as much as ones 6 h newer
+BICARBONATE_TARGET = 15.0  # mmol/L; the ADA resolution criterion for bicarbonate
+Z_95 = 1.96
+
+
+class LinearTrend:
+    """Exponentially weighted least-squares line y = a + b*t, updated in O(1) per sample.
+
+    Keeps decayed running sums of w, w*t, w*t^2, w*y, w*t*y, w*y^2 and w^2 (for the effective
+    sample size). Times are hours since the first sample. half_life_hours=None weights all
+    samples equally.
+    """
+
+    __slots__ = ("half_life", "origin", "last_t", "n", "_s0", "_st", "_stt", "_sy", "_sty", "_syy", "_sww")
+
+    def __init__(self, half_life_hours=DEFAULT_HALF_LIFE_HOURS):
+        self.half_life = half_life_hours
+        self.origin = None  # datetime of the first sample
+        self.last_t = None
+        self.n = 0
+        self._s0 = self._st = self._stt = self._sy = self._sty = self._syy = self._sww = 0.0
+
+    def hours(self, time):
+        return (time - self.origin) / timedelta(hours=1)
+
+    def add(self, time, value):
+        if value is None or value != value:
+            return
+        if self.origin is None:
+            self.origin = time
+        t = self.hours(time)
+        if self.last_t is not None and self.half_life is not None and t > self.last_t:
+            decay = 0.5 ** ((t - self.last_t) / self.half_life)
+            self._s0 *= decay
+            self._st *= decay
+            self._stt *= decay
+            self._sy *= decay
+            self._sty *= decay
+            self._syy *= decay
+            self._sww *= decay * decay
+        self.last_t = t if self.last_t is None else max(t, self.last_t)
+        self.n += 1
+        self._s0 += 1.0
+        self._st += t
+        self._stt += t * t
+        self._sy += value
+        self._sty += t * value
+        self._syy += value * value
+        self._sww += 1.0
+
+    def fit(self):
+        """Return (intercept, slope per hour, residual variance) or None with fewer than 3 samples."""
+        if self.n < 3:
+            return None
+        mean_t = self._st / self._s0
+        sxx = self._stt - self._st * mean_t
+        if sxx <= 1e-12 * max(self._stt, 1.0):
+            return None  # all samples at (nearly) the same time
+        mean_y = self._sy / self._s0
+        slope = (self._sty - self._st * mean_y) / sxx
+        intercept = mean_y - slope * mean_t
+        sse = max(self._syy - intercept * self._sy - slope * self._sty, 0.0)
+        effective_n = self._s0 * self._s0 / self._sww
+        variance = sse / self._s0 * effective_n / (effective_n - 2) if effective_n > 2 else float("inf")
+        return intercept, slope, variance
+
+    def crossing(self, target, z=Z_95):
+        """Project when the line reaches `target`: (hours, low, high) since origin, or None.
+
+        None unless the trend is moving toward the target. The band is the delta-method interval
+        of the crossing time; its lower end is never before the latest sample.
+        """
+        fitted = self.fit()
+        if fitted is None:
+            return None
+        intercept, slope, variance = fitted
+        current = intercept + slope * self.last_t
+        if slope == 0 or (target - current) / slope < 0:
+            return None
+        hours = (target - intercept) / slope
+        mean_t = self._st / self._s0
+        sxx = self._stt - self._st * mean_t
+        spread = z * math.sqrt(variance * (1 / self._s0 + (hours - mean_t) ** 2 / sxx)) / abs(slope)
+        return hours, max(hours - spread, self.last_t), hours + spread
+
+
+class ResolutionForecast:
+    """Per-patient anion gap and bicarbonate trends, fed by Patient.subscribe.
+
+    Each add_anion_gap / add_electrolytes updates the trends in O(1); nothing refits the history.
+    """
+
+    __slots__ = ("anion_gap", "bicarbonate", "admitted", "resolved_at", "latest", "_protocol")
+
+    def __init__(self, half_life_hours=DEFAULT_HALF_LIFE_HOURS, rules=None):
+        self.anion_gap = LinearTrend(half_life_hours)
+        self.bicarbonate = LinearTrend(half_life_hours)
+        self.admitted = None  # time of the first sample
+        self.resolved_at = None  # time of the first anion gap the protocol counts as resolved
+        self.latest = None  # time of the latest anion gap
+        self._protocol = rules
+
+    def attach(self, patient):
+        """Replay the patient's recorded anion gaps and electrolytes once, then follow new samples."""
+        for series in ("electrolytes", "anion_gap"):
+            for row in patient.series(series):
+                self.on_sample(patient, series, row)
+        patient.subscribe(self.on_sample)
+        return self
+
+    def on_sample(self, patient, series, row):
+        time = row[0]
+        if series == "anion_gap":
+            value = row[1]
+            self.admitted = time if self.admitted is None else min(self.admitted, time)
+            self.latest = time if self.latest is None else max(self.latest, time)
+            self.anion_gap.add(time, value)
+            rules = self._protocol or protocol.active()
+            if self.resolved_at is None and value == value and rules.resolved(value):
+                self.resolved_at = time
+        elif series == "electrolytes":
+            self.admitted = time if self.admitted is None else min(self.admitted, time)
+            self.bicarbonate.add(time, row[4])
+
+    def elapsed(self, now=None):
+        """Time from the first sample to resolution, or to `now` (default: latest anion gap) if unresolved."""
+        if self.admitted is None:
+            return None
+        end = self.resolved_at or now or self.latest
+        return end - self.admitted
+
+    def _projection(self, trend, target):
+        crossing = trend.crossing(target)
+        if crossing is None:
+            return None
+        return tuple(trend.origin + timedelta(hours=hours) for hours in crossing)
+
+    def closure(self):
+        """Projected (time, earliest, latest) the anion gap reaches the resolution threshold, or None."""
+        if self.resolved_at is not None:
+            return None
+        threshold = (self._protocol or protocol.active()).resolution_table.cuts("anion_gap")[0]
+        return self._projection(self.anion_gap, threshold)
+
+    def bicarbonate_recovery(self, target=BICARBONATE_TARGET):
+        """Projected (time, earliest, latest) bicarbonate reaches `target`, or None."""
+        return self._projection(self.bicarbonate, target)
+
+
+def format_duration(duration):
+    """Format a timedelta as HH:MM (hours may exceed 24)."""
+    minutes = max(int(duration / timedelta(minutes=1)), 0)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
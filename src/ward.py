@@ -0,0 +1,128 @@
+import asyncio
+import os
+import random
+import threading
+import uuid
+from contextlib import nullcontext
+
+import streamlit as st
+
+from patient import instrumentation, snapshot
+from patient.feed import LabFeed, read_jsonl, serve
+from patient.patient import DKATreatment, Patient
+from patient.registry import PatientRegistry
+from patient.store import LabStore
+
+
+@st.cache_resource
+def get_store():
+    """The LabStore at $DKA_STORE, or None when patients are kept in memory only."""
+    path = os.environ.get("DKA_STORE")
+    return LabStore(path) if path else None
+
+
+@st.cache_resource
+def get_metrics_server():
+    """The /metrics endpoint on $DKA_METRICS_PORT, started once per server process, or None."""
+    port = os.environ.get("DKA_METRICS_PORT")
+    return instrumentation.serve(int(port)) if port else None
+
+
+@st.cache_resource
+def get_registry():
+    """The PatientRegistry shared by every session of this server process.
+
+    With a LabStore configured, stored patients are reopened (recent samples only) on first use.
+    """
+    registry = PatientRegistry()
+    store = get_store()
+    if store is not None:
+        for patient_id in store.patient_ids():
+            registry.register(store.open_patient(patient_id))
+    return registry
+
+
+def track_patient(patient, treatment):
+    """Register a patient on the ward board and, if configured, persist its samples."""
+    store = get_store()
+    if store is not None and patient.patient_id not in get_registry():
+        store.attach(patient)
+    get_registry().register(patient, treatment)
+
+
+def lab_batch():
+    """Context that writes one panel's samples to the store in a single transaction."""
+    store = get_store()
+    return store.batch() if store is not None else nullcontext()
+
+
+def save_patient(patient):
+    """Persist demographic and insulin drip changes, if a store is configured."""
+    store = get_store()
+    if store is not None:
+        store.save_patient(patient)
+
+
+def checkpoint(patient, treatment):
+    """Snapshot a patient to $DKA_CHECKPOINT_DIR/<patient_id>.dkas, if that is set; returns the path."""
+    directory = os.environ.get("DKA_CHECKPOINT_DIR")
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{patient.patient_id}.dkas")
+    snapshot.save(path, patient, treatment)
+    return path
+
+
+def add_simulated_patients(count, seed=None):
+    """Register `count` patients with one random admission panel each, for demos and load tests."""
+    registry = get_registry()
+    rng = random.Random(seed)
+    for _ in range(count):
+        patient = Patient(
+            patient_id=str(uuid.UUID(int=rng.getrandbits(128))),
+            name=f"Simulated patient {len(registry) + 1}",
+            age=rng.randint(18, 90),
+            weight=rng.randint(45, 120),
+            gender=rng.choice(["Male", "Female", "Other"]),
+        )
+        treatment = DKATreatment(rng=rng)
+        treatment.admit_patient(patient)
+        track_patient(patient, treatment)
+        sodium, potassium, chloride, bicarbonate, pH, glucose = treatment.generate_random_bloodwork()
+        treatment.admission_status = treatment.determine_severity(pH)
+        with lab_batch():
+            treatment.log_bloodwork(sodium, potassium, chloride, bicarbonate, pH, glucose)
+        registry.set_recommendations(patient.patient_id, treatment.analyze_bloodwork(patient))
+        save_patient(patient)
+
+
+@st.cache_resource
+def get_lab_feed():
+    """The LabFeed consuming $DKA_LAB_FEED in a background thread, or None when it is not set.
+
+    DKA_LAB_FEED is a JSON-lines file to follow or tcp://host:port to listen on for the LIS.
+    """
+    source = os.environ.get("DKA_LAB_FEED")
+    if not source:
+        return None
+    store = get_store()
+    feed = LabFeed(
+        get_registry(),
+        panel_context=store.batch if store is not None else None,
+        on_result=(lambda entry, recommendations: store.save_patient(entry.patient)) if store is not None else None,
+        on_new_patient=store.attach if store is not None else None,
+    )
+
+    async def run():
+        await feed.start()
+        if source.startswith("tcp://"):
+            host, port = source[len("tcp://"):].rsplit(":", 1)
+            server = await serve(feed, host, int(port))
+            async with server:
+                await server.serve_forever()
+        else:
+            await feed.consume(read_jsonl(source, follow=True))
+
+    threading.Thread(target=asyncio.run, args=(run(),), name="lab-feed-loop", daemon=True).start()
+    return feed
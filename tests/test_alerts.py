@@ -0,0 +1,36 @@
+"""AlertEngine: window extremes, dedup and the per-window sample cap."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from patient.alerts import MAX_WINDOW_SAMPLES, AlertEngine
+from patient.patient import Patient
+
+START = datetime(2024, 1, 1)
+FALL = {"name": "glucose_fall", "analyte": "glucose", "measure": "fall", "window_hours": 1, "above": 50}
+
+
+def test_fires_once_through_subscribe_and_rearms_after_clearing():
+    engine = AlertEngine([FALL])
+    patient = Patient("alerts-1", "Alert Test", 40, 70, "F")
+    engine.attach(patient)
+    for minutes, glucose in [(0, 400), (20, 340), (40, 330), (50, 380), (120, 300), (150, 240)]:
+        patient.add_glucose(glucose, time=START + timedelta(minutes=minutes))
+    assert [(alert.time, alert.value) for alert in engine.history] == [
+        (START + timedelta(minutes=20), 60), (START + timedelta(minutes=150), 60),
+    ]
+    assert engine.active("alerts-1") == [engine.history[-1]]
+    engine.detach(patient)
+    assert engine.active("alerts-1") == []
+
+
+def test_window_over_its_cap_is_not_evaluated_until_the_dropped_samples_age_out():
+    engine = AlertEngine([FALL])
+    for second in range(MAX_WINDOW_SAMPLES + 1):  # a falling flood: every sample stays in the max deque
+        engine.observe("alerts-2", "glucose", (START + timedelta(seconds=second), 500 - second * 0.1))
+    # The window max (500) was dropped, so the fall is not evaluated rather than understated.
+    assert engine.observe("alerts-2", "glucose", (START + timedelta(minutes=10), 440)) == []
+    assert engine.active("alerts-2") == []
+    # Once the dropped sample is older than the window, the deques hold the whole window again.
+    fired = engine.observe("alerts-2", "glucose", (START + timedelta(minutes=61), 430))
+    assert [alert.value for alert in fired] == [pytest.approx(494 - 430)]
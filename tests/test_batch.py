@@ -0,0 +1,68 @@
+"""Vectorized cohort scoring agrees row for row with DKATreatment.analyze_bloodwork."""
+import random
+
+import pandas as pd
+import pytest
+
+from patient import batch, derived
+from patient.clock import VirtualClock
+from patient.patient import DKATreatment, Patient
+from patient.protocol import DEFAULT_RULES, DKASeverity, Protocol
+
+FIELDS = ("sodium", "potassium", "chloride", "bicarbonate", "pH", "glucose")
+
+
+def random_panels(count, seed=0):
+    treatment = DKATreatment(rng=random.Random(seed))
+    panels = [treatment.generate_random_bloodwork() for _ in range(count)]
+    # Exactly on the cuts: glucose 250, potassium 4, pH 7.0 and 7.24, anion gap 12.
+    panels += [(131.6, 4.0, 100.0, 23.6, 7.0, 125.0), (135.0, 4.0, 110.0, 17.0, 7.24, 250.0)]
+    return panels
+
+
+def scalar(panel, insulin_drip):
+    patient = Patient("batch-1", "Batch Test", 40, 70, "F", clock=VirtualClock())
+    patient.insulin_drip = insulin_drip
+    treatment = DKATreatment()
+    treatment.log_bloodwork(*panel, patient=patient)
+    return treatment.determine_severity(panel[4]), list(treatment.analyze_bloodwork(patient))
+
+
+def test_matches_scalar_protocol_row_for_row():
+    panels = random_panels(400)
+    drips = [number % 3 == 0 for number in range(len(panels))]
+    columns = {field: [panel[index] for panel in panels] for index, field in enumerate(FIELDS)}
+    scores = batch.score_panels(insulin_drip=drips, **columns)
+
+    assert len(scores) == len(panels)
+    for row, (panel, drip) in enumerate(zip(panels, drips)):
+        severity, recommendations = scalar(panel, drip)
+        assert scores.severity_of(row) is severity
+        assert scores.recommendations(row) == recommendations
+        assert scores.fluids_of(row) == (None if scores.resolved[row] else recommendations[-2])
+
+
+def test_dataframe_with_derived_columns_matches_raw_columns():
+    panels = random_panels(50, seed=1)
+    frame = pd.DataFrame(panels, columns=FIELDS)
+    raw = batch.score_panels(frame)
+    frame["corrected_sodium"] = derived.corrected_sodium(frame["sodium"], frame["glucose"])
+    frame["anion_gap"] = derived.anion_gap(frame["sodium"], frame["potassium"], frame["chloride"], frame["bicarbonate"])
+    precomputed = batch.score_panels(frame[["glucose", "potassium", "pH", "corrected_sodium", "anion_gap"]])
+    assert [raw.recommendations(row) for row in range(50)] == [precomputed.recommendations(row) for row in range(50)]
+
+
+def test_uses_the_given_protocol():
+    rules = {**DEFAULT_RULES, "tables": {**DEFAULT_RULES["tables"], "severity": {
+        "inputs": [{"name": "pH", "cuts": [7.3], "equal": "upper"}], "outcomes": ["SEVERE", "MILD"],
+    }}}
+    scores = batch.score_panels(
+        pH=[7.2, 7.3], glucose=[300, 300], potassium=[4.5, 4.5], corrected_sodium=[140, 140], anion_gap=[20, 20],
+        protocol=Protocol(rules),
+    )
+    assert [scores.severity_of(row) for row in range(2)] == [DKASeverity.SEVERE, DKASeverity.MILD]
+
+
+def test_missing_column_raises_key_error():
+    with pytest.raises(KeyError):
+        batch.score_panels(pH=[7.1], glucose=[300], potassium=[4.0])
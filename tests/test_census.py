@@ -0,0 +1,147 @@
+"""Census indexes and threshold watches, checked against a linear scan of every patient's samples."""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from patient.census import ANALYTES, Census
+from patient.clock import VirtualClock
+from patient.patient import Patient
+
+START = datetime(2024, 1, 1)
+WATCHES = {"anion_gap>20": ("anion_gap", ">", 20), "potassium<3.5": ("potassium", "<", 3.5), "pH<7.0": ("pH", "<", 7.0)}
+
+
+def applied(samples, analyte):
+    """The (time, value) samples of `analyte` that the census applies: late ones are skipped."""
+    series, field = ANALYTES[analyte]
+    result, latest = [], None
+    for name, row in samples:
+        if name == series and (latest is None or row[0] >= latest):
+            latest = row[0]
+            result.append((row[0], row[1 + field]))
+    return result
+
+
+def scan_episodes(samples, analyte, comparison, threshold):
+    """[(start, end or None, peak)] found by walking the applied samples."""
+    past = (lambda value: value < threshold) if comparison == "<" else (lambda value: value > threshold)
+    further = min if comparison == "<" else max
+    episodes, current = [], None
+    for time, value in applied(samples, analyte):
+        if past(value):
+            current = [time, None, value] if current is None else [current[0], None, further(current[2], value)]
+        elif current is not None:
+            episodes.append((current[0], time, current[2]))
+            current = None
+    return episodes + ([tuple(current)] if current else [])
+
+
+@pytest.fixture
+def ward():
+    rng = random.Random(17)
+    census = Census()
+    patients, samples = [], {}
+
+    def record(patient, series, row):
+        samples[patient.patient_id].append((series, row))
+
+    for number in range(30):
+        patient = Patient(f"census-{number:02d}", None, None, None, None, clock=VirtualClock(START))
+        samples[patient.patient_id] = []
+        patient.subscribe(record)
+        if number % 2:
+            census.attach(patient)  # the rest after their first samples
+        patients.append(patient)
+    for step in range(400):
+        patient = rng.choice(patients)
+        time = START + timedelta(minutes=rng.randrange(0, 24 * 60, 30))  # some late, some tied
+        choice = rng.random()
+        if choice < 0.4:
+            patient.add_electrolytes(rng.uniform(125, 145), rng.uniform(2.8, 5.5), 100, 15, time=time)
+        elif choice < 0.7:
+            patient.add_anion_gap(rng.uniform(125, 145), 4.0, 100, rng.uniform(5, 22), time=time)
+        else:
+            patient.add_pH(round(rng.uniform(6.85, 7.3), 2), time=time)
+        if step == 50:
+            for late in patients[::2]:
+                census.attach(late)
+    return census, patients, samples
+
+
+def test_latest_value_queries_match_a_scan(ward):
+    census, patients, samples = ward
+    for analyte in ("potassium", "anion_gap", "pH", "sodium", "glucose"):
+        latest = {}
+        for patient in patients:
+            values = applied(samples[patient.patient_id], analyte)
+            if values:
+                latest[patient.patient_id] = values[-1][1]
+        assert {p.patient_id: census.value(analyte, p.patient_id) for p in patients if p.patient_id in latest} == latest
+        for lo, hi in [(None, None), (None, 3.5), (3.5, 5.0), (7.0, None), (20, 21)]:
+            expected = sorted(
+                (patient_id for patient_id, value in latest.items()
+                 if (lo is None or value >= lo) and (hi is None or value < hi)),
+                key=lambda patient_id: (latest[patient_id], patient_id),
+            )
+            assert census.latest(analyte, lo, hi) == expected
+
+
+def test_watch_episodes_match_a_scan(ward):
+    census, patients, samples = ward
+    now = START + timedelta(hours=24)
+    for name, (analyte, comparison, threshold) in WATCHES.items():
+        by_patient = {p.patient_id: scan_episodes(samples[p.patient_id], analyte, comparison, threshold)
+                      for p in patients}
+        still_open = sorted((episodes[-1][0], patient_id) for patient_id, episodes in by_patient.items()
+                            if episodes and episodes[-1][1] is None)
+        for hours in (0, 3, 12):
+            assert census.exceeding(name, timedelta(hours=hours), now) == [
+                patient_id for start, patient_id in still_open if start < now - timedelta(hours=hours)
+            ]
+
+        for start, end in [(None, None), (START + timedelta(hours=6), START + timedelta(hours=12))]:
+            closed = sorted(
+                (episode[1], episode[0], patient_id, episode[2]) for patient_id, episodes in by_patient.items()
+                for episode in episodes
+                if episode[1] is not None and (start is None or episode[1] > start)
+                and (end is None or episode[0] < end)
+            )
+            expected = [(patient_id, began, finished, peak) for finished, began, patient_id, peak in closed] + [
+                (patient_id, began, None, by_patient[patient_id][-1][2]) for began, patient_id in still_open
+                if end is None or began < end
+            ]
+            episodes = census.episodes(name, start, end)
+            assert [(e.patient_id, e.start, e.end, e.peak) for e in episodes] == expected
+
+
+def test_episodes_closing_at_the_same_instant_are_kept_apart():
+    census = Census()
+    patient = Patient("tied", None, None, None, None, clock=VirtualClock(START))
+    census.attach(patient)
+    for pH in (6.9, 7.2, 6.95, 7.25):  # two episodes opened and closed at the same time
+        patient.add_pH(pH, time=START)
+    episodes = census.episodes("pH<7.0")
+    assert [(e.start, e.end, e.peak) for e in episodes] == [(START, START, 6.9), (START, START, 6.95)]
+
+
+def test_detach_closes_open_episodes_and_forgets_values():
+    census = Census()
+    patient = Patient("gone", None, None, None, None, clock=VirtualClock(START + timedelta(hours=5)))
+    census.attach(patient)
+    patient.add_pH(6.9, time=START)
+    census.detach(patient)
+    assert census.value("pH", "gone") is None
+    assert census.exceeding("pH<7.0", timedelta(0), START + timedelta(days=1)) == []
+    [episode] = census.episodes("pH<7.0")
+    assert episode.end == START + timedelta(hours=5) and episode.duration() == timedelta(hours=5)
+    patient.add_pH(6.8, time=START + timedelta(hours=6))  # no longer followed
+    assert census.episodes("pH<7.0") == [episode]
+
+
+def test_watch_arguments_are_checked():
+    census = Census(watches=())
+    with pytest.raises(ValueError, match="unknown analyte"):
+        census.watch("lactate>2", "lactate", ">", 2)
+    with pytest.raises(ValueError, match="comparison"):
+        census.watch("K<=3", "potassium", "<=", 3)
@@ -0,0 +1,67 @@
+"""Derived metrics: memoized per panel and invalidated only by samples that can change them."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from patient import derived
+from patient.patient import Patient
+
+START = datetime(2024, 1, 1)
+HOUR = timedelta(hours=1)
+
+
+@pytest.fixture
+def patient():
+    patient = Patient("derived-1", "Derived Test", 40, 70, "F")
+    patient.add_electrolytes(130, 5.0, 95, 10, time=START)
+    patient.add_glucose(400, time=START)
+    patient.add_electrolytes(134, 4.2, 100, 16, time=START + 2 * HOUR)
+    patient.add_glucose(250, time=START + 2 * HOUR)
+    return patient
+
+
+def memoized(patient, name):
+    return list(patient.derived._times[name])
+
+
+def test_late_sample_invalidates_only_later_panels(patient):
+    first = patient.derived.value("effective_osmolality", START)
+    assert patient.derived.value("effective_osmolality") == (START + 2 * HOUR, derived.effective_osmolality(134, 250))
+    assert len(memoized(patient, "effective_osmolality")) == 2
+
+    patient.add_glucose(180, time=START + HOUR)  # arrives late, before the second panel's own glucose
+    assert len(memoized(patient, "effective_osmolality")) == 1
+    assert patient.derived.value("effective_osmolality", START) == first
+    assert patient.derived.value("effective_osmolality")[1] == derived.effective_osmolality(134, 250)
+
+    patient.add_glucose(200, time=START + 3 * HOUR)  # after every panel: nothing to forget
+    assert len(memoized(patient, "effective_osmolality")) == 2
+
+
+def test_unrelated_series_keeps_the_memo(patient):
+    patient.get_effective_osmolality()
+    patient.add_pH(7.1, time=START)
+    assert len(memoized(patient, "effective_osmolality")) == 1
+
+
+def test_dependent_metric_follows_its_input(patient):
+    before = patient.get_delta_delta()[1]
+    patient.add_electrolytes(136, 4.0, 104, 20, time=START + 2 * HOUR)
+    gap = derived.anion_gap(136, 4.0, 104, 20)
+    assert patient.get_delta_delta()[1] == pytest.approx(derived.delta_delta(gap, 20))
+    assert patient.get_delta_delta()[1] != before
+
+
+def test_attribute_change_recomputes(patient):
+    assert patient.get_potassium_deficit()[1] == pytest.approx(derived.potassium_deficit(4.2, 70))
+    patient.weight = 80
+    assert patient.get_potassium_deficit()[1] == pytest.approx(derived.potassium_deficit(4.2, 80))
+
+
+def test_vectorized_columns_match_scalar_values(patient):
+    patient.add_glucose(180, time=START + HOUR)
+    times, values = patient.derived.series("corrected_sodium")
+    assert len(times) == 2
+    assert values.tolist() == pytest.approx([
+        patient.derived.value("corrected_sodium", START)[1], patient.derived.value("corrected_sodium")[1],
+    ])
@@ -0,0 +1,68 @@
+"""LTTB downsampling, checked against a point-by-point reference implementation."""
+import math
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from patient.downsample import downsample, lttb
+
+
+def reference_lttb(x, y, points):
+    """Steinarsson's LTTB, one point and one bucket at a time."""
+    count = len(x)
+    every = (count - 2) / (points - 2)
+    keep, a = [0], 0
+    for bucket in range(points - 2):
+        start, end = math.floor(bucket * every) + 1, math.floor((bucket + 1) * every) + 1
+        next_start, next_end = end, min(math.floor((bucket + 2) * every) + 1, count)
+        mean_x = sum(x[next_start:next_end]) / (next_end - next_start)
+        mean_y = sum(y[next_start:next_end]) / (next_end - next_start)
+        best, best_area = start, -1.0
+        for index in range(start, end):
+            area = abs((x[a] - mean_x) * (y[index] - y[a]) - (x[a] - x[index]) * (mean_y - y[a]))
+            if area > best_area:
+                best, best_area = index, area
+        keep.append(best)
+        a = best
+    return keep + [count - 1]
+
+
+@pytest.mark.parametrize("count, points", [(10, 3), (100, 7), (1000, 50), (997, 100), (51, 50)])
+def test_selection_matches_the_reference(count, points):
+    rng = random.Random(count * points)
+    x = sorted(rng.uniform(0, 1000) for _ in range(count))
+    y = [rng.gauss(0, 1) for _ in range(count)]
+    keep = lttb(x, y, points)
+    assert keep.tolist() == reference_lttb(x, y, points)
+    assert len(keep) == points and keep[0] == 0 and keep[-1] == count - 1
+    assert (np.diff(keep) > 0).all()
+
+
+def test_one_point_per_bucket_and_peaks_survive():
+    x = list(range(1002))
+    y = [0.0] * 1002
+    y[500], y[733] = 50.0, -40.0
+    keep = lttb(x, y, 12).tolist()
+    assert 500 in keep and 733 in keep
+    every = 1000 / 10
+    assert [math.floor((index - 1) / every) for index in keep[1:-1]] == list(range(10))
+
+
+@pytest.mark.parametrize("points", [2, 5, 6, 100])
+def test_short_series_or_tiny_budgets_keep_everything(points):
+    assert lttb(range(5), [1, 3, 2, 5, 4], points).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_downsample_drops_nan_and_keeps_times():
+    start = datetime(2024, 1, 1)
+    times = np.array([start + timedelta(minutes=15 * step) for step in range(400)], dtype="datetime64[us]")
+    values = np.sin(np.arange(400) / 20.0)
+    values[[0, 7, 399]] = np.nan
+    kept_times, kept_values = downsample(times, values, 40)
+    assert len(kept_times) == len(kept_values) == 40
+    assert kept_times[0] == times[1] and kept_times[-1] == times[398]
+    assert not np.isnan(kept_values).any()
+    assert set(kept_times.tolist()) <= set(times.tolist())
+    assert downsample(times[:10], values[:10], 40)[1].tolist() == values[1:7].tolist() + values[8:10].tolist()
@@ -0,0 +1,102 @@
+"""Columnar export of panels, checked row by row against the patient's own as-of lookups."""
+import math
+import random
+from datetime import datetime, timedelta
+
+import pyarrow.parquet as pq
+import pytest
+
+from patient.clock import VirtualClock
+from patient.export import COLUMNS, PanelTable, ParquetExport, panel_batch, schema
+from patient.patient import DKATreatment, Patient
+
+START = datetime(2024, 1, 1)
+
+
+def stay(patient_id, panels, seed=0):
+    """A patient with hourly panels and a ketone level half an hour after every other one."""
+    rng = random.Random(seed)
+    patient = Patient(patient_id, "Export Test", 40, 72.5, "F", clock=VirtualClock(START))
+    treatment = DKATreatment(rng=rng)
+    for number in range(panels):
+        treatment.log_bloodwork(*treatment.generate_random_bloodwork(), patient=patient)
+        if number % 2 == 0:
+            patient._record("ketones", patient.clock.now() + timedelta(minutes=30), rng.uniform(1, 6))
+        patient.clock.advance(timedelta(hours=1))
+    return patient
+
+
+def scan(patient, column, time):
+    """The column's value at the panel taken at `time`, by walking the recorded samples."""
+    source = COLUMNS[column]
+    if "." not in source:
+        value = patient.derived.value(source, time)[1]
+        return math.nan if value is None else value
+    series, field = source.split(".")
+    index = patient.series(series).fields.index(field)
+    rows = [row for row in patient.series(series) if row[0] <= time]
+    return max(rows, key=lambda row: row[0])[1 + index] if rows else math.nan
+
+
+def assert_rows_match(patient, rows):
+    times = [row[0] for row in patient.series("electrolytes")]
+    assert [row["time"] for row in rows] == times[-len(rows):]
+    for row in rows:
+        assert row["patient_id"] == patient.patient_id
+        for column in COLUMNS:
+            expected = scan(patient, column, row["time"])
+            assert row[column] == pytest.approx(expected, nan_ok=True), column
+
+
+def test_panel_batch_matches_as_of_lookups():
+    patient = stay("export-1", 12)
+    batch = panel_batch(patient)
+    assert batch.schema == schema() and batch.num_rows == 12
+    rows = batch.to_pylist()
+    assert_rows_match(patient, rows)
+    ketones = list(patient.series("ketones"))
+    assert math.isnan(rows[0]["ketones"])  # the first ketone level came after the first panel
+    assert rows[1]["ketones"] == rows[2]["ketones"] == ketones[0][1]
+
+
+def test_since_and_column_selection():
+    patient = stay("export-2", 6)
+    batch = panel_batch(patient, columns=["glucose", "anion_gap"], since=START + timedelta(hours=3))
+    assert batch.schema.names == ["patient_id", "time", "glucose", "anion_gap"]
+    assert [row["time"] for row in batch.to_pylist()] == [START + timedelta(hours=hour) for hour in (4, 5)]
+
+
+def test_panel_table_grows_with_the_stay():
+    patient = stay("export-3", 3)
+    table = PanelTable(patient)
+    assert table.update() == 3 and table.update() == 0
+    treatment = DKATreatment(rng=random.Random(1))
+    for _ in range(2):
+        treatment.log_bloodwork(*treatment.generate_random_bloodwork(), patient=patient)
+        patient.clock.advance(timedelta(hours=1))
+    assert table.update() == 2 and table.rows == 5
+    result = table.table()
+    assert result.num_rows == 5 and all(column.num_chunks == 1 for column in result.columns)
+    assert_rows_match(patient, result.to_pylist())
+    assert PanelTable(Patient("empty", None, None, None, None)).table().num_rows == 0
+
+
+def test_parquet_export_appends_new_panels_in_row_groups(tmp_path):
+    path = tmp_path / "panels.parquet"
+    first, second = stay("export-4", 5, seed=1), stay("export-5", 4, seed=2)
+    with ParquetExport(path, row_group_rows=6) as export:
+        assert export.write(first) == 5 and export.write(first) == 0
+        assert export.write(second) == 4  # 9 pending: flushed as one row group
+        treatment = DKATreatment(rng=random.Random(3))
+        treatment.log_bloodwork(*treatment.generate_random_bloodwork(), patient=first)
+        assert export.write(first) == 1
+    assert export.rows == 10
+    assert pq.ParquetFile(path).num_row_groups == 2
+    rows = pq.read_table(path).to_pylist()
+    assert [row["patient_id"] for row in rows] == ["export-4"] * 5 + ["export-5"] * 4 + ["export-4"]
+    assert_rows_match(second, rows[5:9])
+
+    empty = tmp_path / "empty.parquet"
+    ParquetExport(empty, columns=["pH"]).close()
+    table = pq.read_table(empty)
+    assert table.num_rows == 0 and table.schema.names == ["patient_id", "time", "pH"]
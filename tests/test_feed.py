@@ -0,0 +1,58 @@
+"""LabFeed: per-patient ordering across shards, backpressure and bounded latency metrics."""
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from patient.feed import FeedMetrics, LabFeed, replay, simulated_messages
+from patient.registry import PatientRegistry
+
+
+def test_each_patient_sees_its_messages_in_arrival_order():
+    messages = list(simulated_messages(400, patients=7, seed=1))
+    applied = {}
+    registry = PatientRegistry()
+
+    def on_result(entry, recommendations):
+        applied.setdefault(entry.patient.patient_id, []).append(entry.patient.get_glucose())
+
+    metrics = asyncio.run(replay(messages, registry, shards=3, queue_size=2, on_result=on_result))
+
+    assert metrics.processed == 400 and metrics.failed == 0 and metrics.new_patients == 7
+    assert metrics.max_queue_depth <= 2
+    for patient_id, glucose in applied.items():
+        sent = [(message.time, message.values["glucose"]) for message in messages if message.patient_id == patient_id]
+        assert glucose == sent
+        assert list(registry.get(patient_id).patient.series("glucose")) == sent
+    assert len(applied) == 7
+
+
+def test_malformed_messages_are_counted_and_skipped():
+    lines = [
+        json.dumps({"patient_id": "bad-1", "time": "2024-01-01T00:00:00", "glucose": 300}),
+        "{not json",
+        json.dumps({"patient_id": "bad-1", "glucose": 280}),  # no time
+        json.dumps({"patient_id": "bad-1", "time": "2024-01-01T01:00:00", "glucose": 260}),
+    ]
+
+    async def run():
+        registry = PatientRegistry()
+        async with LabFeed(registry, shards=2) as feed:
+            await feed.consume(lines)
+        return registry, feed.metrics
+
+    registry, metrics = asyncio.run(run())
+    assert metrics.received == 2 and metrics.failed == 2
+    start = datetime(2024, 1, 1)
+    assert list(registry.get("bad-1").patient.series("glucose")) == [
+        (start, 300.0), (start + timedelta(hours=1), 260.0),
+    ]
+
+
+def test_latency_ring_keeps_only_the_latest_window():
+    metrics = FeedMetrics(latency_window=4)
+    assert metrics.latency_percentiles(50, 99) == (None, None)
+    for seconds in (9.0, 8.0, 1.0, 2.0, 3.0, 4.0):
+        metrics.observe_latency(seconds)
+    assert len(metrics.latencies) == 4
+    assert sorted(metrics.latencies) == [1.0, 2.0, 3.0, 4.0]
+    assert metrics.latency_percentiles(0, 50, 100) == (1.0, 3.0, 4.0)
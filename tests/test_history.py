@@ -0,0 +1,37 @@
+"""PanelHistory: the session's panels as a growing columnar table with memoized per-panel tables."""
+from history import COLUMNS, TESTS, UNITS, PanelHistory
+
+
+def measurements(number):
+    return {name: number * 10 + offset for offset, name in enumerate(COLUMNS)}
+
+
+def test_entries_round_trip_in_order():
+    history = PanelHistory()
+    for number in range(3):
+        history.append(measurements(number), [f"rec {number}"])
+    assert len(history) == 3
+    assert list(history) == [(measurements(number), [f"rec {number}"]) for number in range(3)]
+    assert history.latest() == measurements(2)
+    assert history.columns["Time"] == [0, 10, 20]
+
+
+def test_measurement_tables_are_built_once_per_panel():
+    history = PanelHistory()
+    history.append(measurements(0), [])
+    first = history.measurement_table(0)
+    assert first.column("Test").to_pylist() == list(TESTS)
+    assert first.column("Value").to_pylist() == [measurements(0)[test] for test in TESTS]
+    assert first.column("Units").to_pylist() == [UNITS[test] for test in TESTS]
+
+    history.append(measurements(1), [])
+    assert history.measurement_table(0) is first
+    assert history.measurement_table(1).column("Value").to_pylist() == [measurements(1)[test] for test in TESTS]
+
+
+def test_recommendations_are_copied():
+    history = PanelHistory()
+    given = ["Start insulin"]
+    history.append(measurements(0), given)
+    given.append("later edit")
+    assert history.recommendations == [["Start insulin"]]
@@ -0,0 +1,13 @@
+"""The core domain model imports within its cold-start budget (see benchmarks.import_budget)."""
+from benchmarks.import_budget import DEFAULT_MAX_MS, DEFAULT_MAX_RSS_MIB, HEAVY_MODULES, measure_import
+
+
+def test_core_imports_no_heavy_packages():
+    result = measure_import(repeat=1)
+    assert not result["heavy"], f"core imports {', '.join(result['heavy'])}; expected none of {HEAVY_MODULES}"
+
+
+def test_core_import_time_and_rss_within_budget():
+    result = measure_import(repeat=3)
+    assert result["import_ms"] <= DEFAULT_MAX_MS
+    assert result["rss_kib"] <= DEFAULT_MAX_RSS_MIB * 1024
@@ -0,0 +1,96 @@
+"""Streaming import: CSV/Parquet rows grouped into panels and scored as the app scores them."""
+import csv
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from patient.clock import VirtualClock
+from patient.ingest import ANALYTES, group_panels, ingest, read_rows, replay_panels
+from patient.patient import DKATreatment, Patient
+
+START = datetime(2024, 1, 1)
+HEADER = ["mrn", "drawn", "sodium", "potassium", "chloride", "bicarbonate", "pH", "glucose"]
+RENAME = {"mrn": "patient_id", "drawn": "time"}
+
+
+def panel(number):
+    return 130 + number, 5.0 - 0.3 * number, 96 + number, 10 + 3 * number, 7.1 + 0.05 * number, 450 - 60 * number
+
+
+def write_export(path, patients=("A", "B"), hours=4):
+    """One BMP row and one VBG row per panel, sorted by patient and time."""
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(HEADER)
+        for patient_id in patients:
+            for hour in range(hours):
+                sodium, potassium, chloride, bicarbonate, pH, glucose = panel(hour)
+                stamp = (START + timedelta(hours=hour)).isoformat()
+                writer.writerow([patient_id, stamp, sodium, potassium, chloride, bicarbonate, "", ""])
+                writer.writerow([patient_id, stamp, "", "", "", "", pH, glucose])
+    return path
+
+
+def expected_recommendations(hours):
+    patient = Patient("A", None, None, None, None, clock=VirtualClock(START))
+    treatment = DKATreatment()
+    expected = []
+    for hour in range(hours):
+        treatment.log_bloodwork(*panel(hour), patient=patient)
+        expected.append(list(treatment.analyze_bloodwork(patient)))
+        patient.clock.advance(timedelta(hours=1))
+    return expected
+
+
+def test_csv_and_parquet_inputs_give_the_app_recommendations(tmp_path):
+    source = write_export(tmp_path / "labs.csv")
+    pq.write_table(pa.Table.from_pylist(list(read_rows(source))), tmp_path / "labs.parquet")
+
+    for name in ("labs.csv", "labs.parquet"):
+        output = tmp_path / f"{name}.out.parquet"
+        assert ingest([tmp_path / name], output, rename=RENAME, chunk_rows=3) == 8
+        table = pq.read_table(output)
+        assert pq.ParquetFile(output).num_row_groups == 3
+        rows = table.to_pylist()
+        assert [row["patient_id"] for row in rows] == ["A"] * 4 + ["B"] * 4
+        assert [row["recommendations"] for row in rows[:4]] == expected_recommendations(4)
+        assert rows[0]["glucose"] == 450 and rows[0]["sodium"] == 130
+        assert rows[0]["severity"] == "MILD_MODERATE"
+
+
+def test_partial_panels_are_scored_once_complete():
+    rows = [
+        {"patient_id": "C", "time": START, "sodium": "130", "potassium": "5", "chloride": "96", "bicarbonate": "10"},
+        {"patient_id": "C", "time": START + timedelta(hours=1), "glucose": "400"},
+        {"patient_id": "C", "time": START + timedelta(hours=2), "pH": "7.05"},
+    ]
+    records = list(replay_panels(group_panels(rows)))
+    assert [record["recommendations"] is None for record in records] == [True, True, False]
+    assert records[0]["anion_gap"] == pytest.approx(29) and records[0]["severity"] is None
+    assert records[2]["corrected_sodium"] == pytest.approx(130 + 0.016 * 300)
+    assert set(ANALYTES) <= set(records[2])
+
+
+def test_rows_of_one_time_merge_into_one_panel():
+    rows = [
+        {"patient_id": 7, "time": "2024-01-01T00:00:00", "sodium": "130", "pH": ""},
+        {"patient_id": 7, "time": "2024-01-01T00:00:00", "pH": "7.2"},
+        {"patient_id": 7, "time": "2024-01-01T01:00:00", "glucose": "300"},
+    ]
+    assert list(group_panels(rows)) == [
+        ("7", START, {"sodium": 130.0, "pH": 7.2}), ("7", START + timedelta(hours=1), {"glucose": 300.0}),
+    ]
+
+
+@pytest.mark.parametrize("rows, message", [
+    ([("B", 0), ("A", 1)], "not sorted"),
+    ([("A", 0), ("B", 0), ("A", 1)], "not sorted"),
+    ([("A", 1), ("A", 0)], "go back in time"),
+])
+def test_unsorted_input_is_rejected(rows, message):
+    rows = [{"patient_id": patient_id, "time": START + timedelta(hours=hour), "glucose": 300}
+            for patient_id, hour in rows]
+    with pytest.raises(ValueError, match=message):
+        list(group_panels(rows))
@@ -0,0 +1,109 @@
+"""Opt-in metrics: histogram buckets, the enabled/disabled decorators and the Prometheus export."""
+import urllib.error
+import urllib.request
+
+import pytest
+
+from patient import instrumentation
+from patient.instrumentation import Histogram, MetricsRegistry
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(instrumentation, "REGISTRY", registry)
+    monkeypatch.setattr(instrumentation, "ENABLED", True)
+    return registry
+
+
+def test_histogram_buckets_are_upper_bounds():
+    histogram = Histogram(buckets=(0.001, 0.01, 0.1))
+    for seconds in (0.0005, 0.001, 0.002, 0.05, 3.0):
+        histogram.observe(seconds)
+    assert histogram.counts == [2, 1, 1, 1]  # le 1 ms, le 10 ms, le 100 ms, +Inf
+    assert histogram.count == 5 and histogram.sum == pytest.approx(3.0535)
+
+
+def test_disabled_instrumentation_is_free(registry, monkeypatch):
+    monkeypatch.setattr(instrumentation, "ENABLED", False)
+
+    def function():
+        return 1
+
+    assert instrumentation.timed("dka_test_seconds")(function) is function
+    assert instrumentation.timer("dka_test_seconds") is instrumentation.timer("dka_other_seconds")
+    instrumentation.count("dka_test_total")
+    assert registry.export_text() == "\n"
+
+
+def test_enabled_timers_and_counters_record(registry):
+    @instrumentation.timed("dka_test_seconds", operation="add")
+    def add(a, b):
+        return a + b
+
+    @instrumentation.timed("dka_test_seconds", operation="fail")
+    def fail():
+        raise RuntimeError
+
+    assert add(2, 3) == 5 and add.__name__ == "add"
+    with pytest.raises(RuntimeError):
+        fail()
+    with instrumentation.timer("dka_test_seconds", operation="block"):
+        pass
+    instrumentation.count("dka_test_total", 2, kind="a")
+    instrumentation.count("dka_test_total", kind="a")
+
+    assert registry.histogram("dka_test_seconds", operation="add").count == 1
+    assert registry.histogram("dka_test_seconds", operation="fail").count == 1  # failures are timed too
+    assert registry.histogram("dka_test_seconds", operation="block").count == 1
+    assert registry.counter("dka_test_total", kind="a").value == 3
+
+
+def test_export_text_is_cumulative_prometheus(registry, tmp_path):
+    histogram = registry.histogram("dka_patient_add_seconds", series="pH")
+    histogram.buckets = (0.001, 0.01)
+    histogram.counts = [0, 0, 0]
+    for seconds in (0.0005, 0.005, 0.5):
+        histogram.observe(seconds)
+    registry.counter("dka_app_reruns_total").inc(4)
+
+    text = registry.export_text()
+    assert text.splitlines() == [
+        "# HELP dka_app_reruns_total Streamlit script reruns.",
+        "# TYPE dka_app_reruns_total counter",
+        "dka_app_reruns_total 4",
+        "# HELP dka_patient_add_seconds Time to record one sample with Patient.add_*.",
+        "# TYPE dka_patient_add_seconds histogram",
+        'dka_patient_add_seconds_bucket{series="pH",le="0.001"} 1',
+        'dka_patient_add_seconds_bucket{series="pH",le="0.01"} 2',
+        'dka_patient_add_seconds_bucket{series="pH",le="+Inf"} 3',
+        'dka_patient_add_seconds_sum{series="pH"} 0.5055',
+        'dka_patient_add_seconds_count{series="pH"} 3',
+    ]
+
+    path = tmp_path / "dka.prom"
+    registry.write_textfile(path)
+    assert path.read_text() == text and [p.name for p in tmp_path.iterdir()] == ["dka.prom"]
+    registry.clear()
+    assert registry.export_text() == "\n"
+
+
+def test_textfile_path(monkeypatch):
+    for value, expected in [("", None), ("0", None), ("1", None), ("/tmp/dka.prom", "/tmp/dka.prom")]:
+        monkeypatch.setenv("DKA_METRICS", value)
+        assert instrumentation.textfile_path() == expected
+
+
+def test_metrics_endpoint(registry):
+    registry.counter("dka_app_reruns_total").inc()
+    server = instrumentation.serve(0)
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{base}/metrics") as response:
+            assert response.status == 200 and b"dka_app_reruns_total 1" in response.read()
+        with pytest.raises(urllib.error.HTTPError) as raised:
+            urllib.request.urlopen(f"{base}/other")
+        assert raised.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,63 @@
+"""The compiled DKA decision tables, at and around every cut point."""
+import math
+
+import pytest
+
+from patient.protocol import DEFAULT_RULES, DecisionTable, DKASeverity, Protocol
+
+
+@pytest.fixture
+def protocol():
+    return Protocol(DEFAULT_RULES)
+
+
+@pytest.mark.parametrize("pH, severity", [
+    (6.99, DKASeverity.SEVERE),
+    (7.0, DKASeverity.MILD_MODERATE),
+    (7.239, DKASeverity.MILD_MODERATE),
+    (7.24, DKASeverity.MILD),
+])
+def test_severity_boundaries(protocol, pH, severity):
+    assert protocol.severity(pH) is severity
+
+
+@pytest.mark.parametrize("anion_gap, resolved", [(11.99, True), (12, False), (12.01, False)])
+def test_resolution_boundaries(protocol, anion_gap, resolved):
+    assert protocol.resolved(anion_gap) is resolved
+
+
+@pytest.mark.parametrize("glucose, corrected_sodium, potassium, fluids", [
+    (250, 135, 4, "Run IV fluids D5 NS w 20 meq KCl @ 250 cc / hr"),
+    (250, 135, 4.01, "Run IV fluids D5 NS @ 250 cc / hr"),
+    (250, 135.01, 4, "Run IV fluids D5 0.45 NS w 20 meq KCl @ 250 cc / hr"),
+    (250.01, 135, 4, "Run IV fluids NS w 20 meq KCl @ 250 cc / hr"),
+    (250.01, 135.01, 4.01, "Run IV fluids 0.45 NS @ 250 cc / hr"),
+])
+def test_fluid_boundaries(protocol, glucose, corrected_sodium, potassium, fluids):
+    assert protocol.fluids(glucose, corrected_sodium, potassium) == fluids
+
+
+def test_vectorized_indexes_match_scalar_lookups(protocol):
+    table = protocol.fluid_table
+    glucose = [249.99, 250, 250.01, 250, 600]
+    sodium = [135, 135.01, 134.99, 135, 150]
+    potassium = [4, 3.99, 4.01, 4, 2.5]
+    expected = [table.index(*values) for values in zip(glucose, sodium, potassium)]
+    assert table.indexes(glucose, sodium, potassium).tolist() == expected
+
+
+def test_nan_inputs_are_rejected(protocol):
+    with pytest.raises(ValueError):
+        protocol.severity(math.nan)
+    with pytest.raises(ValueError):
+        protocol.fluid_table.indexes([300], [math.nan], [4])
+
+
+@pytest.mark.parametrize("inputs, outcomes", [
+    ([{"name": "pH", "cuts": [7.24, 7.0]}], ["a", "b", "c"]),
+    ([{"name": "pH", "cuts": [7.0], "equal": "middle"}], ["a", "b"]),
+    ([{"name": "pH", "cuts": [7.0, 7.24]}], ["a", "b"]),
+])
+def test_malformed_tables_are_rejected(inputs, outcomes):
+    with pytest.raises(ValueError):
+        DecisionTable(inputs, outcomes)
@@ -0,0 +1,117 @@
+"""PatientRegistry and SortedIndex queries, checked against a linear scan of the patients."""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from patient.index import SortedIndex
+from patient.patient import DKASeverity, DKATreatment, Patient
+from patient.registry import PatientRegistry
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def ward():
+    """A registry of 40 patients with random panels; every fifth has no labs yet."""
+    rng = random.Random(5)
+    registry = PatientRegistry()
+    patients = []
+    for number in range(40):
+        patient = Patient(f"ward-{number:02d}", "Ward Test", 50, 70, "F")
+        if number % 2:
+            registry.register(patient)  # follows the panels added below
+        if number % 5:
+            for hour in range(rng.randint(1, 4)):
+                time = START + timedelta(hours=hour, minutes=rng.randrange(600))
+                sodium, potassium, chloride, bicarbonate = rng.uniform(125, 145), 4.0, rng.uniform(90, 110), 12.0
+                patient.add_electrolytes(sodium, potassium, chloride, bicarbonate, time=time)
+                patient.add_anion_gap(sodium, potassium, chloride, bicarbonate, time=time)
+                patient.add_pH(round(rng.uniform(6.9, 7.4), 2), time=time)
+        if not number % 2:
+            registry.register(patient)  # indexes the panels it already has
+        patients.append(patient)
+    return registry, patients
+
+
+def latest(patient, series):
+    """The value of the series' newest sample by time (the later-recorded one on ties)."""
+    rows = list(patient.series(series))
+    return max(enumerate(rows), key=lambda item: (item[1][0], item[0]))[1][1] if rows else None
+
+
+def last_lab(patient):
+    times = [row[0] for name in ("pH", "anion_gap", "electrolytes") for row in patient.series(name)]
+    return max(times, default=None)
+
+
+def test_board_order_matches_a_scan(ward):
+    registry, patients = ward
+    with_gap = sorted((p for p in patients if latest(p, "anion_gap") is not None),
+                      key=lambda p: (latest(p, "anion_gap"), p.patient_id), reverse=True)
+    without = [p for p in patients if latest(p, "anion_gap") is None]
+    assert [entry.patient for entry in registry.board()] == with_gap + without
+
+    by_lab = sorted((p for p in patients if last_lab(p) is not None), key=lambda p: (last_lab(p), p.patient_id))
+    assert [entry.patient for entry in registry.board(sort="last_lab", descending=False)] == by_lab + without
+
+
+def test_severity_filters_match_a_scan(ward):
+    registry, patients = ward
+    severity = DKATreatment().determine_severity
+    for wanted in DKASeverity:
+        expected = {
+            p.patient_id for p in patients if latest(p, "pH") is not None and severity(latest(p, "pH")) is wanted
+        }
+        assert {entry.patient.patient_id for entry in registry.by_severity(wanted)} == expected
+
+    wanted = {DKASeverity.SEVERE, DKASeverity.MILD}
+    chosen = {f"ward-{number:02d}" for number in range(0, 40, 3)}
+    board = registry.board(severities=wanted, patient_ids=chosen, limit=5)
+    expected = [entry for entry in registry.board() if entry.severity in wanted and entry.patient.patient_id in chosen]
+    assert board == expected[:5]
+
+
+def test_overdue_matches_a_scan(ward):
+    registry, patients = ward
+    now = START + timedelta(hours=8)
+    expected = sorted((p for p in patients if last_lab(p) is not None and last_lab(p) < now - timedelta(hours=2)),
+                      key=lambda p: (last_lab(p), p.patient_id))
+    assert [entry.patient for entry in registry.overdue(now, timedelta(hours=2))] == expected
+
+
+def test_register_is_idempotent_and_remove_forgets(ward):
+    registry, patients = ward
+    entry = registry.get("ward-01")
+    assert registry.register(patients[1]) is entry and len(registry) == 40
+    registry.set_recommendations("ward-01", ["Recheck"])
+    assert entry.recommendations == ["Recheck"]
+
+    registry.remove("ward-01")
+    registry.remove("ward-01")  # already gone
+    assert "ward-01" not in registry and registry.get("ward-01") is None
+    assert all(entry.patient.patient_id != "ward-01" for entry in registry.board(sort="last_lab"))
+    patients[1].add_pH(6.9, time=START + timedelta(days=1))  # no longer followed
+    assert all(entry.patient.patient_id != "ward-01" for entry in registry.by_severity(DKASeverity.SEVERE))
+
+
+def test_sorted_index_matches_a_dict():
+    rng = random.Random(2)
+    index, reference = SortedIndex(), {}
+    for _ in range(500):
+        key = rng.randrange(30)
+        if rng.random() < 0.3:
+            index.discard(key)
+            reference.pop(key, None)
+        else:
+            value = rng.randrange(10)
+            index.set(key, value)
+            reference[key] = value
+    assert len(index) == len(reference)
+    assert all(index.get(key) == reference.get(key) and (key in index) == (key in reference) for key in range(30))
+    ordered = sorted(reference, key=lambda key: (reference[key], key))
+    assert index.keys() == ordered and index.keys(descending=True) == ordered[::-1]
+    for lo, hi in [(None, None), (3, None), (None, 6), (2, 7), (5, 5)]:
+        assert index.range(lo, hi) == [
+            key for key in ordered if (lo is None or reference[key] >= lo) and (hi is None or reference[key] < hi)
+        ]
@@ -0,0 +1,109 @@
+"""Event-log replay: the vectorized replay against the one-event-at-a-time Patient/DKATreatment run."""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from patient.clock import SystemClock, VirtualClock
+from patient.patient import DKATreatment, Patient
+from patient.protocol import DEFAULT_RULES, Protocol
+from patient.replay import EventLog, diff_protocols, replay, replay_scalar
+from patient.store import LabStore
+
+START = datetime(2024, 1, 1)
+LOW_GLUCOSE_CUT = {**DEFAULT_RULES, "tables": {**DEFAULT_RULES["tables"], "fluids": {
+    **DEFAULT_RULES["tables"]["fluids"],
+    "inputs": [{**DEFAULT_RULES["tables"]["fluids"]["inputs"][0], "cuts": [200]}]
+    + DEFAULT_RULES["tables"]["fluids"]["inputs"][1:],
+}}}
+
+
+def rows(result):
+    return [(result.patient_id(row), result.time(row), result.recommendations(row)) for row in range(len(result))]
+
+
+def record_ward(log, patients=12, panels=6, seed=3):
+    """Full panels interleaved across patients, with partial panels and a late sample mixed in."""
+    rng = random.Random(seed)
+    ward = []
+    for number in range(patients):
+        patient = Patient(f"replay-{number}", None, None, None, None, clock=VirtualClock(START))
+        log.attach(patient)
+        ward.append((patient, DKATreatment(rng=rng)))
+    for _ in range(panels):
+        for patient, treatment in ward:
+            kind = rng.random()
+            if kind < 0.15:
+                patient.add_glucose(rng.uniform(150, 600), time=patient.clock.now())
+            elif kind < 0.25:
+                patient.add_electrolytes(*treatment.generate_random_bloodwork()[:4], time=patient.clock.now())
+            else:
+                treatment.log_bloodwork(*treatment.generate_random_bloodwork(), patient=patient)
+            patient.clock.advance(timedelta(minutes=rng.choice([30, 60, 90])))
+    late, _ = ward[0]
+    late.add_pH(7.01, time=START + timedelta(minutes=45))  # arrives after later panels
+    return ward
+
+
+def test_vectorized_replay_matches_the_scalar_replay():
+    log = EventLog()
+    record_ward(log)
+    assert rows(replay(log)) == replay_scalar(log)
+    assert len(replay(log)) > 50
+
+
+def test_synthetic_log_matches_the_scalar_replay():
+    log = EventLog.synthetic(patients=20, panels=8, seed=5)
+    assert len(log) == 20 * 8 * 5
+    assert rows(replay(log)) == replay_scalar(log)
+
+
+def test_log_round_trips_through_a_store(tmp_path):
+    log = EventLog()
+    store = LabStore(tmp_path / "labs.db")
+    try:
+        ward = record_ward(log, patients=4, panels=3)
+        assert list(store.samples()) == []
+        for patient, _ in ward:
+            store.attach(patient)
+        for patient, treatment in ward:
+            treatment.log_bloodwork(*treatment.generate_random_bloodwork(), patient=patient)
+        recorded = [event for event in log if event[0] in {"replay-1", "replay-3"}][-10:]
+        stored = list(EventLog.from_store(store, ["replay-1", "replay-3"]))
+        assert stored == recorded
+        assert len(list(store.samples())) == 20
+        assert all(len(values) == len(Patient.SERIES[series]) for _, series, _, *values in store.samples())
+    finally:
+        store.close()
+
+
+def test_diff_lists_exactly_the_changed_panels():
+    log = EventLog.synthetic(patients=30, panels=6, seed=9)
+    before, after = Protocol(DEFAULT_RULES), Protocol(LOW_GLUCOSE_CUT)
+    expected = [
+        (left[0], left[1], left[2], right[2])
+        for left, right in zip(replay_scalar(log, before), replay_scalar(log, after)) if left[2] != right[2]
+    ]
+    diff = diff_protocols(log, before, after)
+    assert expected and len(diff) == len(expected)
+    assert [
+        (row["patient_id"], row["time"], row["recommendations_before"], row["recommendations_after"]) for row in diff
+    ] == expected
+    assert all(row["severity_before"] == row["severity_after"] for row in diff)
+    assert len(diff_protocols(log, before, Protocol(DEFAULT_RULES))) == 0
+
+
+def test_empty_log_replays_to_nothing():
+    assert len(replay(EventLog())) == 0 and replay_scalar(EventLog()) == []
+
+
+@pytest.mark.parametrize("clock", [VirtualClock(START), SystemClock()])
+def test_clocks(clock):
+    before = clock.now()
+    clock.advance(timedelta(hours=2))
+    if isinstance(clock, VirtualClock):
+        assert clock.now() == before + timedelta(hours=2)
+        clock.set(START)
+        assert clock.now() == START
+    else:
+        assert before <= clock.now() < before + timedelta(hours=1)  # real time only
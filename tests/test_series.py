@@ -0,0 +1,89 @@
+"""TimeSeries: columnar buffers checked against a plain list of sample tuples."""
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from patient.series import TimeSeries, from_epoch_us, to_epoch_us
+
+START = datetime(2024, 1, 1)
+
+
+def filled(times, capacity=4):
+    series = TimeSeries(("sodium", "potassium"), capacity=capacity)
+    samples = [series.append(START + timedelta(minutes=minutes), 130.0 + number, 4.0) for number, minutes in
+               enumerate(times)]
+    return series, samples
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_queries_match_a_linear_scan(ordered):
+    rng = random.Random(4)
+    minutes = sorted(rng.sample(range(600), 50)) if ordered else rng.sample(range(600), 50)
+    series, samples = filled(minutes)
+
+    assert series.ordered is ordered
+    assert len(series) == 50 and series.capacity >= 50
+    assert list(series) == samples
+    assert series.last() == samples[-1] and series.row(-2) == samples[-2]
+    for probe in range(-10, 620, 7):
+        time = START + timedelta(minutes=probe)
+        before = [index for index, sample in enumerate(samples) if sample[0] <= time]
+        expected = max(before, key=lambda index: samples[index][0]) if before else None
+        assert series.asof(time) == expected
+        assert series.asof(to_epoch_us(time)) == expected
+        start, end = START + timedelta(minutes=probe), START + timedelta(minutes=probe + 90)
+        assert series.window(start, end) == [sample for sample in samples if start <= sample[0] < end]
+
+
+def test_missing_values_are_nan_and_arity_is_checked():
+    series = TimeSeries(("sodium", "potassium"))
+    time, sodium, potassium = series.append(START, 130, None)
+    assert (time, sodium) == (START, 130.0) and math.isnan(potassium)
+    assert series.value(0, "sodium") == 130.0
+    with pytest.raises(ValueError):
+        series.append(START, 130)
+    with pytest.raises(IndexError):
+        series.row(1)
+    with pytest.raises(IndexError):
+        series.stamp(-2)
+    assert TimeSeries(("sodium",)).last() is None
+
+
+def test_aware_times_are_stored_as_local_naive_time():
+    aware = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+    assert from_epoch_us(to_epoch_us(aware)) == aware.astimezone().replace(tzinfo=None)
+
+
+def test_trim_keeps_the_latest_samples_and_old_views_stay_valid():
+    series, samples = filled(range(10))
+    view = series.values("sodium")
+    series.trim(3)
+    assert list(series) == samples[-3:]
+    assert view.tolist() == [130.0 + number for number in range(10)]
+    assert series.times().tolist() == [sample[0] for sample in samples[-3:]]
+    series.trim(5)  # already shorter: nothing to do
+    assert len(series) == 3
+
+
+def test_views_are_zero_copy_and_read_only():
+    series, samples = filled(range(5))
+    values = series.values("potassium")
+    assert values.tolist() == [4.0] * 5
+    assert not values.flags.writeable
+    with pytest.raises(ValueError):
+        values[0] = 1.0
+
+
+def test_raw_restore_round_trip():
+    series, samples = filled([5, 3, 9])
+    copy = TimeSeries(series.fields)
+    copy.restore(*series.raw())
+    assert list(copy) == samples and copy.ordered is False
+    copy.append(START + timedelta(hours=1), 140.0, 3.5)  # grows past the restored buffers
+    assert len(copy) == 4
+    with pytest.raises(ValueError):
+        copy.restore(True, series.raw()[1], series.raw()[2][:1])
+    with pytest.raises(ValueError):
+        copy.restore(True, series.raw()[1], (series.raw()[2][0], series.raw()[2][1][:1]))
@@ -0,0 +1,181 @@
+"""ScoringService: HTTP status paths, micro-batched scoring and the store-backed patient cache."""
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from patient.clock import VirtualClock
+from patient.patient import DKATreatment, Patient
+from patient.service import PatientCache, ScoringBatcher, ScoringService, ServiceError, handle_connection
+from patient.store import LabStore
+
+START = datetime(2024, 1, 1)
+PANELS = [
+    {"sodium": 130, "potassium": 5.5, "chloride": 96, "bicarbonate": 8, "pH": 6.95, "glucose": 550},
+    {"sodium": 134, "potassium": 4.2, "chloride": 100, "bicarbonate": 14, "pH": 7.2, "glucose": 320},
+    {"sodium": 138, "potassium": 3.1, "chloride": 104, "bicarbonate": 20, "pH": 7.32, "glucose": 190},
+]
+
+
+def expected_recommendations():
+    patient = Patient("expected", None, None, None, None, clock=VirtualClock(START))
+    treatment = DKATreatment()
+    treatment.admit_patient(patient)
+    expected = []
+    for panel in PANELS:
+        treatment.log_bloodwork(*(panel[name] for name in ("sodium", "potassium", "chloride", "bicarbonate", "pH",
+                                                          "glucose")), patient=patient)
+        expected.append(list(treatment.analyze_bloodwork(patient)))
+        patient.clock.advance(timedelta(hours=1))
+    return expected
+
+
+def run(coroutine_function, *args):
+    async def main():
+        service = ScoringService(*args)
+        service.batcher.start()
+        try:
+            return await coroutine_function(service)
+        finally:
+            await service.batcher.stop()
+
+    return asyncio.run(main())
+
+
+def test_panels_are_scored_as_the_app_scores_them():
+    async def scenario(service):
+        service.admit({"patient_id": "svc-1"})
+        results = []
+        for hour, panel in enumerate(PANELS):
+            body = {**panel, "time": (START + timedelta(hours=hour)).isoformat()}
+            results.append(await service.dispatch("POST", "/patients/svc-1/panels", body))
+        return results, await service.dispatch("GET", "/patients/svc-1/recommendations", {}), service.health()
+
+    results, latest, health = run(scenario)
+    assert [result["recommendations"] for result in results] == expected_recommendations()
+    assert results[0]["severity"] == "SEVERE"
+    assert latest["recommendations"] == results[-1]["recommendations"]
+    assert health["patients"] == 1 and health["batches"] == 3
+
+
+def test_partial_panel_is_recorded_but_not_scored():
+    async def scenario(service):
+        service.admit({"patient_id": "svc-2"})
+        return await service.dispatch("POST", "/patients/svc-2/panels", {"glucose": 400})
+
+    assert run(scenario) == {"patient_id": "svc-2", "severity": None, "recommendations": None}
+
+
+@pytest.mark.parametrize("method, path, body, status", [
+    ("POST", "/patients", {"patient_id": "svc-3"}, 409),
+    ("POST", "/patients/nobody/panels", {"glucose": 300}, 404),
+    ("GET", "/patients/nobody/recommendations", {}, 404),
+    ("DELETE", "/patients/svc-3", {}, 404),
+    ("POST", "/patients/svc-3/panels", {"glucose": "high"}, 400),
+    ("POST", "/patients/svc-3/panels", {"time": "yesterday", "glucose": 300}, 400),
+    ("POST", "/patients/svc-3/panels", {"note": "no analytes"}, 400),
+    ("POST", "/patients", ["not", "an", "object"], 400),
+])
+def test_errors_carry_their_status(method, path, body, status):
+    async def scenario(service):
+        service.admit({"patient_id": "svc-3"})
+        with pytest.raises(ServiceError) as raised:
+            await service.dispatch(method, path, body)
+        return raised.value.status
+
+    assert run(scenario) == status
+
+
+def test_http_round_trip_and_status_codes():
+    async def request(port, method, path, body=b""):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                     + body)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, payload = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(payload)
+
+    async def scenario(service):
+        server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            admitted = await request(port, "POST", "/patients", json.dumps({"patient_id": "http-1"}).encode())
+            return [
+                admitted,
+                await request(port, "POST", "/patients", json.dumps({"patient_id": "http-1"}).encode()),
+                await request(port, "POST", "/patients/http-1/panels", json.dumps(PANELS[0]).encode()),
+                await request(port, "GET", "/patients/missing/recommendations"),
+                await request(port, "POST", "/patients", b"{not json"),
+            ]
+
+    responses = run(scenario)
+    assert [status for status, _ in responses] == [200, 409, 200, 404, 400]
+    assert responses[0][1] == {"patient_id": "http-1"}
+    assert responses[2][1]["recommendations"] == expected_recommendations()[0]
+    assert "error" in responses[3][1] and "invalid JSON" in responses[4][1]["error"]
+
+
+def test_batcher_scores_concurrent_panels_together_one_per_patient():
+    async def scenario():
+        batcher = ScoringBatcher(max_batch=8, max_wait=0.01)
+        batcher.start()
+        patients = [Patient(f"b-{number}", None, None, None, None) for number in range(3)]
+        treatments = [DKATreatment() for _ in patients]
+        inputs = {"glucose": 450, "corrected_sodium": 135, "anion_gap": 22, "potassium": 4.5, "pH": 7.1}
+        futures = [batcher.score(patient, treatment, inputs) for patient, treatment in zip(patients, treatments)]
+        futures.append(batcher.score(patients[0], treatments[0], inputs))  # same patient: next batch
+        results = await asyncio.gather(*futures)
+        await batcher.stop()
+        return batcher, patients, treatments, results
+
+    batcher, patients, treatments, results = asyncio.run(scenario())
+    assert (batcher.batches, batcher.scored) == (2, 4)
+    assert all(patient.insulin_drip for patient in patients)
+    assert results[0][1][0] != results[3][1][0]  # the second panel sees the drip the first one started
+    assert treatments[0].current_recommendations == results[3][1]
+
+
+def test_cache_evicts_to_the_store_and_reopens(tmp_path):
+    store = LabStore(tmp_path / "labs.db")
+    try:
+        cache = PatientCache(store, capacity=2)
+        for number in range(3):
+            patient, _ = cache.add(Patient(f"c-{number}", "Cache Test", 40, 70, "F"))
+            patient.add_pH(6.95, time=START)
+        assert len(cache) == 2
+        assert "c-0" in cache and "c-9" not in cache
+        assert len(cache) == 2  # the membership test reopened nothing
+
+        patient, treatment = cache.get("c-0")
+        assert patient.get_pH() == (START, 6.95) and treatment.admission_status.name == "SEVERE"
+        assert len(cache) == 2 and "c-1" in cache
+        with pytest.raises(KeyError):
+            cache.get("c-9")
+    finally:
+        store.close()
+
+
+def test_admit_conflict_does_not_reopen_a_stored_patient(tmp_path):
+    store = LabStore(tmp_path / "labs.db")
+    try:
+        service = ScoringService(store, cache_size=1)
+        service.admit({"patient_id": "s-0"})
+        service.admit({"patient_id": "s-1"})  # evicts s-0
+        with pytest.raises(ServiceError) as raised:
+            service.admit({"patient_id": "s-0"})
+        assert raised.value.status == 409
+        assert list(service.patients._states) == ["s-1"]
+    finally:
+        store.close()
+
+
+def test_without_a_store_nothing_is_evicted():
+    cache = PatientCache(capacity=1)
+    for number in range(3):
+        cache.add(Patient(f"m-{number}", None, None, None, None))
+    assert len(cache) == 3 and "m-0" in cache and "m-9" not in cache
+    with pytest.raises(KeyError):
+        cache.get("m-9")
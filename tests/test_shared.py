@@ -0,0 +1,81 @@
+"""SharedCohort: seqlock-published panels, read back consistently from another handle."""
+import pytest
+
+from patient import shared
+from patient.clock import FOLLOW_UP_INTERVAL, VirtualClock
+from patient.patient import DKATreatment, Patient
+from patient.shared import FIELDS, SharedCohort, TornReadError
+
+
+@pytest.fixture
+def cohort():
+    cohort = SharedCohort.create(patients=4, panels=8)
+    yield cohort
+    cohort.close()
+    cohort.unlink()
+
+
+def admitted(patient_id):
+    patient = Patient(patient_id, "Shared Test", 40, 70, "F", clock=VirtualClock())
+    treatment = DKATreatment()
+    treatment.admit_patient(patient)
+    return patient, treatment
+
+
+def test_publish_then_read_from_another_handle(cohort):
+    patient, treatment = admitted("shared-1")
+    treatment.log_bloodwork(130, 5.0, 95, 10, 7.2, 400, patient=patient)
+    assert cohort.publish(patient)
+    assert not cohort.publish(patient)  # nothing new since the last call
+    patient.clock.advance(FOLLOW_UP_INTERVAL)
+    treatment.log_bloodwork(134, 4.2, 100, 16, 7.3, 250, patient=patient)
+    assert cohort.publish(patient)
+
+    reader = SharedCohort.open(cohort.name)
+    try:
+        assert reader.patient_ids() == ["shared-1"]
+        assert reader.count("shared-1") == 2
+        _, values = reader.latest("shared-1")
+        assert values["glucose"] == 250
+        assert values["anion_gap"] == pytest.approx(patient.get_anion_gap()[1])
+        assert values["corrected_sodium"] == pytest.approx(patient.get_corrected_sodium()[1])
+        times, rows = reader.panels("shared-1")
+        assert len(times) == 2 and rows.shape == (2, len(FIELDS))
+        assert int(reader._seq[reader.slot("shared-1")]) == 4  # two writes, each leaving seq even
+    finally:
+        reader.close()
+
+
+def test_failed_append_leaves_the_seqlock_even(cohort):
+    patient, treatment = admitted("shared-2")
+    treatment.log_bloodwork(130, 5.0, 95, 10, 7.2, 400, patient=patient)
+    cohort.publish(patient)
+    slot = cohort.slot("shared-2")
+    with pytest.raises(AttributeError):
+        cohort.append("shared-2", "not a time", 130, 5.0, 95, 10, 7.2, 400)
+    assert int(cohort._seq[slot]) % 2 == 0
+    assert cohort.count("shared-2") == 1
+    assert cohort.latest("shared-2")[1]["glucose"] == 400
+
+
+def test_reader_gives_up_on_a_panel_left_mid_write(cohort, monkeypatch):
+    patient, treatment = admitted("shared-3")
+    treatment.log_bloodwork(130, 5.0, 95, 10, 7.2, 400, patient=patient)
+    cohort.publish(patient)
+    monkeypatch.setattr(shared, "READ_TIMEOUT", 0.01)
+    cohort._seq[cohort.slot("shared-3")] += 1  # as if the writer stopped mid-panel
+    with pytest.raises(TornReadError):
+        cohort.latest("shared-3")
+
+
+def test_over_long_patient_id_is_rejected_before_the_seqlock(cohort):
+    longest = "é" * 32  # 64 bytes in UTF-8
+    assert cohort.add_patient(longest) == 0
+    with pytest.raises(ValueError, match="longer than 64 bytes"):
+        cohort.add_patient(longest + "x")
+    assert int(cohort._header[6]) % 2 == 0 and len(cohort) == 1
+    reader = SharedCohort.open(cohort.name)
+    try:
+        assert reader.patient_ids() == [longest]
+    finally:
+        reader.close()
@@ -0,0 +1,51 @@
+"""Monte Carlo runs: seeded, identical across worker counts, and faithful to DKATreatment.steps."""
+import random
+
+import pytest
+
+from patient.clock import VirtualClock
+from patient.patient import DKATreatment, Patient
+from patient.protocol import DKASeverity
+from patient.simulation import SimulationSummary, run_simulations, simulate_patient
+
+
+def summary_of(summary):
+    return (summary.runs, summary.unresolved, summary.resolution_hours, summary.recommendations, summary.severity)
+
+
+def test_summary_is_identical_in_process_and_across_a_pool():
+    in_process = run_simulations(120, seed=7, workers=1, max_steps=24, chunksize=16)
+    pooled = run_simulations(120, seed=7, workers=2, max_steps=24, chunksize=16)
+    assert summary_of(in_process) == summary_of(pooled)
+    assert in_process.runs == 120
+    assert summary_of(run_simulations(120, seed=8, workers=1, max_steps=24)) != summary_of(in_process)
+
+
+def test_simulated_patient_matches_a_full_history_run():
+    severity, hours, recommendations = simulate_patient(11, max_steps=30)
+
+    patient = Patient("sim-11", "Simulated", 45, 70, "Other", clock=VirtualClock())
+    treatment = DKATreatment(rng=random.Random(11))
+    treatment.admit_patient(patient)
+    steps = list(treatment.steps(patient, max_steps=30))
+    assert severity is steps[0].severity
+    assert hours == (steps[-1].number if steps[-1].resolved else None)
+    assert recommendations == [rec for step in steps if not step.resolved for rec in step.recommendations]
+
+
+@pytest.mark.parametrize("model", ["uniform", "walk"])
+def test_trajectory_models_run(model):
+    summary = run_simulations(20, seed=3, workers=1, max_steps=48, model=model)
+    assert summary.runs == 20
+    assert sum(summary.severity.values()) == 20
+
+
+def test_summary_statistics_on_known_runs():
+    summary = SimulationSummary()
+    assert summary.mean_resolution_hours() is None and summary.resolution_percentile(50) is None
+    for hours in (1, 2, 2, 4, None):
+        summary.add(DKASeverity.SEVERE, hours, ["a"])
+    assert (summary.runs, summary.resolved, summary.unresolved) == (5, 4, 1)
+    assert summary.mean_resolution_hours() == pytest.approx(9 / 4)
+    assert [summary.resolution_percentile(q) for q in (25, 50, 75, 100)] == [1, 2, 2, 4]
+    assert summary.recommendations["a"] == 5
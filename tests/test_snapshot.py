@@ -0,0 +1,78 @@
+"""Snapshots: round-trips, format version checks and forward compatibility with newer writers."""
+import random
+import struct
+from datetime import datetime, timedelta
+
+import pytest
+
+from patient import snapshot
+from patient.clock import VirtualClock
+from patient.patient import DKATreatment, Patient
+
+START = datetime(2024, 1, 1)
+
+
+def treated(seed=3):
+    patient = Patient("snap-1", "Snapshot Test", 61, 72.5, "F", clock=VirtualClock(START))
+    treatment = DKATreatment(rng=random.Random(seed))
+    treatment.admit_patient(patient)
+    treatment.treat_patient(patient, max_steps=12, verbose=False)
+    return patient, treatment
+
+
+def written_with(monkeypatch, series, fields):
+    """Snapshot bytes from a writer whose `series` has `fields`."""
+    monkeypatch.setitem(Patient.SERIES, series, fields)
+    patient = Patient("snap-2", "Snapshot Test", 61, 72.5, "F")
+    for hour in range(3):
+        patient.series(series).append(START + timedelta(hours=hour), *(float(hour + n) for n in range(len(fields))))
+    data = snapshot.dumps(patient)
+    monkeypatch.undo()
+    return data
+
+
+def test_round_trip(tmp_path):
+    patient, treatment = treated()
+    snapshot.save(tmp_path / "stay.dkas", patient, treatment)
+    loaded, loaded_treatment = snapshot.load(tmp_path / "stay.dkas")
+
+    assert (loaded.patient_id, loaded.weight, loaded.insulin_drip) == ("snap-1", 72.5, patient.insulin_drip)
+    for name in Patient.SERIES:
+        assert list(loaded.series(name)) == list(patient.series(name))
+    assert loaded_treatment.admission_status is treatment.admission_status
+    assert loaded_treatment.all_recommendations == treatment.all_recommendations
+    assert loaded_treatment.current_recommendations == treatment.current_recommendations
+
+    with snapshot.SnapshotFile(tmp_path / "stay.dkas") as view:
+        assert view.values("glucose", "glucose_mg_dl").tolist() == [value for _, value in patient.series("glucose")]
+
+
+def test_newer_format_version_is_rejected():
+    data = bytearray(snapshot.dumps(treated()[0]))
+    struct.pack_into("<H", data, 4, snapshot.FORMAT_VERSION + 1)
+    with pytest.raises(ValueError, match="newer"):
+        snapshot.loads(bytes(data))
+
+
+def test_not_a_snapshot_is_rejected():
+    with pytest.raises(ValueError, match="not a DKA snapshot"):
+        snapshot.loads(b"PK\x03\x04" + bytes(60))
+
+
+def test_unknown_sections_are_skipped(monkeypatch):
+    data = written_with(monkeypatch, "lactate", ("lactate_mmol_L",))
+    patient, treatment = snapshot.loads(data)
+    assert treatment is None
+    assert len(patient.series("glucose")) == 0
+
+
+def test_trailing_fields_from_a_newer_writer_are_skipped(monkeypatch):
+    data = written_with(monkeypatch, "glucose", ("glucose_mg_dl", "meter_error"))
+    patient, _ = snapshot.loads(data)
+    assert list(patient.series("glucose")) == [(START + timedelta(hours=hour), float(hour)) for hour in range(3)]
+
+
+def test_missing_known_fields_are_incompatible(monkeypatch):
+    data = written_with(monkeypatch, "electrolytes", ("sodium", "potassium"))
+    with pytest.raises(ValueError, match="electrolytes"):
+        snapshot.loads(data)
@@ -0,0 +1,81 @@
+"""LabStore: samples recorded on an attached patient come back from the SQLite log."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from patient.patient import Patient
+from patient.store import LabStore
+
+START = datetime(2024, 1, 1)
+HOUR = timedelta(hours=1)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LabStore(tmp_path / "labs.db", recent=3)
+    yield store
+    store.close()
+
+
+def record_stay(patient, hours):
+    for hour in range(hours):
+        patient.add_electrolytes(130 + hour, 4.5, 100, 12 + hour, time=START + hour * HOUR)
+        patient.add_glucose(400 - 20 * hour, time=START + hour * HOUR)
+
+
+def test_round_trip_keeps_demographics_and_recent_samples(store):
+    patient = Patient("store-1", "Store Test", 52, 81.5, "M")
+    patient.insulin_drip = True
+    store.attach(patient)
+    record_stay(patient, 5)
+
+    reopened = store.open_patient("store-1", attach=False)
+    assert (reopened.name, reopened.age, reopened.weight, reopened.gender) == ("Store Test", 52, 81.5, "M")
+    assert reopened.insulin_drip
+    assert list(reopened.series("electrolytes")) == list(patient.series("electrolytes"))[-3:]
+    assert reopened.get_glucose() == patient.get_glucose()
+    assert store.history("store-1", "glucose") == list(patient.series("glucose"))
+    assert store.history("store-1", "glucose", start=START + HOUR, end=START + 3 * HOUR) == [
+        (START + HOUR, 380.0), (START + 2 * HOUR, 360.0),
+    ]
+
+
+def test_batch_writes_on_exit_and_reopened_patient_keeps_appending(store):
+    patient = Patient("store-2", "Store Test", 30, 60, "F")
+    store.attach(patient)
+    with store.batch():
+        record_stay(patient, 2)
+        assert store.history("store-2", "glucose") == []  # still buffered
+    assert len(store.history("store-2", "glucose")) == 2
+
+    reopened = store.open_patient("store-2")
+    reopened.add_glucose(300, time=START + 2 * HOUR)
+    assert store.history("store-2", "glucose")[-1] == (START + 2 * HOUR, 300.0)
+    assert store.patient_ids() == ["store-2"]
+
+
+def test_unknown_patient_raises_key_error(store):
+    with pytest.raises(KeyError):
+        store.open_patient("nobody")
+
+
+def test_failed_batch_writes_nothing_of_the_block(store):
+    patient = Patient("store-3", "Store Test", 30, 60, "F")
+    store.attach(patient)
+    with store.batch():
+        patient.add_glucose(420, time=START)
+        with pytest.raises(ZeroDivisionError):
+            with store.batch():  # a panel that fails half-way
+                patient.add_electrolytes(130, 5.0, 95, 10, time=START + HOUR)
+                1 / 0
+        patient.add_glucose(380, time=START + HOUR)
+    assert store.history("store-3", "electrolytes") == []
+    assert store.history("store-3", "glucose") == [(START, 420.0), (START + HOUR, 380.0)]
+
+    with pytest.raises(ValueError):
+        with store.batch():
+            patient.add_glucose(300, time=START + 2 * HOUR)
+            raise ValueError("lab system went away")
+    assert len(store.history("store-3", "glucose")) == 2
+    patient.add_glucose(290, time=START + 3 * HOUR)  # outside a batch: commits on its own
+    assert store.history("store-3", "glucose")[-1] == (START + 3 * HOUR, 290.0)
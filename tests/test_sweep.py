@@ -0,0 +1,72 @@
+"""Threshold sweeps: metrics checked against the scalar replay, and the on-disk cell cache."""
+import pytest
+
+from patient.protocol import RESOLVED_MESSAGE, START_INSULIN_MESSAGE, Protocol
+from patient.replay import EventLog, replay_scalar
+from patient.sweep import SweepCache, cell_key, evaluate, grid, rules_for, sweep
+
+
+@pytest.fixture(scope="module")
+def cohort():
+    return EventLog.synthetic(patients=40, panels=6, seed=2)
+
+
+def test_metrics_match_the_scalar_replay(cohort):
+    thresholds = {"glucose": 200, "anion_gap": 14}
+    panels = replay_scalar(cohort, Protocol(rules_for(thresholds)))
+    treated = [recommendations for _, _, recommendations in panels if recommendations != [RESOLVED_MESSAGE]]
+    metrics = evaluate(cohort, thresholds)
+    assert metrics["panels"] == len(panels) and metrics["patients"] == len({row[0] for row in panels})
+    assert metrics["resolved_patients"] == len({row[0] for row in panels if row[2] == [RESOLVED_MESSAGE]})
+    assert metrics["insulin_starts"] == sum(recommendations[0] == START_INSULIN_MESSAGE for recommendations in treated)
+    assert metrics["kcl_panels"] == sum("KCl" in recommendations[-2] for recommendations in treated)
+    assert metrics["dextrose_panels"] == sum(recommendations[-2].startswith("Run IV fluids D5")
+                                             for recommendations in treated)
+    severities = ("admitted_severe", "admitted_mild_moderate", "admitted_mild")
+    assert sum(metrics[name] for name in severities) == metrics["patients"]
+
+
+def test_grid_is_every_combination():
+    assert grid(glucose=[200, 250], anion_gap=[10, 12, 14])[:4] == [
+        {"glucose": 200, "anion_gap": 10}, {"glucose": 200, "anion_gap": 12},
+        {"glucose": 200, "anion_gap": 14}, {"glucose": 250, "anion_gap": 10},
+    ]
+    with pytest.raises(ValueError, match="unknown thresholds"):
+        grid(lactate=[2])
+
+
+def test_equivalent_points_share_a_cache_key():
+    key = cell_key({"glucose": 250, "anion_gap": 12}, "cohort", "code")
+    assert cell_key({"anion_gap": 12.0, "glucose": 250.0}, "cohort", "code") == key
+    assert cell_key({}, "cohort", "code") == key  # both are the defaults
+    assert cell_key({"glucose": 250.5}, "cohort", "code") != key
+    assert cell_key({}, "other cohort", "code") != key and cell_key({}, "cohort", "other code") != key
+
+
+def test_cache_hits_skip_evaluation(cohort, tmp_path):
+    cache = SweepCache(tmp_path / "cache")
+    first = sweep(cohort, grid(glucose=[200, 250]), workers=1, cache=cache)
+    assert (first.computed, first.cached) == (2, 0)
+
+    extended = sweep(cohort, grid(glucose=[200.0, 250, 300]), workers=1, cache=cache)
+    assert (extended.computed, extended.cached) == (1, 2)
+    assert list(extended.rows())[:2] == list(first.rows())
+    again = sweep(cohort, [{}, {"glucose": 300, "anion_gap": 12}], workers=1, cache=cache)
+    assert (again.computed, again.cached) == (0, 2)
+
+    uncached = sweep(cohort, grid(glucose=[300]), workers=1, cache=False)
+    assert uncached.computed == 1 and list(uncached.rows()) == list(extended.rows())[2:]
+    assert len(list((tmp_path / "cache").iterdir())) == 3
+
+
+def test_pooled_sweep_matches_in_process(cohort):
+    points = grid(glucose=[200, 300], pH_severe=[6.9, 7.0], potassium=[3.5])
+    in_process = sweep(cohort, points, workers=1, cache=False, chunksize=1)
+    pooled = sweep(cohort, points, workers=2, cache=False, chunksize=1)
+    assert pooled.columns == in_process.columns
+    assert in_process.to_frame()["potassium"].tolist() == [3.5] * 4
+
+
+def test_invalid_points_are_rejected_before_running(cohort):
+    with pytest.raises(ValueError):
+        sweep(cohort, [{"pH_severe": 7.3, "pH_mild": 7.1}], workers=1, cache=False)
@@ -0,0 +1,105 @@
+"""Simulated trajectories: the panel models and the lazy DKATreatment.steps loop they drive."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from patient.clock import VirtualClock
+from patient.patient import HISTORY_TRIM_INTERVAL, DKATreatment, Patient
+from patient.protocol import RESOLVED_MESSAGE, START_INSULIN_MESSAGE, DKASeverity
+from patient.trajectory import PANEL, UNIFORM_RANGES, CorrelatedWalk, UniformPanels
+
+START = datetime(2024, 1, 1)
+OPEN_GAP = (130, 5.0, 96, 10, 6.95, 400)  # anion gap 29
+CLOSED_GAP = (140, 4.0, 110, 24, 7.35, 150)  # anion gap 10
+
+
+def scripted(*panels):
+    remaining = list(panels)
+    return lambda patient: remaining.pop(0) if len(remaining) > 1 else remaining[0]
+
+
+def admitted():
+    patient = Patient("traj", None, None, None, None, clock=VirtualClock(START))
+    treatment = DKATreatment()
+    treatment.admit_patient(patient)
+    return patient, treatment
+
+
+def test_uniform_panels_are_seeded_in_range_and_batch_independent():
+    panels = [UniformPanels(seed=3)() for _ in range(2)]
+    assert panels[0] == panels[1]
+    small, large = UniformPanels(seed=4, batch=3), UniformPanels(seed=4)
+    drawn = [small() for _ in range(10)]
+    assert drawn == [large() for _ in range(10)]
+    for panel in drawn:
+        assert all(UNIFORM_RANGES[name][0] <= value <= UNIFORM_RANGES[name][1] for name, value in zip(PANEL, panel))
+
+
+def test_walk_starts_at_admission_and_recovers_only_on_insulin():
+    start = {"pH": 7.0, "bicarbonate": 8.0, "glucose": 500.0}
+    untreated_patient, treated_patient = Patient("u", None, None, None, None), Patient("t", None, None, None, None)
+    treated_patient.insulin_drip = True
+    untreated, treated = CorrelatedWalk(seed=1, start=start, batch=7), CorrelatedWalk(seed=1, start=start, batch=7)
+    first = untreated(untreated_patient)
+    assert first == treated(treated_patient)
+    assert {name: value for name, value in zip(PANEL, first) if name in start} == start
+
+    for _ in range(48):
+        left, right = untreated(untreated_patient), treated(treated_patient)
+        for panel in (left, right):
+            assert all(spec[3] <= value <= spec[4] for value, spec in
+                       zip(panel, (CorrelatedWalk.ANALYTES[name] for name in PANEL)))
+    assert dict(zip(PANEL, right))["pH"] > 7.25 and dict(zip(PANEL, left))["pH"] < 7.15
+    assert dict(zip(PANEL, right))["glucose"] < dict(zip(PANEL, left))["glucose"]
+
+
+def test_steps_follow_the_protocol_until_resolution():
+    patient, treatment = admitted()
+    steps = list(treatment.steps(patient, model=scripted(OPEN_GAP, OPEN_GAP, CLOSED_GAP)))
+    assert [step.number for step in steps] == [0, 1, 2]
+    assert [step.time for step in steps] == [START, START + timedelta(hours=1), START + timedelta(hours=2)]
+    assert steps[0].severity is DKASeverity.SEVERE and treatment.admission_status is DKASeverity.SEVERE
+    assert steps[0].recommendations[0] == START_INSULIN_MESSAGE
+    assert START_INSULIN_MESSAGE not in steps[1].recommendations
+    assert [step.resolved for step in steps] == [False, False, True]
+    assert steps[-1].recommendations == [RESOLVED_MESSAGE] and steps[-1].anion_gap == pytest.approx(10)
+    assert steps[0].corrected_sodium == pytest.approx(130 + 0.016 * 300)
+
+
+@pytest.mark.parametrize("max_steps, expected", [(0, 1), (5, 6)])
+def test_max_steps_caps_the_follow_ups(max_steps, expected):
+    patient, treatment = admitted()
+    steps = list(treatment.steps(patient, model=scripted(OPEN_GAP), max_steps=max_steps))
+    assert len(steps) == expected and not steps[-1].resolved
+
+
+def test_timeout_and_uncapped_runs():
+    patient, treatment = admitted()
+    assert len(list(treatment.steps(patient, model=scripted(OPEN_GAP), max_steps=None, timeout=0))) == 1
+    patient, treatment = admitted()
+    model = scripted(*[OPEN_GAP] * 100, CLOSED_GAP)
+    steps = list(treatment.steps(patient, model=model, max_steps=None))
+    assert len(steps) == 101 and steps[-1].resolved
+
+
+def test_history_is_kept_whole_unless_trimming_is_asked():
+    runs = HISTORY_TRIM_INTERVAL * 2 + 3
+    patient, treatment = admitted()
+    for _ in treatment.steps(patient, model=scripted(OPEN_GAP), max_steps=runs):
+        pass
+    assert len(patient.series("glucose")) == runs + 1
+
+    patient, treatment = admitted()
+    for _ in treatment.steps(patient, model=scripted(OPEN_GAP), max_steps=runs, history=8):
+        pass
+    assert len(patient.series("glucose")) == 8 + 4  # trimmed before panel 128, then panels 128-131
+    assert patient.get_glucose() == (START + timedelta(hours=runs), 400.0)
+
+
+def test_treat_patient_records_recommendations_until_resolved(capsys):
+    patient, treatment = admitted()
+    assert treatment.treat_patient(patient, model=scripted(OPEN_GAP, CLOSED_GAP), verbose=False)
+    assert len(treatment.all_recommendations) == 1
+    patient, treatment = admitted()
+    assert not treatment.treat_patient(patient, model=scripted(OPEN_GAP), max_steps=2, verbose=False)
+    assert len(treatment.all_recommendations) == 3 and capsys.readouterr().out == ""
@@ -0,0 +1,88 @@
+"""Resolution forecasting: incremental weighted trends, checked on known lines and against a batch fit."""
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from patient.patient import Patient
+from patient.trend import LinearTrend, ResolutionForecast, format_duration
+
+START = datetime(2024, 1, 1)
+HOUR = timedelta(hours=1)
+
+
+def test_exact_line_gives_its_slope_and_eta():
+    trend = LinearTrend(half_life_hours=None)
+    for hour in range(5):
+        trend.add(START + hour * HOUR, 24 - 2 * hour)
+    intercept, slope, variance = trend.fit()
+    assert (intercept, slope) == (pytest.approx(24), pytest.approx(-2))
+    assert variance == pytest.approx(0, abs=1e-9)
+    hours, low, high = trend.crossing(12)
+    assert hours == pytest.approx(6) and low == pytest.approx(6) and high == pytest.approx(6)
+    assert trend.crossing(30) is None  # moving away from it
+
+
+@pytest.mark.parametrize("half_life", [None, 6.0, 1.5])
+def test_fit_matches_a_weighted_batch_fit(half_life):
+    rng = random.Random(4)
+    trend = LinearTrend(half_life)
+    hours = sorted(rng.uniform(0, 24) for _ in range(30))
+    values = [26 - 0.6 * hour + rng.gauss(0, 1.5) for hour in hours]
+    for hour, value in zip(hours, values):
+        trend.add(START + timedelta(hours=hour), value)
+
+    t = np.array(hours) - hours[0]
+    weights = np.ones_like(t) if half_life is None else 0.5 ** ((t[-1] - t) / half_life)
+    slope, intercept = np.polyfit(t, values, 1, w=np.sqrt(weights))
+    fitted_intercept, fitted_slope, variance = trend.fit()
+    assert (fitted_intercept, fitted_slope) == (pytest.approx(intercept), pytest.approx(slope))
+    residuals = np.array(values) - (intercept + slope * t)
+    effective_n = weights.sum() ** 2 / (weights ** 2).sum()
+    expected = (weights * residuals ** 2).sum() / weights.sum() * effective_n / (effective_n - 2)
+    assert variance == pytest.approx(expected, rel=1e-6)
+
+    hours_to, low, high = trend.crossing(8)
+    assert hours_to == pytest.approx((8 - intercept) / slope)
+    assert trend.last_t <= low < hours_to < high
+
+
+def test_degenerate_inputs_do_not_fit():
+    trend = LinearTrend()
+    trend.add(START, 20)
+    trend.add(START + HOUR, float("nan"))  # skipped
+    trend.add(START + HOUR, None)
+    trend.add(START + HOUR, 18)
+    assert trend.n == 2 and trend.fit() is None and trend.crossing(12) is None
+    same_time = LinearTrend()
+    for value in (20, 18, 16):
+        same_time.add(START, value)
+    assert same_time.fit() is None
+
+
+def test_forecast_follows_a_patient_to_resolution():
+    patient = Patient("trend-1", None, None, None, None)
+    for hour in range(3):  # recorded before attach: replayed
+        patient.add_anion_gap(132, 4.0, 100, 12 + 2 * hour, time=START + hour * HOUR)  # gap 24, 22, 20
+        patient.add_electrolytes(132, 4.0, 100, 12 + 2 * hour, time=START + hour * HOUR)
+    forecast = ResolutionForecast(half_life_hours=None).attach(patient)
+    assert forecast.anion_gap.n == 3 and forecast.bicarbonate.n == 3
+
+    time, earliest, latest = forecast.closure()
+    assert time == START + 6 * HOUR and earliest == latest == time  # the gap falls 2/h to below 12
+    assert forecast.bicarbonate_recovery(18)[0] == START + 3 * HOUR
+    assert forecast.elapsed() == 2 * HOUR and forecast.elapsed(START + 5 * HOUR) == 5 * HOUR
+
+    for hour in range(3, 8):
+        patient.add_anion_gap(132, 4.0, 100, 12 + 2 * hour, time=START + hour * HOUR)
+    assert forecast.resolved_at == START + 7 * HOUR  # gap 10: the first below the threshold of 12
+    assert forecast.closure() is None and forecast.elapsed(START + 9 * HOUR) == 7 * HOUR
+
+
+def test_unfed_forecast_and_duration_format():
+    forecast = ResolutionForecast()
+    assert forecast.elapsed() is None and forecast.closure() is None and forecast.bicarbonate_recovery() is None
+    assert [format_duration(timedelta(minutes=minutes)) for minutes in (0, 59, 61, 1505, -5)] == [
+        "00:00", "00:59", "01:01", "25:05", "00:00",
+    ]